@@ -1,11 +1,12 @@
 # -*-coding: utf-8 -*-
 """
 this is aircraft file.
-it contains a AircraftModel class
+it contains a AircraftModel class and the loadAircraftModel function
 
 Author: liuchao
 Date: 2014-09-05
 """
+import codecs
 
 
 class AircraftModel(object):
@@ -43,3 +44,18 @@ class AircraftModel(object):
 
     def setDz(self, dz=0.):
         self.dz = dz
+
+
+def loadAircraftModel(fname):
+    """
+    load an AircraftModel from a model parameters file, the format which
+    DataTransWidget exports (see SACCON-Params.txt).
+    """
+    with codecs.open(fname, "r", "utf8") as f:
+        rawData = f.readlines()[2:-2]
+    params1 = [float(s.split('\t')[1]) for s in rawData[:5]]
+    params2 = [float(s.split('\t')[1]) for s in rawData[6:]]
+    area, span, rootChord, refChord, speed = params1
+    dx, dy, dz = params2[:3]
+    return AircraftModel(area=area, span=span, rootChord=rootChord, refChord=refChord,
+                         dx=dx, dy=dy, dz=dz, speed=speed)
@@ -6,8 +6,23 @@ Author: liuchao
 Date: 2014-09-05
 """
 from __future__ import division
-from numpy import (genfromtxt, zeros, deg2rad, sin, cos, savetxt, hstack)
+import copy
+import os
+import time
+import traceback
+from itertools import izip_longest
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+from numpy import (float64, deg2rad, add, subtract, multiply, concatenate)
 from aircraft import AircraftModel
+from calibration import ITERATIVE, CalibrationTable, findCalibrationTable, loadCalibrationTable
+from dataIO import loadColumns, ColumnReader, ArrayReader, TEXT, OUTPUT_FORMATS, RESULT_WRITERS
+from rotation import bodyToWind, ROTATION_BLOCK_ROWS
+from solver import FixedPointSolver, NEWTON, SOLVER_METHODS
+from tare import TareTable, LINEAR as TARE_LINEAR
+from instrument import StageRecorder, ConversionResult, PeakMeter
+import oscillation
+from workspace import Workspace, SharedWorkspace, ShardWorkspace, openSharedBuffers
 
 __author__ = 'Vincent'
 
@@ -21,12 +36,41 @@ BalanceBox——》盒式天平
 
 AIR_DENSITY = 1.2250  # 空气密度
 ABSOLUTE_ZERO = 273.15  # 绝对零度
+BALANCE_STYLES = {'G14': 0, 'G16': 1, 'G18': 2, 'BOX': 3}  # 天平类型名称与balanceSty的对应
+BALANCE_NAMES = dict((sty, name) for name, sty in BALANCE_STYLES.items())  # 也是calibrations目录下校准表的文件名
+DOUBLE = 'float64'  # 双精度, 默认
+SINGLE = 'float32'  # 单精度: 读入、校准、转换和输出均为float32, 仅G18的迭代求解为float64
+PRECISIONS = (DOUBLE, SINGLE)
+THREADS = 'threads'  # 多核并行: 线程, 共用工作区
+PROCESSES = 'processes'  # 多核并行: 进程, 共用内存映射的工作区
+PARALLEL_MODES = (THREADS, PROCESSES)
+SHARDS_PER_WORKER = 4  # 每个线程或进程分到的分片数, 使各分片的迭代次数差别得以均衡
+SHARD_MIN_ROWS = 16384  # 分片的最少行数, 行数更少时不再分片
+# 转换的各个阶段, 按先后顺序; 每个阶段的缓存以其依赖的参数及上一阶段的依赖为键
+STAGES = ('load', 'filter', 'tare', 'calibrate', 'transfer', 'rotate', 'normalize')
+
+
+def _convertShard(args):
+    """convert the rows [start, stop) in a worker process, writing into the shared buffers"""
+    cls, state, table, spec, start, stop = args
+    shard = cls.__new__(cls)
+    shard.__dict__.update(state)
+    buffers = openSharedBuffers(spec)
+    shard._workspace = ShardWorkspace(buffers, start, stop)
+    shard._convertRows(buffers['angle'][start:stop], buffers['angleR'][start:stop], buffers['Fe'][start:stop], table)
+    return start, shard._iterationBlocks, shard._convergedBlocks
+
+
+class ConversionCancelled(Exception):
+    """raised inside translateData() once Balance.cancel() has been called"""
 
 
 class Balance(object):
     def __init__(self, staFile=None, dynFile=None, bodyFile=None, aeroFile=None,
                  headerRows=1, footerRows=0, angleStartCol=0, angleEndCol=3,
-                 forceStartCol=4, forceEndCol=9, aircraftModel=None, balanceSty=None):
+                 forceStartCol=4, forceEndCol=9, aircraftModel=None, balanceSty=None,
+                 solverMethod=NEWTON, solverTol=1e-9, solverMaxIter=100, chunkRows=0, outputFormat=TEXT,
+                 precision=DOUBLE):
         self._staFile = staFile
         self._dynFile = dynFile
         self._bodyFile = bodyFile
@@ -39,6 +83,9 @@ class Balance(object):
         self._forceStartCol = forceStartCol
         self._forceEndCol = forceEndCol
         self._balanceSty = balanceSty
+        self._calibrationTable = None
+        self._tareTable = None  # tare.TareTable replacing the static file, see setTareTable
+        self._forceFilter = None  # filters.ForceFilter applied to the raw files before the tare
 
         self._speed = 0.
         self._area = 0.
@@ -52,6 +99,45 @@ class Balance(object):
 
         self._columnOffset = None
 
+        # G18 nonlinear solver settings and the last solve's per-row statistics
+        self._solverMethod = solverMethod
+        self._solverTol = solverTol
+        self._solverMaxIter = solverMaxIter
+        self._iterations = None
+        self._converged = None
+        self._iterationBlocks = []
+        self._convergedBlocks = []
+
+        # rows per block in the streaming mode, 0 loads the whole files at once
+        self._chunkRows = chunkRows
+        # body and aero files' format, one of dataIO.OUTPUT_FORMATS
+        self._outputFormat = outputFormat
+        # dtype of the loaded columns, the intermediate arrays and the results, one of PRECISIONS
+        self._precision = precision
+        # dataCache.InputCache of the parsed static and dynamic files, None parses them every time
+        self._inputCache = None
+        self._cacheDynamic = True
+
+        # progress callback(stage, done, total) and the cancel request checked at each report
+        self._progressCallback = None
+        self._cancelled = False
+
+        # the whole-file mode's intermediate arrays: {stage: (dependency key, result)}, see STAGES.
+        # copies of the Balance share it, an entry is only used while its key still matches.
+        self._stageCache = {}
+        self._memoize = True
+        self._workspace = Workspace()  # the stages' result buffers, reused across runs and blocks
+
+        # row shards run on this many threads or processes, see setParallel
+        self._workers = 0
+        self._parallelMode = THREADS
+
+        # the running conversion's instrument.StageRecorder and the callbacks fed from it, see translateData
+        self._recorder = None
+        self._trackMemory = True
+        self._stageCallback = None
+        self._resultCallback = None
+
     def __str__(self):
         return unicode(u'file directory setting:\t' + '\n' +
                        ('%40s\t\t%s' % (u'Static file directory:', self._staFile)) + '\n' +
@@ -126,289 +212,668 @@ class Balance(object):
         else:
             self._balanceSty = balanceSty
 
-    def _genDataByG16(self):
-        # aircraft's _area, characteristic chord, free flow pressure, _dx, _dy, _dz, air _speed:_speed, flow pressure.
-        s = self._area                  # unit: m2
-        l = self._span                  # unit: m
-        ba = self._refChord             # unit: pa
-        dx = self._dx                   # unit: m
-        dy = self._dy                   # unit: m
-        dz = self._dz                   # unit: m
-        V = self._speed                 # unit: m/s
-        q = 0.5 * AIR_DENSITY * V ** 2  # unit: pa
+    def setChunkRows(self, chunkRows=0):
+        self._chunkRows = chunkRows
 
-        staFile = self._staFile  # static file's name
-        dynFile = self._dynFile  # dynamic file's name
-        bodyFile = self._bodyFile  # body file's name
-        aeroFile = self._aeroFile  # aero file's name
-
-        headerRows = self._headerRows  # data file's header nums
-        footerRows = self._footerRows  # data file's footer nums
-        angleStartCol = self._angleStartCol  # angle start column
-        angleEndCol = self._angleEndCol  # angle end column
-        # angleCols = angleEndCol - angleStartCol + 1  # angle columns
-        forceStartCol = self._forceStartCol  # force and moment start column
-        forceEndCol = self._forceEndCol  # force and moment end column
-        forceCols = forceEndCol - forceStartCol + 1  # force and moment columns
-        try:
-            # load static file and dynamic file
-            staData = genfromtxt(fname=staFile, skip_header=headerRows, skip_footer=footerRows)
-            dynData = genfromtxt(fname=dynFile, skip_header=headerRows, skip_footer=footerRows)
-            staAngle, staForce = staData[:, (angleStartCol - 1):angleEndCol], staData[:, (forceStartCol - 1):forceEndCol]
-            dynAngle, dynForce = dynData[:, (angleStartCol - 1):angleEndCol], dynData[:, (forceStartCol - 1):forceEndCol]
-            staAngleR, dynAngleR = deg2rad(staAngle), deg2rad(dynAngle)  # change the degrees to radius
-            angle = (staAngle + dynAngle) / 2.
-            angleR = (staAngleR + dynAngleR) / 2.
-            m, n = staData.shape
-            # read the file's headers and footers
-            rawList = open(staFile).readlines()
-            headerList = rawList[:headerRows] if headerRows else []
-            footerList = rawList[-footerRows:] if footerRows else []
-
-            #calculate the "body frame"'s fore and moment's coefficient
-            Fe = dynForce - staForce  # Fe: the raw Force and moment of Balance at the "Body frame"in the experiment
-            Fbb = zeros(shape=(m, forceCols))  # Fbb: Force and moment of Balance at the "Body frame"
-            Fbb[:, 0] = 0.2554675*Fe[:, 0] - 0.0154822*Fe[:, 1] + 0.00390868*Fe[:, 2] - 0.0051715*Fe[:, 3] - \
-                0.00178511*Fe[:, 4] - 0.0024596*Fe[:, 5]
-            Fbb[:, 1] = 0.00068324*Fe[:, 0] + 0.6661034*Fe[:, 1] + 0.0120892*Fe[:, 2] - 0.0109143*Fe[:, 3] + \
-                0.0391122*Fe[:, 4] + 0.0151383*Fe[:, 5]
-            Fbb[:, 2] = 0.00096904*Fe[:, 0] + 0.00120306*Fe[:, 1] + 0.585989*Fe[:, 2] + 0.027769*Fe[:, 3] + \
-                0.014161*Fe[:, 4] + 0.00452654*Fe[:, 5]
-            Fbb[:, 3] = 0.000095445*Fe[:, 0] + 0.00029407*Fe[:, 1] + 0.00726843*Fe[:, 2] + 0.03304980*Fe[:, 3] + \
-                0.0082689*Fe[:, 4] + 0.000152507*Fe[:, 5]
-            Fbb[:, 4] = -0.00036007*Fe[:, 0] - 0.00009756*Fe[:, 1] + 0.00098957*Fe[:, 2] + 0.00055426*Fe[:, 3] + \
-                0.02351212*Fe[:, 4] - 0.000134249*Fe[:, 5]
-            Fbb[:, 5] = -0.000025559*Fe[:, 0] + 0.00075648*Fe[:, 1] + 0.000344149*Fe[:, 2] - 0.000585242*Fe[:, 3] - \
-                0.0022913*Fe[:, 4] + 0.0276978*Fe[:, 5]
-
-            #the balance's "body frame" data translation to aircraft 's "body frame"
-            Fb = zeros(shape=(m, forceCols))  # Fb: Force and moment of aircraft at the "Body frame"
-            Fb[:, :3] = Fbb[:, :3]
-            Fb[:, 3] = Fbb[:, 3] + Fbb[:, 2] * dy - Fbb[:, 1] * dz
-            Fb[:, 4] = Fbb[:, 4] - Fbb[:, 0] * dz - Fbb[:, 2] * dx
-            Fb[:, 5] = Fbb[:, 5] + Fbb[:, 0] * dy + Fbb[:, 1] * dx
-
-            #calculate the aero data
-            Fa = zeros(shape=(m, forceCols))  # Fa: aero's Force and moment
-            Fa[:, 0] = cos(angleR[:, 0]) * cos(angleR[:, 1]) * Fb[:, 0] + \
-                sin(angleR[:, 0]) * cos(angleR[:, 1]) * Fb[:, 1] - sin(angleR[:, 1]) * Fb[:, 2]
-            Fa[:, 1] = - sin(angleR[:, 0]) * Fb[:, 0] + cos(angleR[:, 0]) * Fb[:, 1]
-            Fa[:, 2] = cos(angleR[:, 0]) * sin(angleR[:, 1]) * Fb[:, 0] + \
-                sin(angleR[:, 0]) * sin(angleR[:, 1]) * Fb[:, 1] + cos(angleR[:, 1]) * Fb[:, 2]
-            Fa[:, 3] = cos(angleR[:, 0]) * cos(angleR[:, 1]) * Fb[:, 3] - \
-                sin(angleR[:, 0]) * cos(angleR[:, 0]) * Fb[:, 4] + sin(angleR[:, 1]) * Fb[:, 5]
-            Fa[:, 4] = sin(angleR[:, 0]) * Fb[:, 3] + cos(angleR[:, 0]) * Fb[:, 4]
-            Fa[:, 5] = - cos(angleR[:, 0]) * sin(angleR[:, 1]) * Fb[:, 3] + \
-                sin(angleR[:, 0]) * sin(angleR[:, 1]) * Fb[:, 4] + cos(angleR[:, 1]) * Fb[:, 5]
-
-            # Cb: Coefficient of force and moment at the Body frame
-            Cb = zeros(shape=(m, forceCols))
-            Cb[:, :3] = Fb[:, :3] * 9.8 / (q * s)
-            Cb[:, 3:5] = Fb[:, 3:5] * 9.8 / (q * s * l)
-            Cb[:, 5] = Fb[:, 5] * 9.8 / (q * s * ba)
-            # Ca: Coefficient of force and moment at the Aero frame
-            Ca = zeros(shape=(m, forceCols))
-            Ca[:, :3] = Fa[:, :3] * 9.8 / (q * s)
-            Ca[:, 3:5] = Fa[:, 3:5] * 9.8 / (q * s * l)
-            Ca[:, 5] = Fa[:, 5] * 9.8 / (q * s * ba)
-
-            Mb = hstack((angle, Cb))
-            Ma = hstack((angle, Ca))
-
-            savetxt(bodyFile, Mb, fmt='%-15.8f',
-                    header=''.join(headerList).strip(),
-                    footer=''.join(footerList).strip(),
-                    comments='')
-            savetxt(aeroFile, Ma, fmt='%-15.8f',
-                    header=''.join(headerList).strip(),
-                    footer=''.join(footerList).strip(),
-                    comments='')
-            return True
-        except:
+    def setMemoize(self, memoize=True):
+        """keep the whole-file mode's intermediate arrays between runs, so only the stages a change affects are redone"""
+        self._memoize = memoize
+        if not memoize:
+            self.clearStageCache()
+
+    def clearStageCache(self):
+        self._stageCache.clear()
+
+    def setParallel(self, workers=0, mode=THREADS):
+        """
+        shard the rows over `workers` threads or processes (PARALLEL_MODES), 0 or 1 converts on
+        the calling thread. the processes share a SharedWorkspace, memory-mapped temporary files.
+        """
+        if mode not in PARALLEL_MODES or workers < 0:
             return False
+        if mode == PROCESSES and workers > 1 and not isinstance(self._workspace, SharedWorkspace):
+            self.setWorkspace(SharedWorkspace())
+        elif mode == THREADS and isinstance(self._workspace, SharedWorkspace):
+            self.setWorkspace(Workspace())
+        self._workers = workers
+        self._parallelMode = mode
+        return True
 
-    def _genDataByG14(self):
-        pass
+    def setTareTable(self, tareTable=None):
+        """
+        tare the dynamic file with a tare.TareTable built once from a static sweep, instead of
+        the static file row by row. None goes back to the static file.
+        """
+        self._tareTable = tareTable
+
+    def buildTareTable(self, mode=TARE_LINEAR):
+        """build a tare.TareTable from the static file with this Balance's column settings, and use it"""
+        (staAngle, staForce), _, _ = self._loadColumns(self._staFile)
+        self._tareTable = TareTable(staAngle, staForce, mode)
+        return self._tareTable
+
+    def setForceFilter(self, forceFilter=None):
+        """
+        despike, low-pass and decimate the raw static and dynamic forces before the tare with a
+        filters.ForceFilter, the angles follow the decimation. None converts the rows as read.
+        """
+        self._forceFilter = forceFilter
+
+    def setWorkspace(self, workspace):
+        """
+        share a Workspace between Balances converting one after another, e.g. the runs of a batch.
+        Balances converting at the same time need their own.
+        """
+        self.clearStageCache()
+        self._workspace = workspace
+
+    def _stageKeys(self, table):
+        """the dependency key of every stage, each including the key of the stage before it"""
+        keys = {}
+        inputs = []
+        tareTable = self._tareTable
+        for fname in (self._dynFile,) if tareTable is not None else (self._staFile, self._dynFile):
+            st = os.stat(fname)
+            inputs.append((fname, st.st_size, st.st_mtime))
+        keys['load'] = (tuple(inputs), self._headerRows, self._footerRows, self._angleStartCol, self._angleEndCol,
+                        self._forceStartCol, self._forceEndCol, self._precision,
+                        tareTable.digest if tareTable is not None else None)
+        keys['filter'] = (keys['load'], self._forceFilter.key if self._forceFilter is not None else None)
+        keys['tare'] = keys['filter']
+        keys['calibrate'] = (keys['tare'], table.digest, self._solverMethod, self._solverTol, self._solverMaxIter)
+        keys['transfer'] = (keys['calibrate'], self._dx, self._dy, self._dz)
+        keys['rotate'] = keys['transfer']
+        keys['normalize'] = (keys['rotate'], self._speed, self._area, self._span, self._refChord)
+        return keys
+
+    def _isCached(self, name, keys):
+        cached = self._stageCache.get(name)
+        return self._memoize and cached is not None and cached[0] == keys[name]
+
+    def _remember(self, name, keys, result):
+        if self._memoize:
+            self._stageCache[name] = (keys[name], result)
+
+    def _stage(self, name, keys, compute, rows=0):
+        """return the cached result of a stage while its dependencies are unchanged, otherwise compute it"""
+        if self._isCached(name, keys):
+            if self._recorder is not None:
+                self._recorder.cached(name, rows)
+            return self._stageCache[name][1]
+        # the stage rewrites its workspace buffers, the old result must not outlive them
+        self._stageCache.pop(name, None)
+        result = self._measure(name, compute, rows)
+        self._remember(name, keys, result)
+        return result
+
+    def _measure(self, name, compute, rows=0):
+        """run compute() as the stage `name`, timed while translateData() records the stages"""
+        if self._recorder is None:
+            return compute()
+        return self._recorder.measure(name, compute, rows)
+
+    def setStageCallback(self, callback=None):
+        """
+        callback(stats) is called with the instrument.StageStats of a stage each time the stage has
+        run (once per block in the streaming mode), on the converting thread.
+        """
+        self._stageCallback = callback
+
+    def setResultCallback(self, callback=None):
+        """callback(result) is called with the instrument.ConversionResult at the end of every translateData()"""
+        self._resultCallback = callback
+
+    def setMemoryTracking(self, track=True):
+        """
+        sample the resident peak of every stage (whole-file mode) or of the whole conversion
+        (streaming mode), see instrument.py. off, the results carry the times only.
+        """
+        self._trackMemory = track
+
+    def setProgressCallback(self, callback=None):
+        """
+        callback(stage, done, total) is called as the conversion goes on, stage is 'load',
+        'convert', 'solve', 'write' or 'done', done and total count rows (total is 0 when
+        unknown, as in the streaming mode). it is called on the converting thread.
+        """
+        self._progressCallback = callback
+
+    def cancel(self):
+        """ask translateData() to stop at its next progress report, a cancel() before it starts stops it at once"""
+        self._cancelled = True
+
+    def resetCancel(self):
+        """forget an earlier cancel(), before the Balance is queued to convert again"""
+        self._cancelled = False
+
+    def isCancelled(self):
+        return self._cancelled
+
+    def _progress(self, stage, done=0, total=0):
+        if self._cancelled:
+            raise ConversionCancelled()
+        if self._progressCallback is not None:
+            self._progressCallback(stage, done, total)
+
+    def setInputCache(self, inputCache=None, dynamic=True):
+        """cache the parsed static file, and the dynamic file too unless dynamic is False"""
+        self._inputCache = inputCache
+        self._cacheDynamic = dynamic
+
+    def setOutputFormat(self, outputFormat=TEXT):
+        if outputFormat not in OUTPUT_FORMATS:
+            return False
+        self._outputFormat = outputFormat
+        return True
 
-    def _genDataByG18(self):
-        # aircraft's _area, characteristic chord, free flow pressure, _dx, _dy, _dz, air _speed:_speed, flow pressure.
-        s = self._area          # unit: m2
-        l = self._span          # unit: m
-        ba = self._refChord     # unit: m
+    def setPrecision(self, precision=DOUBLE):
+        if precision not in PRECISIONS:
+            return False
+        self._precision = precision
+        return True
+
+    def setCalibrationTable(self, table=None):
+        """use a CalibrationTable or the table file `table` instead of calibrations/<balance style>.json, None reverts"""
+        if table is not None and not isinstance(table, CalibrationTable):
+            table = loadCalibrationTable(table)
+        self._calibrationTable = table
+
+    def setSolverMethod(self, method=NEWTON):
+        if method not in SOLVER_METHODS:
+            return False
+        self._solverMethod = method
+        return True
+
+    def setSolverTolerance(self, tol=1e-9):
+        self._solverTol = tol
+
+    def setSolverMaxIter(self, maxIter=100):
+        self._solverMaxIter = maxIter
+
+    def iterations(self):
+        """iterations used by each row in the last G18 solve"""
+        return self._iterations
+
+    def unconvergedRows(self):
+        """indices of the rows which did not converge in the last G18 solve"""
+        if self._converged is None:
+            return None
+        return (~self._converged).nonzero()[0]
+
+    def columns(self):
+        """((angleStartCol, angleEndCol), (forceStartCol, forceEndCol)) of the data files, counted from 1"""
+        return (self._angleStartCol, self._angleEndCol), (self._forceStartCol, self._forceEndCol)
+
+    def precision(self):
+        return self._precision
+
+    def _loadColumns(self, fname, cached=True):
+        """load the angle and force columns of one file, through the input cache when there is one"""
+        columns = self.columns()
+        if cached and self._inputCache is not None:
+            return self._inputCache.load(fname, self._headerRows, self._footerRows, columns, self._precision)
+        return loadColumns(fname, self._headerRows, self._footerRows, columns, self._precision)
+
+    def loadStatic(self):
+        """the static file's angle and force columns as read, parsed through the input cache when there is one"""
+        (staAngle, staForce), _, _ = self._loadColumns(self._staFile)
+        return staAngle, staForce
+
+    def _loadInputs(self):
+        """
+        load the static and dynamic files, return their angles and forces and the static file's header, footer.
+        with a tare table the static file is not read, its angles and forces are None and the dynamic
+        file gives the header and footer.
+        """
+        if self._tareTable is not None:
+            (dynAngle, dynForce), headerList, footerList = self._loadColumns(self._dynFile, self._cacheDynamic)
+            return None, None, dynAngle, dynForce, headerList, footerList
+        (staAngle, staForce), headerList, footerList = self._loadColumns(self._staFile)
+        (dynAngle, dynForce), _, _ = self._loadColumns(self._dynFile, self._cacheDynamic)
+        return staAngle, staForce, dynAngle, dynForce, headerList, footerList
+
+    def _openInputs(self):
+        """open the static and dynamic files as block readers for the streaming mode, no static one with a tare table"""
+        columns = self.columns()
+        if self._tareTable is not None:
+            staReader = None
+        elif self._inputCache is not None:
+            staReader = ArrayReader(*self._loadColumns(self._staFile), chunkRows=self._chunkRows)
+        else:
+            staReader = ColumnReader(self._staFile, self._headerRows, self._footerRows, columns, self._chunkRows,
+                                     self._precision)
+        if self._inputCache is not None and self._cacheDynamic:
+            dynReader = ArrayReader(*self._loadColumns(self._dynFile), chunkRows=self._chunkRows)
+        else:
+            dynReader = ColumnReader(self._dynFile, self._headerRows, self._footerRows, columns, self._chunkRows,
+                                     self._precision)
+        return staReader, dynReader
+
+    def _filterInputs(self, staAngle, staForce, dynAngle, dynForce):
+        """the static and dynamic files' rows after the force filter, the same arrays without one"""
+        if self._forceFilter is None:
+            return staAngle, staForce, dynAngle, dynForce
+        if staForce is not None:
+            staAngle, staForce = self._forceFilter.apply(staAngle, staForce)
+        dynAngle, dynForce = self._forceFilter.apply(dynAngle, dynForce)
+        return staAngle, staForce, dynAngle, dynForce
+
+    def openWriter(self, headerList=()):
+        """
+        the dataIO writer of the body and aero files in the output format: write(Mb, Ma) every block,
+        flush() to make them visible to readers, close(footerList) after the last one.
+        """
+        return RESULT_WRITERS[self._outputFormat](self._bodyFile, self._aeroFile, headerList)
+
+    # the incremental conversion of rows arriving a block at a time (live.py): prepareStatic() and
+    # filterStream() once, then convertBlock() for every block, written through openWriter()
+    def prepareStatic(self):
+        """
+        the static rows the blocks are tared against: (None, None) with a tare table, otherwise the
+        whole static file after the force filter, its rows matching the dynamic rows one by one.
+        """
+        if self._tareTable is not None:
+            return None, None
+        staAngle, staForce = self.loadStatic()
+        if self._forceFilter is not None:
+            staAngle, staForce = self._forceFilter.apply(staAngle, staForce)
+        return staAngle, staForce
+
+    def filterStream(self):
+        """a filters.FilterStream of the force filter over the successive dynamic blocks, None without a filter"""
+        if self._forceFilter is None:
+            return None
+        return self._forceFilter.stream(self._angleEndCol + 1 - self._angleStartCol)
+
+    def convertBlock(self, staAngle, staForce, dynAngle, dynForce, table=None, done=0):
+        """
+        tare and convert one block of dynamic rows, return the body and aero frame results, workspace
+        buffers valid until the next block. staAngle, staForce are the block's static rows (None with
+        a tare table), table defaults to calibrationTable(), done is the rows converted before the
+        block, for the progress callback. iterations() and unconvergedRows() then describe the block.
+        """
+        self._progress('convert', done)
+        self.clearStageCache()  # the block goes through the same workspace buffers as the cached stages
+        self._iterationBlocks = []
+        self._convergedBlocks = []
+        Mb, Ma = self._convert(staAngle, staForce, dynAngle, dynForce, table or self.calibrationTable())
+        if self._iterationBlocks:
+            self._iterations = concatenate(self._iterationBlocks)
+            self._converged = concatenate(self._convergedBlocks)
+        return Mb, Ma
+
+    def _tare(self, staAngle, staForce, dynAngle, dynForce):
+        ws = self._workspace
+        m, n = dynAngle.shape
+        angle = ws.get('angle', (m, n), self._precision)
+        angleR = ws.get('angleR', (m, n), self._precision)
+        Fe = ws.get('Fe', dynForce.shape, self._precision)
+        if self._tareTable is not None:
+            # the static forces come from the tare table at the dynamic angles
+            angle[...] = dynAngle
+            deg2rad(dynAngle, out=angleR)
+            tare = self._tareTable.lookup(dynAngle, out=ws.get('tare', dynForce.shape, float64))
+            subtract(dynForce, tare, out=Fe)
+            return angle, angleR, Fe
+
+        if staForce.shape != dynForce.shape:
+            raise ValueError('the static file has %d rows and the dynamic file %d, a tare table (setTareTable) '
+                             'tares runs of different lengths' % (staForce.shape[0], dynForce.shape[0]))
+        deg2rad(staAngle, out=angleR)  # change the degrees to radius
+        angleR += deg2rad(dynAngle, out=angle)  # angle holds the dynamic radius until it is set below
+        angleR /= 2.
+        add(staAngle, dynAngle, out=angle)
+        angle /= 2.
+        subtract(dynForce, staForce, out=Fe)  # Fe: the raw Force and moment of Balance at the "Body frame"in the experiment
+        return angle, angleR, Fe
+
+    def _calibrate(self, Fe, table):
+        Fbb = self._workspace.get('Fbb', Fe.shape, self._precision)  # Fbb: Force and moment of Balance at the "Body frame"
+        if table.model != ITERATIVE:
+            return table.calibration.apply(Fe, out=Fbb)
+
+        solver = FixedPointSolver(table.calibration, self._solverMethod, self._solverTol, self._solverMaxIter,
+                                  lambda it, done, total: self._progress('solve', done, total))
+        if Fbb.dtype == float64:
+            solver.solve(Fe, out=Fbb)
+        else:
+            # the nonlinear solve stays in double precision whatever the precision setting
+            Fe64 = self._workspace.get('Fe64', Fe.shape, float64)
+            Fe64[...] = Fe
+            Fbb[...] = solver.solve(Fe64, out=self._workspace.get('Fbb64', Fe.shape, float64))
+        self._iterationBlocks.append(solver.iterations)
+        self._convergedBlocks.append(solver.converged)
+        return Fbb
+
+    def _transfer(self, Fbb, postFactors=None):
         dx = self._dx           # unit: m
         dy = self._dy           # unit: m
         dz = self._dz           # unit: m
+
+        #the balance's "body frame" data translation to aircraft 's "body frame"
+        Fb = self._workspace.get('Fb', Fbb.shape, self._precision)  # Fb: Force and moment of aircraft at the "Body frame"
+        tmp = self._workspace.get('column', Fbb.shape[:1], self._precision)
+        Fb[:, :3] = Fbb[:, :3]
+        # Fb[:, 3] = Fbb[:, 3] + Fbb[:, 2] * dy - Fbb[:, 1] * dz
+        multiply(Fbb[:, 2], dy, out=Fb[:, 3])
+        Fb[:, 3] += Fbb[:, 3]
+        Fb[:, 3] -= multiply(Fbb[:, 1], dz, out=tmp)
+        # Fb[:, 4] = Fbb[:, 4] - Fbb[:, 0] * dz - Fbb[:, 2] * dx
+        multiply(Fbb[:, 0], dz, out=tmp)
+        subtract(Fbb[:, 4], tmp, out=Fb[:, 4])
+        Fb[:, 4] -= multiply(Fbb[:, 2], dx, out=tmp)
+        # Fb[:, 5] = Fbb[:, 5] + Fbb[:, 0] * dy + Fbb[:, 1] * dx
+        multiply(Fbb[:, 0], dy, out=Fb[:, 5])
+        Fb[:, 5] += Fbb[:, 5]
+        Fb[:, 5] += multiply(Fbb[:, 1], dx, out=tmp)
+        if postFactors is not None:
+            Fb *= postFactors
+        return Fb
+
+    def _rotate(self, Fb, angleR):
+        #calculate the aero data
+        Fa = self._workspace.get('Fa', Fb.shape, self._precision)  # Fa: aero's Force and moment
+        R = self._workspace.get('rotation', (min(Fb.shape[0], ROTATION_BLOCK_ROWS), 2, 3, 3), self._precision)
+        return bodyToWind(Fb, angleR, out=Fa, matrices=R)
+
+    def _normalize(self, F, angle, name):
+        """write the angles and the coefficients of F side by side into the workspace buffer `name`"""
+        # aircraft's _area, characteristic chord, free flow pressure, air _speed:_speed, flow pressure.
+        s = self._area          # unit: m2
+        l = self._span          # unit: m
+        ba = self._refChord     # unit: m
         V = self._speed         # unit: m/s
         q = 0.5 * AIR_DENSITY * V ** 2  # unit: pa
 
-        staFile = self._staFile  # static file's name
-        dynFile = self._dynFile  # dynamic file's name
-        bodyFile = self._bodyFile  # body file's name
-        aeroFile = self._aeroFile  # aero file's name
-
-        headerRows = self._headerRows  # data file's header nums
-        footerRows = self._footerRows  # data file's footer nums
-        angleStartCol = self._angleStartCol  # angle start column
-        angleEndCol = self._angleEndCol  # angle end column
-        # angleCols = angleEndCol - angleStartCol + 1  # angle columns
-        forceStartCol = self._forceStartCol  # force and moment start column
-        forceEndCol = self._forceEndCol  # force and moment end column
-        forceCols = forceEndCol - forceStartCol + 1  # force and moment columns
-
-        #load static file and dynamic file
-        staData = genfromtxt(fname=staFile, skip_header=headerRows, skip_footer=footerRows)
-        dynData = genfromtxt(fname=dynFile, skip_header=headerRows, skip_footer=footerRows)
-        staAngle, staForce = staData[:, (angleStartCol - 1):angleEndCol], staData[:, (forceStartCol - 1):forceEndCol]
-        dynAngle, dynForce = dynData[:, (angleStartCol - 1):angleEndCol], dynData[:, (forceStartCol - 1):forceEndCol]
-        staAngleR, dynAngleR = deg2rad(staAngle), deg2rad(dynAngle)  # change the degrees to radius
-        angle = (staAngle + dynAngle) / 2.
-        angleR = (staAngleR + dynAngleR) / 2.
-        m, n = staData.shape
-        # read the file's headers and footers
-        rawList = open(staFile).readlines()
-        headerList = rawList[:headerRows] if headerRows else []
-        footerList = rawList[-footerRows:] if footerRows else []
-
-        #calculate the "body frame"'s fore and moment's coefficient
-        Fe = dynForce - staForce  # Fe: the raw Force and moment of Balance at the "Body frame"in the experiment
-        Fbb = zeros(shape=(m, forceCols))  # Fbb: Force and moment of Balance at the "Body frame"
-
-        Fbb[:, 0] = 6.11960 * Fe[:, 0]
-        Fbb[:, 1] = 12.33276 * Fe[:, 1]
-        Fbb[:, 2] = 4.76279 * Fe[:, 2]
-        Fbb[:, 3] = 0.38218 * Fe[:, 3]
-        Fbb[:, 4] = 0.19456 * Fe[:, 4]
-        Fbb[:, 5] = 0.69732 * Fe[:, 5]
-        for i in range(100):
-            Fbb[:, 0] = 6.11960 * Fe[:, 0] + \
-                0.00548 * Fbb[:, 1] + 0.10290 * Fbb[:, 2] + 0.12796 * Fbb[:, 3] + \
-                1.03638 * Fbb[:, 4] - 0.21182 * Fbb[:, 5] + 0.00090 * Fbb[:, 0] * Fbb[:, 0] - \
-                0.00023 * Fbb[:, 0] * Fbb[:, 1] + 0.00034 * Fbb[:, 0] * Fbb[:, 2] + \
-                0.00198 * Fbb[:, 0] * Fbb[:, 3] + 0.00447 * Fbb[:, 0] * Fbb[:, 4] - \
-                0.00065 * Fbb[:, 0] * Fbb[:, 5] - 0.00001 * Fbb[:, 1] * Fbb[:, 2] - \
-                0.00444 * Fbb[:, 1] * Fbb[:, 3] - 0.00041 * Fbb[:, 1] * Fbb[:, 4] + \
-                0.00512 * Fbb[:, 1] * Fbb[:, 5] + 0.00014 * Fbb[:, 2] * Fbb[:, 2] - \
-                0.00243 * Fbb[:, 2] * Fbb[:, 3] - 0.00292 * Fbb[:, 2] * Fbb[:, 4] + \
-                0.00033 * Fbb[:, 2] * Fbb[:, 5] - 0.31818 * Fbb[:, 3] * Fbb[:, 3] + \
-                0.04225 * Fbb[:, 3] * Fbb[:, 4] + 0.27065 * Fbb[:, 3] * Fbb[:, 5] - \
-                0.02223 * Fbb[:, 4] * Fbb[:, 4] - 0.01045 * Fbb[:, 4] * Fbb[:, 5] - \
-                0.02171 * Fbb[:, 5] * Fbb[:, 5]
-            Fbb[:, 1] = 12.33276 * Fe[:, 1] - \
-                0.01686 * Fbb[:, 0] + 0.01297 * Fbb[:, 2] - 0.23388 * Fbb[:, 3] - \
-                0.19139 * Fbb[:, 4] + 0.18227 * Fbb[:, 5] - 0.00010 * Fbb[:, 1] * Fbb[:, 1] - \
-                0.00010 * Fbb[:, 1] * Fbb[:, 0] + 0.00004 * Fbb[:, 1] * Fbb[:, 2] - \
-                0.00274 * Fbb[:, 1] * Fbb[:, 3] + 0.00056 * Fbb[:, 1] * Fbb[:, 4] + \
-                0.00107 * Fbb[:, 1] * Fbb[:, 5] + 0.00045 * Fbb[:, 0] * Fbb[:, 0] + \
-                0.00030 * Fbb[:, 0] * Fbb[:, 2] + 0.00077 * Fbb[:, 0] * Fbb[:, 3] + \
-                0.00181 * Fbb[:, 0] * Fbb[:, 4] - 0.00549 * Fbb[:, 0] * Fbb[:, 5] - \
-                0.00006 * Fbb[:, 2] * Fbb[:, 2] - 0.01497 * Fbb[:, 2] * Fbb[:, 3] + \
-                0.00340 * Fbb[:, 2] * Fbb[:, 4] + 0.00213 * Fbb[:, 2] * Fbb[:, 5] - \
-                0.03901 * Fbb[:, 3] * Fbb[:, 3] - 0.15065 * Fbb[:, 3] * Fbb[:, 4] + \
-                0.02407 * Fbb[:, 3] * Fbb[:, 5] + 0.00754 * Fbb[:, 4] * Fbb[:, 4] + \
-                0.02244 * Fbb[:, 4] * Fbb[:, 5] - 0.01096 * Fbb[:, 5] * Fbb[:, 5]
-            Fbb[:, 2] = 4.76279 * Fe[:, 2] - \
-                0.02295 * Fbb[:, 1] + 0.00338 * Fbb[:, 0] - 0.17365 * Fbb[:, 3] - 0.36139 * Fbb[:, 4] + \
-                0.00857 * Fbb[:, 5] + 0.00032 * Fbb[:, 2] * Fbb[:, 2] - 0.00009 * Fbb[:, 2] * Fbb[:, 1] - \
-                0.00016 * Fbb[:, 2] * Fbb[:, 0] + 0.00366 * Fbb[:, 2] * Fbb[:, 3] - 0.00382 * Fbb[:, 2] * Fbb[:, 4] + \
-                0.00146 * Fbb[:, 2] * Fbb[:, 5] + 0.00031 * Fbb[:, 1] * Fbb[:, 1] - 0.00050 * Fbb[:, 1] * Fbb[:, 0] + \
-                0.02079 * Fbb[:, 1] * Fbb[:, 3] - 0.00222 * Fbb[:, 1] * Fbb[:, 4] - 0.00709 * Fbb[:, 1] * Fbb[:, 5] + \
-                0.00045 * Fbb[:, 0] * Fbb[:, 0] + 0.00588 * Fbb[:, 0] * Fbb[:, 3] + 0.01732 * Fbb[:, 0] * Fbb[:, 4] - \
-                0.00223 * Fbb[:, 0] * Fbb[:, 5] - 0.12878 * Fbb[:, 3] * Fbb[:, 3] + 0.09362 * Fbb[:, 3] * Fbb[:, 4] - \
-                0.24968 * Fbb[:, 3] * Fbb[:, 5] + 0.08996 * Fbb[:, 4] * Fbb[:, 4] + 0.01747 * Fbb[:, 4] * Fbb[:, 5] + \
-                0.01161 * Fbb[:, 5] * Fbb[:, 5]
-            Fbb[:, 3] = 0.38218 * Fe[:, 3] + \
-                0.00068 * Fbb[:, 1] - 0.00015 * Fbb[:, 2] + 0.00010 * Fbb[:, 0] - 0.0073 * Fbb[:, 4] + \
-                0.01998 * Fbb[:, 5] - 0.00141 * Fbb[:, 3] * Fbb[:, 3] - 0.00067 * Fbb[:, 3] * Fbb[:, 1] - \
-                0.00055 * Fbb[:, 3] * Fbb[:, 2] + 0.00016 * Fbb[:, 3] * Fbb[:, 0] - 0.00475 * Fbb[:, 3] * Fbb[:, 4] + \
-                0.00236 * Fbb[:, 3] * Fbb[:, 5] - 0.00001 * Fbb[:, 1] * Fbb[:, 1] + 0.00001 * Fbb[:, 2] * Fbb[:, 1] + \
-                0.00002 * Fbb[:, 1] * Fbb[:, 0] + 0.00025 * Fbb[:, 1] * Fbb[:, 4] + 0.00025 * Fbb[:, 1] * Fbb[:, 5] - \
-                0.00003 * Fbb[:, 2] * Fbb[:, 2] + 0.00002 * Fbb[:, 2] * Fbb[:, 0] + 0.00026 * Fbb[:, 2] * Fbb[:, 4] + \
-                0.00004 * Fbb[:, 2] * Fbb[:, 5] - 0.00004 * Fbb[:, 0] * Fbb[:, 0] - 0.00042 * Fbb[:, 0] * Fbb[:, 4] + \
-                0.00023 * Fbb[:, 0] * Fbb[:, 5] - 0.00954 * Fbb[:, 4] * Fbb[:, 4] - 0.00136 * Fbb[:, 4] * Fbb[:, 5] + \
-                0.00219 * Fbb[:, 5] * Fbb[:, 5]
-            Fbb[:, 4] = 0.19456 * Fe[:, 4] - \
-                0.00007 * Fbb[:, 1] + 0.00227 * Fbb[:, 2] + 0.00113 * Fbb[:, 3] - 0.00012 * Fbb[:, 0] + \
-                0.00488 * Fbb[:, 5] + 0.00714 * Fbb[:, 4] * Fbb[:, 4] + 0.00000 * Fbb[:, 4] * Fbb[:, 1] - \
-                0.00010 * Fbb[:, 4] * Fbb[:, 2] - 0.00955 * Fbb[:, 4] * Fbb[:, 3] + 0.00158 * Fbb[:, 0] * Fbb[:, 0] - \
-                0.00279 * Fbb[:, 4] * Fbb[:, 5] + 0.00001 * Fbb[:, 1] * Fbb[:, 1] + 0.00058 * Fbb[:, 1] * Fbb[:, 3] - \
-                0.00035 * Fbb[:, 1] * Fbb[:, 5] + 0.00001 * Fbb[:, 2] * Fbb[:, 2] - 0.00035 * Fbb[:, 2] * Fbb[:, 3] - \
-                0.00005 * Fbb[:, 2] * Fbb[:, 0] - 0.00006 * Fbb[:, 2] * Fbb[:, 5] - 0.00180 * Fbb[:, 3] * Fbb[:, 3] + \
-                0.00022 * Fbb[:, 3] * Fbb[:, 0] - 0.02256 * Fbb[:, 3] * Fbb[:, 5] - 0.00005 * Fbb[:, 0] * Fbb[:, 0] + \
-                0.00090 * Fbb[:, 0] * Fbb[:, 5] - 0.00117 * Fbb[:, 5] * Fbb[:, 5]
-            Fbb[:, 5] = 0.69732 * Fe[:, 5] + \
-                0.00041 * Fbb[:, 1] - 0.00087 * Fbb[:, 2] - 0.05093 * Fbb[:, 3] - 0.03029 * Fbb[:, 4] + \
-                0.00121 * Fbb[:, 0] - 0.00147 * Fbb[:, 5] * Fbb[:, 5] - 0.00009 * Fbb[:, 5] * Fbb[:, 1] + \
-                0.00000 * Fbb[:, 5] * Fbb[:, 2] + 0.00302 * Fbb[:, 5] * Fbb[:, 3] - 0.00159 * Fbb[:, 5] * Fbb[:, 4] + \
-                0.00169 * Fbb[:, 5] * Fbb[:, 0] - 0.00019 * Fbb[:, 1] * Fbb[:, 3] - 0.00007 * Fbb[:, 1] * Fbb[:, 4] + \
-                0.00001 * Fbb[:, 1] * Fbb[:, 0] - 0.00001 * Fbb[:, 2] * Fbb[:, 2] + 0.00035 * Fbb[:, 2] * Fbb[:, 3] + \
-                0.00011 * Fbb[:, 2] * Fbb[:, 4] + 0.00001 * Fbb[:, 2] * Fbb[:, 0] - 0.00497 * Fbb[:, 3] * Fbb[:, 3] + \
-                0.01545 * Fbb[:, 3] * Fbb[:, 4] - 0.00069 * Fbb[:, 3] * Fbb[:, 0] - 0.00108 * Fbb[:, 4] * Fbb[:, 4] + \
-                0.00031 * Fbb[:, 4] * Fbb[:, 5] + 0.00001 * Fbb[:, 0] * Fbb[:, 0]
-
-        #the balance's "body frame" data translation to aircraft 's "body frame"
-        Fb = zeros(shape=(m, forceCols))  # Fb: Force and moment of aircraft at the "Body frame"
-        Fb[:, 0] = Fbb[:, 0] * 0.95
-        Fb[:, 1] = Fbb[:, 1] * 0.98
-        Fb[:, 2] = Fbb[:, 2]
-        Fb[:, 3] = Fbb[:, 3] + Fbb[:, 2] * dy - Fbb[:, 1] * dz
-        Fb[:, 4] = Fbb[:, 4] - Fbb[:, 0] * dz - Fbb[:, 2] * dx
-        Fb[:, 5] = (Fbb[:, 5] + Fbb[:, 0] * dy + Fbb[:, 1] * dx) * 0.56
+        # C: Coefficient of force and moment
+        n = angle.shape[1]
+        M = self._workspace.get(name, (F.shape[0], n + F.shape[1]), self._precision)
+        M[:, :n] = angle
+        C = M[:, n:]
+        multiply(F, 9.8, out=C)
+        C[:, :3] /= (q * s)
+        C[:, 3:5] /= (q * s * l)
+        C[:, 5] /= (q * s * ba)
+        return M
+
+    def _convertStaged(self, table):
+        """the whole-file conversion, each stage reused from the last run while its dependencies are unchanged"""
+        keys = self._stageKeys(table)
+        staAngle, staForce, dynAngle, dynForce, headerList, footerList = self._stage('load', keys, self._loadInputs)
+        if self._recorder is not None:
+            self._recorder.inputRows = self._recorder.stages['load'].rows = dynForce.shape[0]
+        staAngle, staForce, dynAngle, dynForce = self._stage(
+            'filter', keys, lambda: self._filterInputs(staAngle, staForce, dynAngle, dynForce), dynForce.shape[0])
+        m = dynForce.shape[0]
+        self._progress('convert', 0, m)
+        angle, angleR, Fe = self._stage('tare', keys, lambda: self._tare(staAngle, staForce, dynAngle, dynForce), m)
+        if self._workers > 1 and not self._isCached('calibrate', keys):
+            # the sharded stages run fused, their results are remembered as if run one by one
+            for name in STAGES[STAGES.index('calibrate'):]:
+                self._stageCache.pop(name, None)
+            Fbb, Fb, Fa, Mb, Ma = self._convertRows(angle, angleR, Fe, table)
+            for name, result in zip(STAGES[STAGES.index('calibrate'):], (Fbb, Fb, Fa, (Mb, Ma))):
+                self._remember(name, keys, result)
+            return Mb, Ma, headerList, footerList
+        Fbb = self._stage('calibrate', keys, lambda: self._calibrate(Fe, table), m)
+        Fb = self._stage('transfer', keys, lambda: self._transfer(Fbb, table.postFactors), m)
+        Fa = self._stage('rotate', keys, lambda: self._rotate(Fb, angleR), m)
+        Mb, Ma = self._stage('normalize', keys, lambda: (self._normalize(Fb, angle, 'Mb'),
+                                                         self._normalize(Fa, angle, 'Ma')), m)
+        return Mb, Ma, headerList, footerList
+
+    def _convert(self, staAngle, staForce, dynAngle, dynForce, table):
+        """convert one block of rows, return the body frame and aero frame results"""
+        angle, angleR, Fe = self._measure('tare', lambda: self._tare(staAngle, staForce, dynAngle, dynForce),
+                                          dynForce.shape[0])
+        Fbb, Fb, Fa, Mb, Ma = self._convertRows(angle, angleR, Fe, table)
+        return Mb, Ma
+
+    def _convertRows(self, angle, angleR, Fe, table):
+        """
+        the stages after the tare, sharded over the worker pool when setParallel asked for one;
+        the sharded stages run fused and are recorded together as 'convert'.
+        """
+        m = Fe.shape[0]
+        if self._workers > 1 and len(self._shardBounds(m)) > 1:
+            return self._measure('convert', lambda: self._convertParallel(angle, angleR, Fe, table), m)
+        Fbb = self._measure('calibrate', lambda: self._calibrate(Fe, table), m)
+        Fb = self._measure('transfer', lambda: self._transfer(Fbb, table.postFactors), m)
+        Fa = self._measure('rotate', lambda: self._rotate(Fb, angleR), m)
+        # Coefficient of force and moment at the Body frame and at the Aero frame
+        Mb, Ma = self._measure('normalize', lambda: (self._normalize(Fb, angle, 'Mb'),
+                                                     self._normalize(Fa, angle, 'Ma')), m)
+        return Fbb, Fb, Fa, Mb, Ma
+
+    def _shardBounds(self, m):
+        shards = max(1, min(self._workers * SHARDS_PER_WORKER, m // SHARD_MIN_ROWS))
+        edges = [m * i // shards for i in range(shards + 1)]
+        return zip(edges[:-1], edges[1:])
+
+    def _shardState(self):
+        """the attributes a shard needs, without the caches, buffers and callbacks of this Balance"""
+        state = dict(self.__dict__)
+        state.update(_progressCallback=None, _stageCache={}, _workspace=None, _inputCache=None,
+                     _iterationBlocks=[], _convergedBlocks=[], _workers=0, _recorder=None,
+                     _stageCallback=None, _resultCallback=None)
+        return state
+
+    def _convertParallel(self, angle, angleR, Fe, table):
+        """
+        run the calibrate, transfer, rotate and normalize stages of each row shard on the pool.
+        every shard writes its rows of the workspace's full size buffers, nothing is copied back.
+        """
+        m, n = angle.shape
+        ws, dtype = self._workspace, self._precision
+        rows = {'angle': angle, 'angleR': angleR, 'Fe': Fe,
+                'Fbb': ws.get('Fbb', Fe.shape, dtype), 'Fb': ws.get('Fb', Fe.shape, dtype),
+                'Fa': ws.get('Fa', Fe.shape, dtype), 'Mb': ws.get('Mb', (m, n + Fe.shape[1]), dtype),
+                'Ma': ws.get('Ma', (m, n + Fe.shape[1]), dtype)}
+        shards = self._shardBounds(m)
+        if self._parallelMode == PROCESSES:
+            spec = ws.spec(rows)
+            state = self._shardState()
+            pool = Pool(self._workers)
+            results = pool.imap_unordered(_convertShard, [(self.__class__, state, table, spec, start, stop)
+                                                          for start, stop in shards])
+        else:
+            def convertShard(bounds):
+                start, stop = bounds
+                shard = copy.copy(self)
+                shard.__dict__.update(self._shardState())
+                shard._workspace = ShardWorkspace(rows, start, stop)
+                shard._convertRows(angle[start:stop], angleR[start:stop], Fe[start:stop], table)
+                return start, shard._iterationBlocks, shard._convergedBlocks
+            pool = ThreadPool(self._workers)
+            results = pool.imap_unordered(convertShard, shards)
 
-        #calculate the aero data
-        Fa = zeros(shape=(m, forceCols))  # Fa: aero's Force and moment
-        Fa[:, 0] = cos(angleR[:, 0]) * cos(angleR[:, 1]) * Fb[:, 0] + \
-            sin(angleR[:, 0]) * cos(angleR[:, 1]) * Fb[:, 1] - sin(angleR[:, 1]) * Fb[:, 2]
-        Fa[:, 1] = - sin(angleR[:, 0]) * Fb[:, 0] + cos(angleR[:, 0]) * Fb[:, 1]
-        Fa[:, 2] = cos(angleR[:, 0]) * sin(angleR[:, 1]) * Fb[:, 0] + \
-            sin(angleR[:, 0]) * sin(angleR[:, 1]) * Fb[:, 1] + cos(angleR[:, 1]) * Fb[:, 2]
-        Fa[:, 3] = cos(angleR[:, 0]) * cos(angleR[:, 1]) * Fb[:, 3] - \
-            sin(angleR[:, 0]) * cos(angleR[:, 0]) * Fb[:, 4] + sin(angleR[:, 1]) * Fb[:, 5]
-        Fa[:, 4] = sin(angleR[:, 0]) * Fb[:, 3] + cos(angleR[:, 0]) * Fb[:, 4]
-        Fa[:, 5] = - cos(angleR[:, 0]) * sin(angleR[:, 1]) * Fb[:, 3] + \
-            sin(angleR[:, 0]) * sin(angleR[:, 1]) * Fb[:, 4] + cos(angleR[:, 1]) * Fb[:, 5]
-
-        # Cb: Coefficient of force and moment at the Body frame
-        Cb = zeros(shape=(m, forceCols))
-        Cb[:, :3] = Fb[:, :3] * 9.8 / (q * s)
-        Cb[:, 3:5] = Fb[:, 3:5] * 9.8 / (q * s * l)
-        Cb[:, 5] = Fb[:, 5] * 9.8 / (q * s * ba)
-        # Ca: Coefficient of force and moment at the Aero frame
-        Ca = zeros(shape=(m, forceCols))
-        Ca[:, :3] = Fa[:, :3] * 9.8 / (q * s)
-        Ca[:, 3:5] = Fa[:, 3:5] * 9.8 / (q * s * l)
-        Ca[:, 5] = Fa[:, 5] * 9.8 / (q * s * ba)
-
-        Mb = hstack((angle, Cb))
-        Ma = hstack((angle, Ca))
-
-        savetxt(bodyFile, Mb, fmt='%-15.8f',
-                header=''.join(headerList).strip(),
-                footer=''.join(footerList).strip(),
-                comments='')
-        savetxt(aeroFile, Ma, fmt='%-15.8f',
-                header=''.join(headerList).strip(),
-                footer=''.join(footerList).strip(),
-                comments='')
+        try:
+            done, stats = 0, {}
+            for start, iterationBlocks, convergedBlocks in results:
+                stats[start] = (iterationBlocks, convergedBlocks)
+                done += dict(shards)[start] - start
+                self._progress('convert', done, m)
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+        for start in sorted(stats):
+            self._iterationBlocks.extend(stats[start][0])
+            self._convergedBlocks.extend(stats[start][1])
+        return rows['Fbb'], rows['Fb'], rows['Fa'], rows['Mb'], rows['Ma']
+
+    def _genData(self, table):
+        self._iterationBlocks = []
+        self._convergedBlocks = []
+        if self._chunkRows:
+            self._genDataByChunks(table)
+        else:
+            self._progress('load')
+            Mb, Ma, headerList, footerList = self._convertStaged(table)
+            m = Mb.shape[0]
+            self._progress('write', 0, m)
+            self._measure('write', lambda: self._write(Mb, Ma, headerList, footerList), m)
+            if self._recorder is not None:
+                self._recorder.outputRows = m
+            self._progress('done', m, m)
+        if self._iterationBlocks:
+            self._iterations = concatenate(self._iterationBlocks)
+            self._converged = concatenate(self._convergedBlocks)
         return True
 
+    def _write(self, Mb, Ma, headerList, footerList):
+        with self.openWriter(headerList) as writer:
+            writer.write(Mb, Ma)
+            writer.close(footerList)
+
+    def _genDataByChunks(self, table):
+        """streaming mode: convert matching row blocks of the static and dynamic files and append the results"""
+        self._progress('load')
+        self.clearStageCache()  # the blocks go through the same workspace buffers as the cached stages
+        staReader, dynReader = self._openInputs()
+        headerReader = dynReader if staReader is None else staReader
+        if staReader is None:
+            blocks = (((None, None), dynBlock) for dynBlock in dynReader)
+        else:
+            blocks = izip_longest(staReader, dynReader)
+        streams = self._filterStreams(staReader is not None) if self._forceFilter is not None else None
+        rows = 0
+        try:
+            with self.openWriter(headerReader.headerList) as writer:
+                while True:
+                    pair = self._measure('load', lambda: next(blocks, None))
+                    if pair is None:
+                        break
+                    staBlock, dynBlock = pair
+                    if staBlock is None or dynBlock is None:
+                        raise ValueError('the static file and the dynamic file have different rows')
+                    if self._recorder is not None:
+                        self._recorder.inputRows += dynBlock[1].shape[0]
+                    if streams is not None:
+                        staBlock, dynBlock = self._measure('filter', lambda: self._filterBlock(streams, staBlock,
+                                                                                               dynBlock))
+                    rows += self._convertBlock(writer, staBlock, dynBlock, table, rows)
+                if streams is not None:
+                    # the rows the filter windows held back
+                    staBlock, dynBlock = self._measure('filter', lambda: self._filterBlock(streams))
+                    rows += self._convertBlock(writer, staBlock, dynBlock, table, rows)
+                writer.close(headerReader.footerList)
+        finally:
+            for reader in (staReader, dynReader):
+                if reader is not None:
+                    reader.close()
+        if self._recorder is not None:
+            self._recorder.outputRows = rows
+        self._progress('done', rows, rows)
+
+    def _convertBlock(self, writer, staBlock, dynBlock, table, rows):
+        """convert and write one streaming block, return its rows"""
+        if dynBlock[1] is None or not dynBlock[1].shape[0]:
+            return 0
+        self._progress('convert', rows)
+        Mb, Ma = self._convert(staBlock[0], staBlock[1], dynBlock[0], dynBlock[1], table)
+        self._measure('write', lambda: writer.write(Mb, Ma), Mb.shape[0])
+        return Mb.shape[0]
+
+    def _filterStreams(self, static=True):
+        """the force filter's streams of the static (None without a static file) and the dynamic file"""
+        angleCols = self._angleEndCol + 1 - self._angleStartCol
+        return (self._forceFilter.stream(angleCols) if static else None), self._forceFilter.stream(angleCols)
+
+    def _filterBlock(self, streams, staBlock=None, dynBlock=None):
+        """
+        one (static, dynamic) block pair through the filter streams, fewer rows while the windows wait
+        for the next block; without blocks, the rows held back at the end of the files.
+        """
+        staStream, dynStream = streams
+        if dynBlock is None:
+            return (staStream.finish() if staStream is not None else (None, None)), dynStream.finish()
+        if staStream is not None:
+            staBlock = staStream.push(*staBlock)
+        return staBlock, dynStream.push(*dynBlock)
+
+    def calibrationTable(self):
+        """the table set by setCalibrationTable, otherwise the one named after the balance style"""
+        if self._calibrationTable is not None:
+            return self._calibrationTable
+        return findCalibrationTable(BALANCE_NAMES.get(self._balanceSty, self._balanceSty))
+
+    def _genDataByTable(self):
+        return self._genData(self.calibrationTable())
+
+    def _genDataByG16(self):
+        return self._genDataByTable()
+
+    def _genDataByG14(self):
+        return self._genDataByTable()
+
+    def _genDataByG18(self):
+        return self._genDataByTable()
+
     def _genDataByBox(self):
-        pass
+        return self._genDataByTable()
 
     def translateData(self):
-        if self._balanceSty == 0:  # 14杆天平
-            if self._genDataByG14():
-                return True
-        if self._balanceSty == 1:  # 16杆
-            if self._genDataByG16():
-                return True
-        if self._balanceSty == 2:  # 18杆
-            if self._genDataByG18():
-                return True
-        if self._balanceSty == 3:  # 盒式天平
-            if self._genDataByBox():
-                return True
-
-        return False
+        """
+        convert the files, return an instrument.ConversionResult: true when the conversion succeeded,
+        with each stage's time and memory, the rows, the G18 iterations and the error that stopped it.
+        errors are captured in the result, only ConversionCancelled propagates.
+        """
+        result = ConversionResult(self._balanceSty)
+        # per-stage memory in the whole-file mode only, the streaming mode's blocks are too many to sample
+        self._recorder = recorder = StageRecorder(self._trackMemory and not self._chunkRows, self._stageCallback)
+        meter = PeakMeter() if self._trackMemory else None
+        if meter is not None:
+            meter.start()
+        start = time.time()
+        try:
+            if self._balanceSty == 0:  # 14杆天平
+                result.ok = bool(self._genDataByG14())
+            elif self._balanceSty == 1:  # 16杆
+                result.ok = bool(self._genDataByG16())
+            elif self._balanceSty == 2:  # 18杆
+                result.ok = bool(self._genDataByG18())
+            elif self._balanceSty == 3:  # 盒式天平
+                result.ok = bool(self._genDataByBox())
+            else:
+                result.error = ValueError('unknown balance style %r' % (self._balanceSty,))
+        except ConversionCancelled:
+            raise
+        except Exception, msg:
+            result.error = msg
+            result.traceback = traceback.format_exc()
+        finally:
+            self._recorder = None
+        result.seconds = time.time() - start
+
+        result.stages = recorder.stages
+        result.inputRows, result.outputRows = recorder.inputRows, recorder.outputRows
+        if meter is not None:
+            result.peakBytes = max(0, max(meter.peak(), recorder.peak) - meter.before)
+        result.workspaceBytes = self._workspace.nbytes()
+        # the G18 statistics of this run's solve, or of the one its cached calibrate stage came from
+        solved = self._iterationBlocks or ('calibrate' in recorder.stages and recorder.stages['calibrate'].cached)
+        if result.ok and solved and self._iterations is not None and self._iterations.size:
+            result.iterations = {'mean': float(self._iterations.mean()), 'max': int(self._iterations.max())}
+            result.unconvergedRows = int((~self._converged).sum())
+        if self._resultCallback is not None:
+            self._resultCallback(result)
+        return result
+
+    def analyseOscillation(self, kineticsSty, frequency, bins=oscillation.PHASE_BINS, frame='body'):
+        """
+        the derivatives and phase-averaged loops of a forced oscillation run (see oscillation.py),
+        kineticsSty one of oscillation.PITCH, ROLL, YAW and frequency in Hz. the conversion is the
+        whole-file one, so a translateData() just before is reused through the stage cache.
+        """
+        self._iterationBlocks = []
+        self._convergedBlocks = []
+        Mb, Ma, headerList, footerList = self._convertStaged(self.calibrationTable())
+        M = Mb if frame == 'body' else Ma
+        n = (self._angleEndCol - self._angleStartCol) + 1
+        refLength = self._refChord if kineticsSty == oscillation.PITCH else self._span
+        return oscillation.analyseOscillation(M[:, :n], M[:, n:], kineticsSty, frequency, refLength,
+                                              self._speed, bins=bins)
 
 
 if __name__ == '__main__':
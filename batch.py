@@ -0,0 +1,164 @@
+# -*-coding: utf-8 -*-
+"""
+this is the batch conversion programming.
+
+本文件按运行清单(manifest)批量转换实验数据, 多个进程并行处理, 多个运行共用的静态文件只解析一次.
+清单为json文件:
+{
+    "defaults": {"balanceSty": "G18", "headerRows": 1, "angleStartCol": 1, "angleEndCol": 4,
+                 "forceStartCol": 5, "forceEndCol": 10, "aircraft": "SACCON-Params.txt"},
+    "runs": [
+        {"name": "run01", "sta": "sta01.txt", "dyn": "dyn01.txt", "body": "body01.txt", "aero": "aero01.txt"},
+        {"name": "run02", "sta": "sta01.txt", "dyn": "dyn02.txt", "body": "body02.txt", "aero": "aero02.txt",
+         "aircraft": {"area": 0.0521, "span": 0.4, "refChord": 0.1246, "speed": 25.}}
+    ]
+}
+相对路径相对于清单文件所在目录. 运行中给出"tare": "linear"(或bilinear、nearest)时,
+以静态文件建立零读数表(tare.TareTable)为动态数据去零, 静态文件与动态文件的行数可以不同.
+运行中给出"filter": {"despike": 7, "sigma": 3, "lowpass": 9, "decimate": 10}时, 校准前先对原始数据滤波
+(filters.ForceFilter, 参数同其构造函数).
+"""
+from __future__ import division
+import json
+import os
+import shutil
+import tempfile
+import time
+from multiprocessing import Pool, cpu_count
+from aircraft import AircraftModel, loadAircraftModel
+from balance import Balance, BALANCE_STYLES, DOUBLE
+from dataCache import InputCache
+from filters import ForceFilter
+from workspace import Workspace
+
+PATH_KEYS = ('sta', 'dyn', 'body', 'aero')
+BALANCE_KEYS = ('headerRows', 'footerRows', 'angleStartCol', 'angleEndCol', 'forceStartCol', 'forceEndCol',
+                'chunkRows', 'outputFormat', 'solverMethod', 'solverTol', 'solverMaxIter', 'precision')
+CACHE_MAX_BYTES = 4 << 30
+_workspace = Workspace()  # one per worker process, reused by the runs it converts
+
+
+def loadManifest(fname):
+    """read a manifest file, return its runs with the defaults applied and the paths made absolute"""
+    with open(fname) as f:
+        manifest = json.load(f)
+    baseDir = os.path.dirname(os.path.abspath(fname))
+    runs = []
+    for i, spec in enumerate(manifest['runs']):
+        run = dict(manifest.get('defaults', {}))
+        run.update(spec)
+        run.setdefault('name', 'run%d' % (i + 1))
+        for key in PATH_KEYS:
+            run[key] = os.path.join(baseDir, run[key])
+        if isinstance(run.get('aircraft'), basestring):
+            run['aircraft'] = os.path.join(baseDir, run['aircraft'])
+        runs.append(run)
+    return runs
+
+
+def makeBalance(run):
+    """build the Balance of one run"""
+    aircraft = run.get('aircraft')
+    if isinstance(aircraft, basestring):
+        aircraftModel = loadAircraftModel(aircraft)
+    else:
+        aircraftModel = AircraftModel(**(aircraft or {}))
+    balanceSty = run.get('balanceSty', 2)
+    if isinstance(balanceSty, basestring):
+        balanceSty = BALANCE_STYLES[balanceSty.upper()]
+    kwargs = dict((key, run[key]) for key in BALANCE_KEYS if key in run)
+    return Balance(run['sta'], run['dyn'], run['body'], run['aero'],
+                   aircraftModel=aircraftModel, balanceSty=balanceSty, **kwargs)
+
+
+def _primeStatic(args):
+    """parse one static file into the shared cache"""
+    run, cacheDir = args
+    try:
+        balance = makeBalance(run)
+        balance.setInputCache(InputCache(cacheDir, CACHE_MAX_BYTES), dynamic=False)
+        balance.loadStatic()
+    except Exception:
+        pass  # reported by the run's own conversion
+
+
+def _convert(args):
+    """convert one run, return its status"""
+    index, run, cacheDir = args
+    status = {'index': index, 'name': run['name'], 'ok': False, 'error': None, 'seconds': 0.,
+              'unconvergedRows': 0, 'result': None}
+    start = time.time()
+    try:
+        balance = makeBalance(run)
+        balance.setInputCache(InputCache(cacheDir, CACHE_MAX_BYTES), dynamic=False)
+        balance.setWorkspace(_workspace)
+        if run.get('tare'):
+            balance.buildTareTable(run['tare'])
+        if run.get('filter'):
+            balance.setForceFilter(ForceFilter(**run['filter']))
+        result = balance.translateData()
+        status['ok'] = bool(result)
+        status['result'] = result.asDict()  # stage times and memory, plain types to cross the pool
+        if not status['ok']:
+            status['error'] = status['result']['error'] or 'conversion failed'
+        unconverged = balance.unconvergedRows()
+        if unconverged is not None:
+            status['unconvergedRows'] = len(unconverged)
+    except Exception, msg:
+        status['error'] = '%s: %s' % (type(msg).__name__, msg)
+    status['seconds'] = time.time() - start
+    return status
+
+
+def runBatch(runs, workers=None, cacheDir=None, callback=None):
+    """
+    convert the runs on a pool of `workers` processes (all cores by default).
+
+    the static files are parsed once into an InputCache in cacheDir (a temporary
+    directory when not given) before the conversions start, so runs sharing a static
+    file never parse it again. callback(status) is called as each run finishes.
+    return the runs' statuses in the manifest's order.
+    """
+    workers = workers or cpu_count()
+    tmpCache = cacheDir is None
+    if tmpCache:
+        cacheDir = tempfile.mkdtemp(prefix='balance-cache-')
+    pool = Pool(workers)
+    try:
+        statics = {}
+        for run in runs:
+            key = (run['sta'], run.get('headerRows', 1), run.get('footerRows', 0),
+                   run.get('angleStartCol', 0), run.get('angleEndCol', 3),
+                   run.get('forceStartCol', 4), run.get('forceEndCol', 9), run.get('precision', DOUBLE))
+            statics.setdefault(key, run)
+        pool.map(_primeStatic, [(run, cacheDir) for run in statics.values()])
+
+        statuses = [None] * len(runs)
+        for status in pool.imap_unordered(_convert, [(i, run, cacheDir) for i, run in enumerate(runs)]):
+            statuses[status['index']] = status
+            if callback is not None:
+                callback(status)
+        return statuses
+    finally:
+        pool.close()
+        pool.join()
+        if tmpCache:
+            shutil.rmtree(cacheDir, ignore_errors=True)
+
+
+def printStatus(status):
+    print '%-20s %-6s %8.2f s  %s' % (status['name'], 'ok' if status['ok'] else 'FAILED', status['seconds'],
+                                       status['error'] or '')
+
+
+if __name__ == '__main__':
+    import argparse
+    from multiprocessing import freeze_support
+    freeze_support()
+    parser = argparse.ArgumentParser(description=u'按运行清单批量转换实验数据')
+    parser.add_argument('manifest')
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('--cache-dir', default=None)
+    args = parser.parse_args()
+    results = runBatch(loadManifest(args.manifest), args.workers, args.cache_dir, printStatus)
+    raise SystemExit(0 if all(r['ok'] for r in results) else 1)
@@ -0,0 +1,58 @@
+# -*-coding: utf-8 -*-
+"""
+this is the data file loader's benchmark.
+
+对比genfromtxt与dataIO.loadColumns读取角度列、力和力矩列的耗时.
+usage: python benchLoader.py [rows ...]
+"""
+from __future__ import division
+import os
+import sys
+import tempfile
+import time
+from numpy import (genfromtxt, savetxt, hstack, linspace, repeat, zeros)
+from numpy.random import RandomState
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dataIO import loadColumns
+
+COLUMNS = ((1, 4), (5, 10))
+
+
+def makeDataFile(fname, rows, seed=0):
+    """write a synthetic balance file: 4 angle columns, 6 force and moment columns"""
+    rand = RandomState(seed)
+    angle = zeros((rows, 4))
+    angle[:, 0] = repeat(linspace(-10., 30., rows // 50 + 1), 50)[:rows]
+    angle[:, 1] = rand.choice([-4., 0., 4.], rows)
+    force = rand.normal(0.5, 1.0, (rows, 6))
+    savetxt(fname, hstack((angle, force)), fmt='%.6f', header='alpha beta phi t Fx Fy Fz Mx My Mz', comments='')
+
+
+def loadByGenfromtxt(fname, headerRows, footerRows):
+    data = genfromtxt(fname=fname, skip_header=headerRows, skip_footer=footerRows)
+    angle, force = data[:, 0:4], data[:, 4:10]
+    rawList = open(fname).readlines()
+    return angle, force, rawList[:headerRows], rawList[-footerRows:] if footerRows else []
+
+
+def bench(rows):
+    fd, fname = tempfile.mkstemp(suffix='.txt')
+    os.close(fd)
+    try:
+        makeDataFile(fname, rows)
+        t0 = time.time()
+        refAngle, refForce, _, _ = loadByGenfromtxt(fname, 1, 0)
+        t1 = time.time()
+        (angle, force), _, _ = loadColumns(fname, 1, 0, COLUMNS)
+        t2 = time.time()
+        assert (angle == refAngle).all() and (force == refForce).all()
+        print '%10d rows    genfromtxt %8.3f s    loadColumns %8.3f s    speedup %6.1fx' % \
+            (rows, t1 - t0, t2 - t1, (t1 - t0) / (t2 - t1))
+    finally:
+        os.remove(fname)
+
+
+if __name__ == '__main__':
+    for n in [int(float(a)) for a in sys.argv[1:]] or [10000, 100000, 1000000]:
+        bench(n)
@@ -0,0 +1,59 @@
+# -*-coding: utf-8 -*-
+"""
+this is the precision option's accuracy and speed comparison.
+
+对比Balance双精度(float64)与单精度(float32)转换结果的误差和耗时, G16、G18天平各转换一次,
+误差为各系数列的最大绝对误差及其与该列最大值之比.
+usage: python benchPrecision.py [rows ...]
+"""
+from __future__ import division
+import os
+import shutil
+import sys
+import tempfile
+import time
+from numpy import abs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aircraft import AircraftModel
+from balance import Balance, BALANCE_STYLES, DOUBLE, SINGLE
+from dataIO import NPY, openResult
+from benchLoader import makeDataFile
+
+AIRCRAFT = AircraftModel(0.0521, 0.4, 0.2759, 0.1246, 0.01, -0.02, 0.03, 25.)
+NAMES = ('CX', 'CY', 'CZ', 'Cl', 'Cm', 'Cn')
+
+
+def convert(tmpDir, sty, precision):
+    body, aero = os.path.join(tmpDir, 'body.npy'), os.path.join(tmpDir, 'aero.npy')
+    balance = Balance(os.path.join(tmpDir, 'sta.txt'), os.path.join(tmpDir, 'dyn.txt'), body, aero,
+                      angleStartCol=1, angleEndCol=4, forceStartCol=5, forceEndCol=10,
+                      aircraftModel=AIRCRAFT, balanceSty=BALANCE_STYLES[sty], outputFormat=NPY,
+                      precision=precision)
+    t0 = time.time()
+    assert balance.translateData()
+    seconds = time.time() - t0
+    return openResult(body, None)[0][:, 4:], openResult(aero, None)[0][:, 4:], seconds
+
+
+def bench(rows):
+    tmpDir = tempfile.mkdtemp()
+    try:
+        makeDataFile(os.path.join(tmpDir, 'sta.txt'), rows, seed=0)
+        makeDataFile(os.path.join(tmpDir, 'dyn.txt'), rows, seed=1)
+        for sty in ('G16', 'G18'):
+            refBody, refAero, refSeconds = convert(tmpDir, sty, DOUBLE)
+            body, aero, seconds = convert(tmpDir, sty, SINGLE)
+            print '%10d rows  %s    float64 %7.3f s    float32 %7.3f s' % (rows, sty, refSeconds, seconds)
+            for frame, ref, result in (('body', refBody, body), ('aero', refAero, aero)):
+                err = abs(result - ref).max(axis=0)
+                scale = abs(ref).max(axis=0)
+                print '    %s  max abs error   %s' % (frame, '  '.join('%s %.2e' % c for c in zip(NAMES, err)))
+                print '    %s  / column max    %s' % (frame, '  '.join('%s %.2e' % c for c in zip(NAMES, err / scale)))
+    finally:
+        shutil.rmtree(tmpDir)
+
+
+if __name__ == '__main__':
+    for n in [int(float(a)) for a in sys.argv[1:]] or [10000, 100000, 1000000]:
+        bench(n)
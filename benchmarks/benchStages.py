@@ -0,0 +1,137 @@
+# -*-coding: utf-8 -*-
+"""
+this is the conversion stages' benchmark.
+
+按阶段分别计时Balance的转换: 读入(load)、去零(tare)、校准(calibrate, G16线性与G18迭代)、
+轴系转移(transfer)、体轴到风轴旋转(rotate)、无量纲化(normalize)和写出(write),
+并记录每个阶段的峰值内存, 均取自translateData()返回的ConversionResult. 数据为合成的静态、动态文件, 默认1e3到1e7行.
+结果可存为json(--output), 再与另一版本的结果对比(--compare), 判断优化是否有效、有无退步.
+峰值内存为该阶段中进程驻留内存的最高值减去阶段开始时的驻留内存; Linux下每个阶段前清零
+VmHWM, 其它系统只能取进程至今的峰值.
+usage: python benchStages.py [rows ...] [--balance G16 G18] [--repeat 3] [--output new.json] [--compare old.json]
+"""
+from __future__ import division
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+import numpy
+from aircraft import AircraftModel
+from balance import Balance, BALANCE_STYLES, PRECISIONS, DOUBLE
+from dataIO import OUTPUT_FORMATS, TEXT
+from benchLoader import makeDataFile
+
+AIRCRAFT = AircraftModel(0.0521, 0.4, 0.2759, 0.1246, 0.01, -0.02, 0.03, 25.)
+ROWS = (1000, 10000, 100000, 1000000, 10000000)
+BENCH_STAGES = ('load', 'tare', 'calibrate', 'transfer', 'rotate', 'normalize', 'write')
+
+
+def runStages(balance):
+    """one conversion, {stage: (seconds, peak bytes)} from the stages translateData() reports and its workspace bytes"""
+    result = balance.translateData()
+    if not result:
+        raise RuntimeError('the conversion failed: %s' % result.error)
+    stats = dict((stage, (result.stages[stage].seconds, result.stages[stage].peakBytes or 0)
+                          if stage in result.stages else (0., 0)) for stage in BENCH_STAGES)
+    return stats, result.workspaceBytes
+
+
+def benchBalance(args):
+    """`repeat` runs of one balance in a fresh process, so no earlier run's memory hides its peaks"""
+    tmpDir, name, repeat, outputFormat, precision = args
+    balance = Balance(os.path.join(tmpDir, 'sta.txt'), os.path.join(tmpDir, 'dyn.txt'),
+                      os.path.join(tmpDir, 'body'), os.path.join(tmpDir, 'aero'),
+                      angleStartCol=1, angleEndCol=4, forceStartCol=5, forceEndCol=10,
+                      aircraftModel=AIRCRAFT, balanceSty=BALANCE_STYLES[name], outputFormat=outputFormat,
+                      precision=precision)
+    balance.setMemoize(False)  # every run converts from the files, no stage comes from the cache
+    runs = [runStages(balance) for _ in range(repeat)]
+    return [stats for stats, workspaceBytes in runs], runs[-1][1]
+
+
+def bench(rows, balances, repeat, outputFormat, precision):
+    """the records of one size: the best time and the highest peak of `repeat` runs per balance and stage"""
+    tmpDir = tempfile.mkdtemp()
+    records = []
+    try:
+        makeDataFile(os.path.join(tmpDir, 'sta.txt'), rows, seed=0)
+        makeDataFile(os.path.join(tmpDir, 'dyn.txt'), rows, seed=1)
+        for name in balances:
+            pool = Pool(1)
+            try:
+                runs, workspaceBytes = pool.apply(benchBalance, ((tmpDir, name, repeat, outputFormat, precision),))
+            finally:
+                pool.terminate()
+                pool.join()
+            total = 0.
+            for stage in BENCH_STAGES:
+                seconds = min(run[stage][0] for run in runs)
+                peak = max(run[stage][1] for run in runs)
+                total += seconds
+                records.append({'rows': rows, 'balance': name, 'stage': stage, 'seconds': seconds,
+                                'peakBytes': peak})
+                print '%10d rows  %s  %-10s %9.4f s  %9.1f MB' % (rows, name, stage, seconds, peak / 2 ** 20)
+            print '%10d rows  %s  %-10s %9.4f s  %9.1f MB workspace' % (rows, name, 'total', total,
+                                                                        workspaceBytes / 2 ** 20)
+    finally:
+        shutil.rmtree(tmpDir)
+    return records
+
+
+def gitRevision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.STDOUT,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(records, fname):
+    """print this run's time and peak memory relative to the records saved in fname"""
+    with open(fname) as f:
+        old = json.load(f)
+    oldRecords = dict(((r['rows'], r['balance'], r['stage']), r) for r in old['records'])
+    print '\ncompared with %s (revision %s)' % (fname, old.get('revision'))
+    for r in records:
+        o = oldRecords.get((r['rows'], r['balance'], r['stage']))
+        if o is None:
+            continue
+        print '%10d rows  %s  %-10s time %6.2fx   peak %s' % (
+            r['rows'], r['balance'], r['stage'], r['seconds'] / o['seconds'] if o['seconds'] else float('nan'),
+            '%6.2fx' % (r['peakBytes'] / o['peakBytes']) if o['peakBytes'] else '     -')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=u'按阶段计时Balance的转换')
+    parser.add_argument('rows', nargs='*', type=float, default=ROWS)
+    parser.add_argument('--balance', nargs='+', choices=('G16', 'G18'), default=('G16', 'G18'))
+    parser.add_argument('--repeat', type=int, default=1, help='runs per size, the best time is kept')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default=TEXT)
+    parser.add_argument('--precision', choices=PRECISIONS, default=DOUBLE)
+    parser.add_argument('--output', help='save the results as json')
+    parser.add_argument('--compare', metavar='JSON', help='results saved by an earlier --output')
+    args = parser.parse_args(argv)
+
+    records = []
+    for rows in args.rows:
+        records.extend(bench(int(rows), args.balance, args.repeat, args.format, args.precision))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'revision': gitRevision(), 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'python': platform.python_version(), 'numpy': numpy.__version__,
+                       'machine': platform.platform(), 'format': args.format, 'precision': args.precision,
+                       'repeat': args.repeat, 'records': records}, f, indent=1)
+    if args.compare:
+        compare(records, args.compare)
+
+
+if __name__ == '__main__':
+    main()
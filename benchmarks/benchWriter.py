@@ -0,0 +1,48 @@
+# -*-coding: utf-8 -*-
+"""
+this is the result writer's benchmark.
+
+对比两次savetxt与dataIO.ResultWriter写出体轴、风轴结果文件的耗时.
+usage: python benchWriter.py [rows ...]
+"""
+from __future__ import division
+import filecmp
+import os
+import shutil
+import sys
+import tempfile
+import time
+from numpy import savetxt
+from numpy.random import RandomState
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from dataIO import ResultWriter
+
+HEADER = ['alpha beta phi t Fx Fy Fz Mx My Mz\n']
+
+
+def bench(rows):
+    rand = RandomState(0)
+    Mb, Ma = rand.normal(0., 10., (rows, 10)), rand.normal(0., 10., (rows, 10))
+    tmpDir = tempfile.mkdtemp()
+    try:
+        refBody, refAero = os.path.join(tmpDir, 'refBody.txt'), os.path.join(tmpDir, 'refAero.txt')
+        body, aero = os.path.join(tmpDir, 'body.txt'), os.path.join(tmpDir, 'aero.txt')
+        t0 = time.time()
+        for fname, data in ((refBody, Mb), (refAero, Ma)):
+            savetxt(fname, data, fmt='%-15.8f', header=''.join(HEADER).strip(), footer='', comments='')
+        t1 = time.time()
+        with ResultWriter(body, aero, HEADER) as writer:
+            writer.write(Mb, Ma)
+            writer.close()
+        t2 = time.time()
+        assert filecmp.cmp(refBody, body, shallow=False) and filecmp.cmp(refAero, aero, shallow=False)
+        print '%10d rows    savetxt %8.3f s    ResultWriter %8.3f s    speedup %6.1fx' % \
+            (rows, t1 - t0, t2 - t1, (t1 - t0) / (t2 - t1))
+    finally:
+        shutil.rmtree(tmpDir)
+
+
+if __name__ == '__main__':
+    for n in [int(float(a)) for a in sys.argv[1:]] or [10000, 100000, 1000000]:
+        bench(n)
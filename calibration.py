@@ -0,0 +1,193 @@
+# -*-coding: utf-8 -*-
+"""
+this is the balance calibration tables file.
+it contains the LinearCalibration, ExplicitQuadraticCalibration, QuadraticCalibration and CalibrationTable classes
+
+本文件为天平校准表: 校准系数不再写在程序中, 每种天平一个json文件, 放在calibrations目录下,
+文件名为天平类型名称, 如G16.json、G18.json. 增加14杆天平、盒式天平只需增加G14.json、BOX.json.
+文件内容:
+    name        -- 天平类型名称
+    description -- 说明(可选)
+    model       -- 校准模型, 以下三种之一, Fe为天平原始读数, Fbb为天平体轴力和力矩,
+                   P(F)为F各分量两两之积, 顺序为(0, 0), (0, 1), ..., (0, 5), (1, 1), ..., (5, 5):
+                   linear      Fbb = Fe * linear^T
+                   quadratic   Fbb = Fe * linear^T + P(Fe) * quadratic^T
+                   iterative   Fbb = gain * Fe + Fbb * linear^T + P(Fbb) * quadratic^T, 迭代求解
+    gain        -- 各分量的增益, 仅iterative
+    linear      -- 6x6线性项系数
+    quadratic   -- 6x21二次项系数, quadratic和iterative
+    postFactors -- 转换到飞行器体轴后各分量乘上的修正系数(可选)
+校准表读入后编译为数组形式, 按文件内容的sha1缓存, 同一文件只编译一次.
+"""
+from __future__ import division
+import hashlib
+import json
+import os
+import sys
+from threading import Lock
+from numpy import (array, dot, zeros, triu_indices)
+
+LINEAR = 'linear'
+QUADRATIC = 'quadratic'
+ITERATIVE = 'iterative'
+CALIBRATION_MODELS = (LINEAR, QUADRATIC, ITERATIVE)
+if getattr(sys, 'frozen', False):
+    CALIBRATION_DIR = os.path.join(os.path.dirname(sys.executable), 'calibrations')
+else:
+    CALIBRATION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calibrations')
+
+
+class CalibrationTableError(Exception):
+    """a calibration table is missing or malformed"""
+    pass
+
+
+def _pairProducts(F, pairRows, pairCols):
+    return F[:, pairRows] * F[:, pairCols]
+
+
+def _asType(a, dtype):
+    """a itself when it already has dtype, so the float64 path keeps its exact BLAS calls"""
+    return a if a.dtype == dtype else a.astype(dtype)
+
+
+class LinearCalibration(object):
+    """Fbb = Fe * linear^T"""
+    def __init__(self, linear):
+        self.linear = array(linear, dtype=float)
+        self.size = n = self.linear.shape[0]
+        if self.linear.shape != (n, n):
+            raise ValueError('the linear table must be square')
+
+    def apply(self, Fe, out=None):
+        return dot(Fe, _asType(self.linear.T, Fe.dtype), out=out)
+
+
+class ExplicitQuadraticCalibration(LinearCalibration):
+    """Fbb = Fe * linear^T + P(Fe) * quadratic^T, P as in QuadraticCalibration"""
+    def __init__(self, linear, quadratic):
+        super(ExplicitQuadraticCalibration, self).__init__(linear)
+        self.quadratic = array(quadratic, dtype=float)
+        n = self.size
+        self.pairRows, self.pairCols = triu_indices(n)
+        if self.quadratic.shape != (n, self.pairRows.shape[0]):
+            raise ValueError('calibration tables do not match %d components' % n)
+
+    def apply(self, Fe, out=None):
+        out = dot(Fe, _asType(self.linear.T, Fe.dtype), out=out)
+        out += dot(_pairProducts(Fe, self.pairRows, self.pairCols), _asType(self.quadratic.T, Fe.dtype))
+        return out
+
+
+class QuadraticCalibration(object):
+    """
+    second-order balance calibration, solved by solver.FixedPointSolver:
+
+        Fbb = gain * Fe + Fbb * linear^T + P(Fbb) * quadratic^T
+
+    P(Fbb) holds the pairwise products Fbb[:, i] * Fbb[:, j] (i <= j) in the order of
+    triu_indices(size): (0, 0), (0, 1), ..., (0, 5), (1, 1), ..., (5, 5).
+    """
+    def __init__(self, gain, linear, quadratic):
+        self.gain = array(gain, dtype=float)
+        self.linear = array(linear, dtype=float)
+        self.quadratic = array(quadratic, dtype=float)
+        self.size = n = self.gain.shape[0]
+        self.pairRows, self.pairCols = triu_indices(n)
+        if self.linear.shape != (n, n) or self.quadratic.shape != (n, self.pairRows.shape[0]):
+            raise ValueError('calibration tables do not match %d components' % n)
+
+        # d(P(Fbb) * quadratic^T)/d(Fbb) = Fbb * dQ, dQ[l, k * n + j] = d2(f_k)/(d(Fbb_l) d(Fbb_j))
+        dQ = zeros((n, n, n))
+        for p, (i, j) in enumerate(zip(self.pairRows, self.pairCols)):
+            dQ[j, :, i] += self.quadratic[:, p]
+            dQ[i, :, j] += self.quadratic[:, p]
+        self._dQ = dQ.reshape(n, n * n)
+
+    def products(self, Fbb):
+        return _pairProducts(Fbb, self.pairRows, self.pairCols)
+
+    def initial(self, Fe):
+        return Fe * self.gain
+
+    def evaluate(self, Fbb, Fe):
+        return Fe * self.gain + dot(Fbb, self.linear.T) + dot(self.products(Fbb), self.quadratic.T)
+
+    def component(self, k, Fbb, Fe):
+        return self.gain[k] * Fe[:, k] + dot(Fbb, self.linear[k]) + dot(self.products(Fbb), self.quadratic[k])
+
+    def jacobian(self, Fbb):
+        n = self.size
+        return self.linear + dot(Fbb, self._dQ).reshape(-1, n, n)
+
+
+class CalibrationTable(object):
+    """
+    a compiled calibration table: model is one of CALIBRATION_MODELS, calibration the
+    LinearCalibration, ExplicitQuadraticCalibration or QuadraticCalibration built from it,
+    postFactors None or an array, digest the sha1 of the file content.
+    """
+    def __init__(self, name, model, calibration, postFactors=None, description=u'', digest=None):
+        self.name = name
+        self.model = model
+        self.calibration = calibration
+        self.postFactors = postFactors
+        self.description = description
+        self.digest = digest
+
+    def __repr__(self):
+        return 'CalibrationTable(%r, %r)' % (self.name, self.model)
+
+
+_compiledTables = {}
+_compiledLock = Lock()
+
+
+def compileCalibrationTable(raw, source='<string>'):
+    """compile the json content of a calibration table, the same content is compiled only once"""
+    digest = hashlib.sha1(raw).hexdigest()
+    with _compiledLock:
+        table = _compiledTables.get(digest)
+    if table is not None:
+        return table
+
+    try:
+        spec = json.loads(raw)
+        model = spec['model']
+        if model == LINEAR:
+            calibration = LinearCalibration(spec['linear'])
+        elif model == QUADRATIC:
+            calibration = ExplicitQuadraticCalibration(spec['linear'], spec['quadratic'])
+        elif model == ITERATIVE:
+            calibration = QuadraticCalibration(spec['gain'], spec['linear'], spec['quadratic'])
+        else:
+            raise ValueError('unknown model %r, expected one of %s' % (model, ', '.join(CALIBRATION_MODELS)))
+        postFactors = spec.get('postFactors')
+        if postFactors is not None:
+            postFactors = array(postFactors, dtype=float)
+            if postFactors.shape != (calibration.size,):
+                raise ValueError('postFactors must have %d values' % calibration.size)
+        table = CalibrationTable(spec.get('name', u''), model, calibration, postFactors,
+                                 spec.get('description', u''), digest)
+    except (ValueError, KeyError, TypeError), msg:
+        raise CalibrationTableError('bad calibration table %s: %s' % (source, msg))
+
+    with _compiledLock:
+        return _compiledTables.setdefault(digest, table)
+
+
+def loadCalibrationTable(fname):
+    try:
+        with open(fname, 'rb') as f:
+            raw = f.read()
+    except IOError, msg:
+        raise CalibrationTableError('cannot read calibration table %s: %s' % (fname, msg))
+    return compileCalibrationTable(raw, fname)
+
+
+def findCalibrationTable(name, calibrationDir=None):
+    """the table of the balance `name` (G14, G16, G18, BOX ...), <calibrationDir>/<name>.json"""
+    fname = os.path.join(calibrationDir or CALIBRATION_DIR, '%s.json' % name)
+    if not os.path.isfile(fname):
+        raise CalibrationTableError('no calibration table for the %s balance, expected %s' % (name, fname))
+    return loadCalibrationTable(fname)
@@ -0,0 +1,111 @@
+# -*-coding: utf-8 -*-
+"""
+this is the parsed input files' cache.
+it contains a InputCache class
+
+本文件为实验数据文件的解析缓存: 解析后的角度列、力和力矩列以.npy文件存放在缓存目录中,
+再次转换同一文件时以内存映射方式直接打开, 不再解析文本.
+"""
+from __future__ import division
+import hashlib
+import os
+import shutil
+import tempfile
+from numpy import (array, dtype as npDtype, load, save)
+from dataIO import loadColumns
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+class InputCache(object):
+    """
+    cache of parsed data files, keyed on the file and the parsing settings.
+
+    the file part of the key is its path, size and mtime, or a sha1 of its content
+    when contentHash is True (slower, but survives copies and touched files). once
+    the cache holds more than maxBytes, the least recently used entries are removed.
+    """
+    def __init__(self, cacheDir, maxBytes=1 << 30, contentHash=False):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.contentHash = contentHash
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+
+    def key(self, fname, headerRows=0, footerRows=0, columns=((1, 4), (5, 10)), dtype=float):
+        h = hashlib.sha1()
+        if self.contentHash:
+            with open(fname, 'rb') as f:
+                for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                    h.update(block)
+        else:
+            st = os.stat(fname)
+            h.update(repr((os.path.abspath(fname), st.st_size, st.st_mtime)).encode('utf-8'))
+        h.update(repr((headerRows, footerRows, tuple(tuple(c) for c in columns),
+                       npDtype(dtype).str)).encode('utf-8'))
+        return h.hexdigest()
+
+    def load(self, fname, headerRows=0, footerRows=0, columns=((1, 4), (5, 10)), dtype=float):
+        """
+        the same as dataIO.loadColumns, but the arrays come memory-mapped (read only)
+        from the cache when the file has been parsed before.
+        """
+        entry = os.path.join(self.cacheDir, self.key(fname, headerRows, footerRows, columns, dtype))
+        if os.path.isdir(entry):
+            try:
+                result = self._read(entry, len(columns))
+                os.utime(entry, None)  # mark as recently used
+                return result
+            except (IOError, OSError, ValueError):
+                shutil.rmtree(entry, ignore_errors=True)
+
+        arrays, headerList, footerList = loadColumns(fname, headerRows, footerRows, columns, dtype)
+        self._write(entry, arrays, headerList, footerList)
+        self.evict()
+        return arrays, headerList, footerList
+
+    def _read(self, entry, n):
+        arrays = [load(os.path.join(entry, 'col%d.npy' % i), mmap_mode='r') for i in range(n)]
+        headerList = load(os.path.join(entry, 'header.npy')).item().splitlines(True)
+        footerList = load(os.path.join(entry, 'footer.npy')).item().splitlines(True)
+        return arrays, headerList, footerList
+
+    def _write(self, entry, arrays, headerList, footerList):
+        # written aside and renamed, so concurrent conversions never see a half-written entry
+        tmp = tempfile.mkdtemp(dir=self.cacheDir, prefix='.tmp-')
+        try:
+            for i, arr in enumerate(arrays):
+                save(os.path.join(tmp, 'col%d.npy' % i), arr)
+            save(os.path.join(tmp, 'header.npy'), array(b''.join(headerList)))
+            save(os.path.join(tmp, 'footer.npy'), array(b''.join(footerList)))
+            os.rename(tmp, entry)
+        except OSError:
+            # another process stored the same entry first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cacheDir):
+            path = os.path.join(self.cacheDir, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """remove the least recently used entries until the cache fits in maxBytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.maxBytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            shutil.rmtree(path, ignore_errors=True)
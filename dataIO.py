@@ -0,0 +1,380 @@
+# -*-coding: utf-8 -*-
+"""
+this is the balance data files' reading and writing programming.
+
+本文件为实验数据文件的读写程序:
+loadColumns——》读取数据文件中指定的列(角度列、力和力矩列)及文件头、文件尾
+ColumnReader——》按数据块逐块读取数据文件中指定的列, 用于大文件的流式处理
+ArrayReader——》按数据块逐块读取已解析的数组(如缓存中内存映射的数组)
+ResultWriter——》同时写出体轴和风轴结果文件, 按数据块整体格式化
+NpyResultWriter, NpzResultWriter, RawResultWriter——》以二进制格式写出结果, 可内存映射读取
+openResult——》读取结果文件(二进制格式以内存映射方式打开)
+"""
+from __future__ import division
+import json
+import os
+import struct
+import zipfile
+from io import BytesIO
+from itertools import islice
+from numpy import (fromstring, frombuffer, genfromtxt, empty, ascontiguousarray, array, dtype as npDtype, load, save,
+                   memmap, flatnonzero, searchsorted, diff, concatenate, uint8)
+from numpy.lib.format import magic
+
+TEXT = 'text'
+NPY = 'npy'
+NPZ = 'npz'
+RAW = 'raw'
+OUTPUT_FORMATS = (TEXT, NPY, NPZ, RAW)
+
+NPY_HEADER_SIZE = 128  # fixed, so the final shape can be written over the placeholder
+
+
+def _splitFile(raw, headerRows, footerRows):
+    """split the raw file content into header lines, numeric body and footer lines"""
+    start = 0
+    for i in range(headerRows):
+        pos = raw.find(b'\n', start)
+        start = len(raw) if pos < 0 else pos + 1
+    headerList = raw[:start].replace(b'\r\n', b'\n').splitlines(True)
+
+    end = len(raw)
+    if footerRows:
+        # the last line may or may not be terminated by a newline
+        pos = end - 1 if raw.endswith(b'\n') else end
+        for i in range(footerRows):
+            pos = raw.rfind(b'\n', start, pos)
+            if pos < 0:
+                pos = start - 1
+                break
+        end = pos + 1
+    footerList = raw[end:].replace(b'\r\n', b'\n').splitlines(True)
+    return headerList, raw[start:end], footerList
+
+
+def lineWidths(text):
+    """the number of whitespace separated values on every line of text, a last line without newline included"""
+    raw = frombuffer(text, dtype=uint8)
+    space = raw <= 32  # blanks, tabs, carriage returns and newlines
+    starts = ~space
+    starts[1:] &= space[:-1]
+    ends = flatnonzero(raw == 10)
+    if not text.endswith(b'\n'):
+        ends = concatenate((ends, [raw.shape[0]]))
+    return diff(concatenate(([0], searchsorted(flatnonzero(starts), ends))))
+
+
+def _parseTable(body, dtype=float):
+    """
+    parse the numeric body into a 2-D table, numpy's C reader first and genfromtxt as fallback.
+    the C reader ignores the line ends, so it is taken only when every line has the same width.
+    """
+    body = body.strip()
+    if not body:
+        return empty((0, 0), dtype=dtype)
+    widths = lineWidths(body)
+    rows, cols = widths.shape[0], widths[0]
+    table = fromstring(body, dtype=dtype, sep=' ')
+    if table.shape[0] == rows * cols and (widths == cols).all():
+        return table.reshape(rows, cols)
+    table = genfromtxt(body.splitlines(), dtype=dtype)
+    return table.reshape(1, -1) if table.ndim == 1 else table
+
+
+def loadColumns(fname, headerRows=0, footerRows=0, columns=((1, 4), (5, 10)), dtype=float, out=None):
+    """
+    load the column ranges of a whitespace separated data file.
+
+    columns holds (startCol, endCol) pairs, 1-based and inclusive like the Balance's
+    angle and force columns settings. the numeric body is parsed by numpy's C text
+    reader in one call and only the requested columns are copied into `out`, a list
+    of preallocated arrays (allocated here when not given). bodies the fast reader
+    cannot parse (comments, missing values) fall back to genfromtxt.
+
+    return (arrays, headerList, footerList), headerList and footerList are the raw
+    lines like file.readlines() gives.
+    """
+    with open(fname, 'rb') as f:
+        raw = f.read()
+    headerList, body, footerList = _splitFile(raw, headerRows, footerRows)
+
+    table = _parseTable(body, dtype)
+    rows = table.shape[0]
+    if out is None:
+        out = [empty((rows, endCol + 1 - startCol), dtype=dtype) for startCol, endCol in columns]
+    if rows:
+        for arr, (startCol, endCol) in zip(out, columns):
+            arr[...] = table[:, (startCol - 1):endCol]
+    return out, headerList, footerList
+
+
+class ColumnReader(object):
+    """
+    iterate over a data file in blocks of chunkRows rows.
+
+    each block is a list of arrays, one per (startCol, endCol) pair of columns, the same
+    as loadColumns returns. headerList is read when the reader is created, footerList is
+    available once every block has been read.
+    """
+    def __init__(self, fname, headerRows=0, footerRows=0, columns=((1, 4), (5, 10)), chunkRows=100000,
+                 dtype=float):
+        self._file = open(fname, 'rb')
+        self._footerRows = footerRows
+        self._columns = columns
+        self._chunkRows = chunkRows
+        self._dtype = dtype
+        self.headerList = [line.replace(b'\r\n', b'\n') for line in islice(self._file, headerRows)]
+        self.footerList = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def __iter__(self):
+        footerRows = self._footerRows
+        pending = []  # the last lines read, held back until they are known not to be the footer
+        while True:
+            lines = pending + list(islice(self._file, self._chunkRows))
+            eof = len(lines) < len(pending) + self._chunkRows
+            split = max(len(lines) - footerRows, 0)
+            body, pending = lines[:split], lines[split:]
+            if body:
+                table = _parseTable(b''.join(body), self._dtype)
+                if table.shape[0]:
+                    yield [table[:, (startCol - 1):endCol].copy() for startCol, endCol in self._columns]
+            if eof:
+                break
+        self.footerList = [line.replace(b'\r\n', b'\n') for line in pending]
+
+
+class ArrayReader(object):
+    """
+    iterate over already parsed column arrays in blocks of chunkRows rows, the same way
+    ColumnReader iterates over a data file. used for memory-mapped cached inputs.
+    """
+    def __init__(self, arrays, headerList=(), footerList=(), chunkRows=100000):
+        self._arrays = arrays
+        self._chunkRows = chunkRows
+        self.headerList = list(headerList)
+        self.footerList = list(footerList)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        rows = self._arrays[0].shape[0] if self._arrays else 0
+        for start in range(0, rows, self._chunkRows):
+            yield [arr[start:start + self._chunkRows] for arr in self._arrays]
+
+
+class ResultWriter(object):
+    """
+    write the body and aero results, block by block, in the layout numpy.savetxt gives
+    with fmt='%-15.8f' and comments=''.
+
+    a block is formatted with a single %-operation instead of one per row, and the
+    header and footer are joined once for both files. use close(footerList) after
+    the last block, leaving a `with` block on an exception closes the files without
+    the footer.
+    """
+    def __init__(self, bodyFile, aeroFile, headerList=(), fmt='%-15.8f', blockRows=65536):
+        self._fmt = fmt
+        self._blockRows = blockRows
+        self._files = [open(bodyFile, 'w'), open(aeroFile, 'w')]
+        self._writeLines(headerList)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is not None:
+            for f in self._files:
+                f.close()
+        else:
+            self.close()
+
+    def _writeLines(self, lines):
+        text = b''.join(lines).strip()
+        if text:
+            for f in self._files:
+                f.write(text + b'\n')
+
+    def _format(self, data):
+        rowFmt = ' '.join([self._fmt] * data.shape[1]) + '\n'
+        for start in range(0, data.shape[0], self._blockRows):
+            block = data[start:start + self._blockRows]
+            yield (rowFmt * block.shape[0]) % tuple(block.ravel().tolist())
+
+    def write(self, Mb, Ma):
+        for f, data in zip(self._files, (Mb, Ma)):
+            for text in self._format(data):
+                f.write(text)
+
+    def flush(self):
+        """push the rows written so far to the files, for readers following them"""
+        for f in self._files:
+            f.flush()
+
+    def close(self, footerList=()):
+        if self._files[0].closed:
+            return
+        self._writeLines(footerList)
+        for f in self._files:
+            f.close()
+
+
+def _decodeText(text):
+    """decode header and footer bytes for json, return (text, encoding)"""
+    try:
+        return text.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        return text.decode('latin-1'), 'latin-1'
+
+
+def _npyHeader(dataType, shape):
+    header = "{'descr': %r, 'fortran_order': False, 'shape': %r, }" % (
+        str(dataType.str), tuple(int(n) for n in shape))
+    header = header.ljust(NPY_HEADER_SIZE - 10 - 1) + '\n'
+    return magic(1, 0) + struct.pack('<H', len(header)) + header.encode('latin-1')
+
+
+class RawResultWriter(object):
+    """
+    write the body and aero results as raw C-ordered arrays which numpy.memmap opens
+    directly. dtype, shape, header and footer go to the sidecar file <name>.json.
+    """
+    format = RAW
+
+    def __init__(self, bodyFile, aeroFile, headerList=()):
+        self._names = [bodyFile, aeroFile]
+        self._files = [open(bodyFile, 'wb'), open(aeroFile, 'wb')]
+        self._shapes = [[0, 0], [0, 0]]
+        self._dtype = None
+        self._header = b''.join(headerList).strip()
+        self._start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType is not None:
+            for f in self._files:
+                f.close()
+        else:
+            self.close()
+
+    def _start(self):
+        pass
+
+    def write(self, Mb, Ma):
+        if self._dtype is None:
+            self._dtype = npDtype(Mb.dtype).newbyteorder('<')
+        for f, shape, data in zip(self._files, self._shapes, (Mb, Ma)):
+            ascontiguousarray(data, dtype=self._dtype).tofile(f)
+            shape[0] += data.shape[0]
+            shape[1] = data.shape[1]
+
+    def flush(self):
+        for f in self._files:
+            f.flush()
+
+    def _finish(self, name, f, shape, meta):
+        with open(name + '.json', 'w') as sidecar:
+            json.dump(meta, sidecar, indent=1)
+
+    def close(self, footerList=()):
+        if self._files[0].closed:
+            return
+        dataType = self._dtype if self._dtype is not None else npDtype('<f8')
+        header, headerEncoding = _decodeText(self._header)
+        footer, footerEncoding = _decodeText(b''.join(footerList).strip())
+        for name, f, shape in zip(self._names, self._files, self._shapes):
+            meta = {'format': self.format, 'dtype': dataType.str, 'shape': shape,
+                    'header': header, 'headerEncoding': headerEncoding,
+                    'footer': footer, 'footerEncoding': footerEncoding}
+            self._finish(name, f, shape, meta)
+            f.close()
+
+
+class NpyResultWriter(RawResultWriter):
+    """
+    write the body and aero results as .npy files, numpy.load(name, mmap_mode='r') opens
+    them zero-copy. header and footer go to the sidecar file <name>.json.
+    """
+    format = NPY
+
+    def _start(self):
+        for f in self._files:
+            f.write(_npyHeader(npDtype('<f8'), (0, 0)))
+
+    def _finish(self, name, f, shape, meta):
+        f.seek(0)
+        f.write(_npyHeader(npDtype(meta['dtype']), shape))
+        RawResultWriter._finish(self, name, f, shape, meta)
+
+
+class NpzResultWriter(NpyResultWriter):
+    """
+    write the body and aero results as uncompressed .npz archives holding 'data',
+    'header' and 'footer'. the data is streamed to a temporary .npy first and
+    moved into the archive on close; npz members can not be memory-mapped.
+    """
+    format = NPZ
+
+    def __init__(self, bodyFile, aeroFile, headerList=()):
+        self._archives = [bodyFile, aeroFile]
+        NpyResultWriter.__init__(self, bodyFile + '.tmp.npy', aeroFile + '.tmp.npy', headerList)
+
+    def _finish(self, name, f, shape, meta):
+        f.seek(0)
+        f.write(_npyHeader(npDtype(meta['dtype']), shape))
+        f.close()
+        archive = self._archives[self._names.index(name)]
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+            zf.write(name, 'data.npy')
+            for key in ('header', 'footer'):
+                buf = BytesIO()
+                save(buf, array(meta[key].encode(meta[key + 'Encoding'])))
+                zf.writestr(key + '.npy', buf.getvalue())
+        os.remove(name)
+
+
+RESULT_WRITERS = {TEXT: ResultWriter, NPY: NpyResultWriter, NPZ: NpzResultWriter, RAW: RawResultWriter}
+
+
+def openResult(fname, mmapMode='r', headerRows=1, footerRows=0):
+    """
+    open a result file written in any of the OUTPUT_FORMATS, return (data, header, footer).
+    npy and raw results are memory-mapped, text results (no sidecar) are parsed, their
+    headerRows and footerRows must be given.
+    """
+    if zipfile.is_zipfile(fname):
+        npz = load(fname)
+        return npz['data'], npz['header'].item(), npz['footer'].item()
+    if not os.path.exists(fname + '.json'):
+        with open(fname, 'rb') as f:
+            headerList, body, footerList = _splitFile(f.read(), headerRows, footerRows)
+        return _parseTable(body), b''.join(headerList).strip(), b''.join(footerList).strip()
+
+    with open(fname + '.json') as sidecar:
+        meta = json.load(sidecar)
+    header = meta['header'].encode(meta['headerEncoding'])
+    footer = meta['footer'].encode(meta['footerEncoding'])
+    if meta['format'] == NPY:
+        data = load(fname, mmap_mode=mmapMode)
+    elif meta['shape'][0]:
+        data = memmap(fname, dtype=meta['dtype'], mode=mmapMode, shape=tuple(meta['shape']))
+    else:
+        data = empty(meta['shape'], dtype=meta['dtype'])
+    return data, header, footer
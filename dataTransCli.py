@@ -0,0 +1,173 @@
+# -*-coding: utf-8 -*-
+"""
+this is the command line entry of the data translation.
+
+本文件为实验数据转换的命令行程序, 不加载PyQt4, 可在脚本和定时任务中直接调用:
+    python dataTransCli.py sta.txt dyn.txt body.txt aero.txt --balance G18 --model SACCON-Params.txt
+    python dataTransCli.py --batch manifest.json -j 8
+    python dataTransCli.py sta.txt dyn.txt body.txt aero.txt --live file --idle 5 --tare linear
+"""
+from __future__ import division
+import time
+_startTime = time.time()
+
+import argparse
+import os
+import sys
+from aircraft import AircraftModel, loadAircraftModel
+from balance import Balance, BALANCE_STYLES, PRECISIONS, DOUBLE, PARALLEL_MODES, THREADS
+from dataIO import OUTPUT_FORMATS, TEXT
+from solver import SOLVER_METHODS, NEWTON
+from tare import TARE_MODES
+from oscillation import KINETICS_STYLES
+from filters import ForceFilter, DECIMATE_MODES, MEAN
+
+LIVE_SOURCES = ('file', 'pipe', 'socket')
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description=u'实验数据转换(命令行)')
+    parser.add_argument('files', nargs='*', metavar='FILE', help='static, dynamic, body and aero files')
+    parser.add_argument('--batch', metavar='MANIFEST', help='convert the runs of a manifest (see batch.py)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='batch worker processes')
+    parser.add_argument('-b', '--balance', default='G18', help='G14, G16, G18 or BOX (or 0-3)')
+    parser.add_argument('-m', '--model', help='model parameters file, e.g. SACCON-Params.txt')
+    parser.add_argument('--header-rows', type=int, default=1)
+    parser.add_argument('--footer-rows', type=int, default=0)
+    parser.add_argument('--angle-cols', type=int, nargs=2, default=(1, 4), metavar=('START', 'END'))
+    parser.add_argument('--force-cols', type=int, nargs=2, default=(5, 10), metavar=('START', 'END'))
+    parser.add_argument('--chunk-rows', type=int, default=0, help='streaming mode block size, 0 loads whole files')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default=TEXT)
+    parser.add_argument('--solver', choices=SOLVER_METHODS, default=NEWTON,
+                        help='G18 solver, jit needs numba and falls back to newton without it')
+    parser.add_argument('--parallel', type=int, default=0, metavar='N',
+                        help='shard the rows of one conversion over N threads or processes')
+    parser.add_argument('--parallel-mode', choices=PARALLEL_MODES, default=THREADS)
+    parser.add_argument('--tare', choices=TARE_MODES,
+                        help='tare by a table built from the static sweep, the files may have different rows')
+    parser.add_argument('--despike', type=int, default=0, metavar='ROWS',
+                        help='running median window (odd) applied to the raw forces before the tare')
+    parser.add_argument('--sigma', type=float, default=0.,
+                        help='despike only the rows this many robust deviations off the running median')
+    parser.add_argument('--lowpass', type=int, default=0, metavar='ROWS', help='moving average window (odd)')
+    parser.add_argument('--decimate', type=int, default=1, metavar='N', help='reduce every N raw rows to one')
+    parser.add_argument('--decimate-mode', choices=DECIMATE_MODES, default=MEAN)
+    parser.add_argument('--precision', choices=PRECISIONS, default=DOUBLE, help='float32 halves the memory traffic')
+    parser.add_argument('--oscillation', nargs=2, metavar=('MODE', 'HZ'),
+                        help='forced oscillation derivatives, MODE pitch, roll or yaw, HZ the frequency')
+    parser.add_argument('--oscillation-file', help='derivatives output, default the body file + .osc.txt')
+    parser.add_argument('--live', choices=LIVE_SOURCES,
+                        help='convert a running acquisition: follow the growing dynamic file, read it as a '
+                             'pipe (- for stdin) or take it as a socket address, host:port or a Unix path')
+    parser.add_argument('--idle', type=float, metavar='SECONDS',
+                        help='end a followed file after this long without new rows, default follow until ^C')
+    parser.add_argument('--listen', action='store_true', help='wait for the sender to connect to the socket')
+    parser.add_argument('--replay', metavar='RECORDED',
+                        help='simulate the acquisition by replaying a recorded dynamic file to the file or socket')
+    parser.add_argument('--replay-rate', type=float, default=1000., metavar='ROWS', help='replayed rows per second')
+    parser.add_argument('--cache-dir', help='cache the parsed input files in this directory')
+    parser.add_argument('--timing', action='store_true', help='report start-up and conversion times')
+    parser.add_argument('--stats', action='store_true', help='report the time and memory of every stage')
+    args = parser.parse_args(argv)
+    if not args.batch and len(args.files) != 4:
+        parser.error('give the static, dynamic, body and aero files, or --batch MANIFEST')
+    if args.oscillation and args.oscillation[0].upper() not in KINETICS_STYLES:
+        parser.error('the oscillation mode is one of pitch, roll, yaw')
+    if args.live and (args.batch or args.oscillation):
+        parser.error('--live converts one run and cannot be combined with --batch or --oscillation')
+    if args.replay and args.live not in ('file', 'socket'):
+        parser.error('--replay needs --live file or --live socket')
+    return args
+
+
+def balanceSty(name):
+    return int(name) if name.isdigit() else BALANCE_STYLES[name.upper()]
+
+
+def convert(args):
+    staFile, dynFile, bodyFile, aeroFile = args.files
+    aircraftModel = loadAircraftModel(args.model) if args.model else AircraftModel()
+    balance = Balance(staFile, dynFile, bodyFile, aeroFile,
+                      headerRows=args.header_rows, footerRows=args.footer_rows,
+                      angleStartCol=args.angle_cols[0], angleEndCol=args.angle_cols[1],
+                      forceStartCol=args.force_cols[0], forceEndCol=args.force_cols[1],
+                      aircraftModel=aircraftModel, balanceSty=balanceSty(args.balance),
+                      chunkRows=args.chunk_rows, outputFormat=args.format, precision=args.precision,
+                      solverMethod=args.solver)
+    balance.setParallel(args.parallel, args.parallel_mode)
+    if args.tare:
+        balance.buildTareTable(args.tare)
+    if args.despike or args.lowpass or args.decimate > 1:
+        balance.setForceFilter(ForceFilter(args.despike, args.sigma, args.lowpass, args.decimate,
+                                           args.decimate_mode))
+    if args.cache_dir:
+        from dataCache import InputCache
+        balance.setInputCache(InputCache(args.cache_dir))
+    if args.live:
+        return convertLive(balance, args)
+    ok = balance.translateData()
+    if ok.unconvergedRows:
+        sys.stderr.write('warning: %d rows did not converge\n' % ok.unconvergedRows)
+    if args.stats:
+        sys.stderr.write(ok.summary() + '\n')
+    if not ok:
+        sys.stderr.write('error: failed to translate the data files: %s\n' % (ok.error or 'conversion failed'))
+    elif args.oscillation:
+        from oscillation import writeOscillation
+        mode, frequency = args.oscillation
+        result = balance.analyseOscillation(KINETICS_STYLES[mode.upper()], float(frequency))
+        writeOscillation(result, args.oscillation_file or os.path.splitext(bodyFile)[0] + '.osc.txt')
+    return ok
+
+
+def convertLive(balance, args):
+    """convert the rows of a running acquisition as they arrive, until it ends or ^C"""
+    import live
+    dynFile = args.files[1]
+    try:
+        if args.live == 'file':
+            if args.replay:
+                live.startReplay(args.replay, dynFile, args.replay_rate, headerRows=args.header_rows)
+            source = live.FileFollower(dynFile, args.header_rows, args.idle)
+        elif args.live == 'pipe':
+            source = live.StreamSource(sys.stdin if dynFile == '-' else open(dynFile, 'rb'), args.header_rows)
+        else:
+            if args.replay:
+                live.serveReplay(args.replay, dynFile, args.replay_rate, headerRows=args.header_rows)
+            source = live.SocketSource(dynFile, args.header_rows, listen=args.listen)
+        converter = live.LiveConverter(balance, source)
+        try:
+            converter.run()
+        except KeyboardInterrupt:
+            pass  # run() has closed the source and the result files
+    except Exception as e:
+        sys.stderr.write('error: live conversion stopped: %s\n' % e)
+        return False
+    sys.stderr.write('live: %d rows converted, %d lines skipped, latency up to %.3f s\n'
+                     % (converter.rows, converter.skippedLines, converter.maxLatency))
+    return True
+
+
+def convertBatch(args):
+    from batch import loadManifest, runBatch, printStatus
+    statuses = runBatch(loadManifest(args.batch), args.workers, args.cache_dir, printStatus)
+    return all(status['ok'] for status in statuses)
+
+
+def main(argv=None):
+    args = parseArgs(argv)
+    readyTime = time.time()
+    if args.timing:
+        # process cpu time covers the interpreter's own start-up as well
+        cpuTime = sum(os.times()[:2])
+        sys.stderr.write('start-up: %.3f s to ready (%.3f s process cpu)\n' % (readyTime - _startTime, cpuTime))
+    ok = convertBatch(args) if args.batch else convert(args)
+    if args.timing:
+        sys.stderr.write('conversion: %.3f s\n' % (time.time() - readyTime))
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    from multiprocessing import freeze_support
+    freeze_support()
+    sys.exit(main())
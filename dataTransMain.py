@@ -15,11 +15,14 @@ import codecs
 from dataTransUi import Ui_dataTransWidget
 from aircraft import AircraftModel
 from balance import Balance
+from dataTransWorker import ConversionWorker
 
 AIR_DENSITY = 1.2250    # 空气密度
 __appname__ = u'实验数据转换'
 __BalanceSty__ = [u"14杆天平", u"16杆天平", u"18杆天平", u"盒式天平"]
 __KineticsSty__ = [u"俯仰运动", u"滚转运动", u"偏航运动"]
+__ConversionStage__ = {'load': u"读取数据", 'convert': u"转换", 'solve': u"迭代求解",
+                       'write': u"写出结果", 'done': u"完成"}
 
 
 class DataTransWidget(QDialog, Ui_dataTransWidget):
@@ -47,6 +50,22 @@ class DataTransWidget(QDialog, Ui_dataTransWidget):
 
         self._dir = "./"
 
+        #后台转换线程及进度显示
+        self.lblConversionStage = QLabel(self)
+        self.pbarConversion = QProgressBar(self)
+        self.pbarConversion.setRange(0, 1)
+        self.pbarConversion.setValue(0)
+        self.pbtnCancel = QPushButton(u"取消", self)
+        self.pbtnCancel.setEnabled(False)
+        self.horizontalLayout_4.insertWidget(0, self.lblConversionStage)
+        self.horizontalLayout_4.insertWidget(1, self.pbarConversion)
+        self.horizontalLayout_4.insertWidget(2, self.pbtnCancel)
+        self.worker = ConversionWorker(self)
+        self.worker.jobStarted.connect(self.onJobStarted)
+        self.worker.progress.connect(self.onJobProgress)
+        self.worker.jobFinished.connect(self.onJobFinished)
+        self.pbtnCancel.clicked.connect(self.on_pbtnCancel_clicked)  # created after setupUi, not connected by name
+
     def initModel(self):
         self.model.setArea(float(self.txtModelArea.text()))    # 初始化模型面积
         self.model.setSpan(float(self.txtModelSpan.text()))    # 初始化模型展长
@@ -212,13 +231,39 @@ class DataTransWidget(QDialog, Ui_dataTransWidget):
 
     @pyqtSignature("")
     def on_pbtnGenerateFile_clicked(self):
-        try:
-            print self.balance
-            if self.balance.translateData():
-                QMessageBox.about(self, u"{0}".format(__appname__), u"数据生成完成！")
-        except Exception, msg:
+        print self.balance
+        self.worker.enqueue(self.balance, unicode(self.txtDynamicFile.text()))
+        self.pbtnCancel.setEnabled(True)
+
+    @pyqtSignature("")
+    def on_pbtnCancel_clicked(self):
+        # clicked(bool) must not reach cancel() as a job id
+        self.worker.cancel()
+
+    def onJobStarted(self, jobId, name):
+        self.lblConversionStage.setText(u"[{0}] {1}".format(jobId, QFileInfo(name).fileName()))
+        self.pbarConversion.setRange(0, 1)
+        self.pbarConversion.setValue(0)
+
+    def onJobProgress(self, jobId, stage, done, total):
+        self.lblConversionStage.setText(u"[{0}] {1}".format(jobId, __ConversionStage__.get(unicode(stage), stage)))
+        self.pbarConversion.setRange(0, total)  # total 0: busy indicator
+        self.pbarConversion.setValue(done)
+
+    def onJobFinished(self, jobId, ok, message):
+        self.pbtnCancel.setEnabled(self.worker.pendingJobs() > 1)
+        if ok:
+            QMessageBox.about(self, u"{0}".format(__appname__), u"[{0}] 数据生成完成！".format(jobId))
+        elif message == u'cancelled':
+            self.lblConversionStage.setText(u"[{0}] 已取消".format(jobId))
+        else:
             QMessageBox.about(self, u"{0}".format(__appname__),
-                              u"Failed to translate the data files.\n{0}".format(msg))
+                              u"[{0}] Failed to translate the data files.\n{1}".format(jobId, message))
+
+    def closeEvent(self, event):
+        self.worker.stop()
+        self.worker.wait()
+        super(DataTransWidget, self).closeEvent(event)
 
     @pyqtSignature("")
     def on_pbtnHelp_clicked(self):
@@ -0,0 +1,105 @@
+# -*-coding: utf-8 -*-
+"""
+this is the background conversion worker of the GUI.
+
+本文件为界面的后台转换线程: 转换任务排队后在线程中依次执行, 界面不被阻塞,
+执行过程中报告阶段和行数进度, 并可取消当前任务或全部任务.
+"""
+import copy
+from collections import deque
+from threading import Condition
+from PyQt4.QtCore import QThread, pyqtSignal
+from balance import ConversionCancelled
+
+
+class ConversionWorker(QThread):
+    """
+    run queued Balance conversions one after another off the GUI thread.
+
+    every job is a copy of the Balance given to enqueue(), so the dialog can go on
+    editing its own Balance. the thread waits for jobs until stop(). the signals are
+    delivered to the GUI thread through queued connections.
+    """
+    jobStarted = pyqtSignal(int, unicode)               # job id, job name
+    progress = pyqtSignal(int, unicode, int, int)       # job id, stage, done rows, total rows
+    jobFinished = pyqtSignal(int, bool, unicode)        # job id, ok, message
+
+    def __init__(self, parent=None):
+        super(ConversionWorker, self).__init__(parent)
+        self._lock = Condition()  # also wakes the thread up for a new job or stop()
+        self._jobs = deque()
+        self._nextId = 1
+        self._currentId = None
+        self._current = None
+        self._stopping = False
+
+    def enqueue(self, balance, name=u''):
+        """queue a copy of balance for conversion, return the job id"""
+        job = copy.copy(balance)
+        job.resetCancel()  # from here on a cancel() is kept until the job runs
+        with self._lock:
+            jobId = self._nextId
+            self._nextId += 1
+            self._jobs.append((jobId, name, job))
+            self._lock.notify()
+        self.start()  # the thread runs until stop(), start() does nothing while it runs
+        return jobId
+
+    def pendingJobs(self):
+        with self._lock:
+            return len(self._jobs) + (self._current is not None)
+
+    def cancel(self, jobId=None):
+        """cancel a queued or running job, the running one when jobId is None"""
+        if jobId is not None and (isinstance(jobId, bool) or not isinstance(jobId, (int, long))):
+            raise TypeError('a job id is an int, got %r' % (jobId,))
+        with self._lock:
+            if jobId is None or jobId == self._currentId:
+                if self._current is not None:
+                    self._current.cancel()
+                return
+            removed = [job for job in self._jobs if job[0] == jobId]
+            for job in removed:
+                self._jobs.remove(job)
+        if removed:
+            self.jobFinished.emit(jobId, False, u'cancelled')
+
+    def cancelAll(self):
+        with self._lock:
+            jobs, self._jobs = list(self._jobs), deque()
+            if self._current is not None:
+                self._current.cancel()
+        for jobId, name, job in jobs:
+            self.jobFinished.emit(jobId, False, u'cancelled')
+
+    def stop(self):
+        """cancel every job and end the thread, wait() for it to finish"""
+        self.cancelAll()
+        with self._lock:
+            self._stopping = True
+            self._lock.notify()
+
+    def run(self):
+        while True:
+            with self._lock:
+                self._currentId, self._current = None, None
+                while not self._jobs and not self._stopping:
+                    self._lock.wait()
+                if self._stopping:
+                    return
+                jobId, name, job = self._jobs.popleft()
+                self._currentId, self._current = jobId, job
+            self.jobStarted.emit(jobId, name)
+            job.setProgressCallback(lambda stage, done, total, jobId=jobId:
+                                    self.progress.emit(jobId, unicode(stage), done, total))
+            try:
+                result = job.translateData()
+                if job.isCancelled():
+                    self.jobFinished.emit(jobId, False, u'cancelled')
+                else:
+                    self.jobFinished.emit(jobId, bool(result), u'' if result else unicode(result.error or
+                                                                                          u'conversion failed'))
+            except ConversionCancelled:
+                self.jobFinished.emit(jobId, False, u'cancelled')
+            except Exception, msg:
+                self.jobFinished.emit(jobId, False, unicode(msg))
@@ -0,0 +1,199 @@
+# -*-coding: utf-8 -*-
+"""
+this is the raw balance data's filtering before the tare and the calibration.
+it contains the ForceFilter and FilterStream classes
+
+本文件为校准前原始天平数据的滤波, 依次为:
+    despike     去野点: 滑动中值; 给出sigma时只替换偏离滑动中值超过sigma倍稳健标准差(1.4826*MAD)的点
+    lowpass     低通: 居中滑动平均
+    decimate    降采样: 每decimate行取平均(mean)或取其第一行(pick), 角度列随之平均或抽取
+滤波只作用于力和力矩列, 角度列与之逐行对齐. 可整个文件一次滤波(apply), 也可分块流式滤波(stream),
+两者结果逐位相同: 窗口跨越块边界时保留上一块末尾的行, 文件首尾以首行、末行延拓补齐窗口.
+静态、动态文件行数相同时滤波后行数仍相同, 照常逐行去零.
+"""
+from __future__ import division
+from functools import partial
+from numpy import (concatenate, column_stack, median, absolute, newaxis)
+from numpy.lib.stride_tricks import as_strided
+
+MEAN = 'mean'
+PICK = 'pick'
+DECIMATE_MODES = (MEAN, PICK)
+MAD_SCALE = 1.4826  # 正态分布的标准差与MAD之比
+FILTER_BLOCK_ROWS = 32768  # 滑动中值逐块计算, 限制窗口堆叠数组的大小
+
+
+def _windows(x, window):
+    """the read-only (rows - window + 1, window, cols) view of the sliding windows of x"""
+    rows, cols = x.shape
+    return as_strided(x, (rows - window + 1, window, cols), (x.strides[0],) + x.strides, writeable=False)
+
+
+def _despike(x, out, half, sigma):
+    """the running median of x over 2 * half + 1 rows, or only the outliers replaced by it when sigma is given"""
+    window = 2 * half + 1
+    for start in range(0, out.shape[0], FILTER_BLOCK_ROWS):
+        stop = min(start + FILTER_BLOCK_ROWS, out.shape[0])
+        windows = _windows(x[start:stop + 2 * half], window)
+        med = median(windows, axis=1)
+        if sigma:
+            centre = x[start + half:stop + half]
+            mad = median(absolute(windows - med[:, newaxis, :]), axis=1)
+            keep = absolute(centre - med) <= sigma * MAD_SCALE * mad
+            med[keep] = centre[keep]
+        out[start:stop] = med
+
+
+def _movingAverage(x, out, half):
+    """the centred mean of x over 2 * half + 1 rows, summed in the same order whatever the block"""
+    rows = out.shape[0]
+    out[...] = x[:rows]
+    for k in range(1, 2 * half + 1):
+        out += x[k:k + rows]
+    out /= 2 * half + 1
+
+
+def _mirror(rows, h):
+    """the h rows before rows[0] reflected about it, rows[0] repeated where rows runs short"""
+    mirrored = rows[h:0:-1]
+    return concatenate((rows[:1].repeat(h - mirrored.shape[0], axis=0), mirrored))
+
+
+class _WindowStage(object):
+    """
+    a centred filter of `half` rows each side over the force columns, carrying the rows it
+    still needs into the next block. the angle columns pass through, delayed with the forces.
+    """
+    def __init__(self, half, angleCols, compute):
+        self._half = half
+        self._angleCols = angleCols
+        self._compute = compute  # compute(x, out): rows half .. len(x) - half of x filtered into out
+        self._past = None  # the half rows before the pending ones
+        self._pending = None
+
+    def push(self, rows, final=False):
+        h = self._half
+        if self._past is None:
+            # the file starts: mirror its first rows once there are enough of them
+            if self._pending is not None:
+                rows = concatenate((self._pending, rows))
+            if not rows.shape[0] or (rows.shape[0] <= h and not final):
+                self._pending = rows
+                return rows[:0]
+            self._past, self._pending = _mirror(rows[:h + 1], h), rows[:0]
+        block = concatenate((self._past, self._pending, rows))
+        if final:
+            block = concatenate((block, _mirror(block[:-h - 2:-1], h)[::-1]))
+        stop = max(h, block.shape[0] - h)
+        out = block[h:stop].copy()
+        self._compute(block[:stop + h, self._angleCols:], out[:, self._angleCols:])
+        if final:
+            self._past = self._pending = None
+        else:
+            self._past, self._pending = block[stop - h:stop], block[stop:]
+        return out
+
+
+class _DecimateStage(object):
+    """every `factor` rows to one, their mean or their first row; the last, partial group is kept"""
+    def __init__(self, factor, mode):
+        self._factor = factor
+        self._mode = mode
+        self._pending = None
+
+    def push(self, rows, final=False):
+        f = self._factor
+        block = rows if self._pending is None else concatenate((self._pending, rows))
+        full = block.shape[0] // f * f
+        self._pending = None if final else block[full:]
+        if self._mode == PICK:
+            out = block[:full:f]
+            if final and full < block.shape[0]:
+                out = concatenate((out, block[full:full + 1]))
+            return out.copy()
+        groups = block[:full].reshape(full // f, f, block.shape[1])
+        out = groups[:, 0].copy()
+        for k in range(1, f):
+            out += groups[:, k]
+        out /= f
+        if final and full < block.shape[0]:
+            out = concatenate((out, block[full:].mean(axis=0)[newaxis]))
+        return out
+
+
+class ForceFilter(object):
+    """
+    the filter settings, one ForceFilter serves any number of files and conversions.
+
+    despike and lowpass are window lengths in rows (odd, 0 or 1 is off), sigma the despike
+    threshold in robust standard deviations (0 replaces every row by the running median),
+    decimate the row reduction factor and decimateMode one of DECIMATE_MODES.
+    key identifies the settings.
+    """
+    def __init__(self, despike=0, sigma=0., lowpass=0, decimate=1, decimateMode=MEAN):
+        for name, window in (('despike', despike), ('lowpass', lowpass)):
+            if window < 0 or (window > 1 and window % 2 == 0):
+                raise ValueError('the %s window must be an odd number of rows, got %r' % (name, window))
+        if sigma < 0:
+            raise ValueError('the despike sigma must not be negative, got %r' % sigma)
+        if decimate < 1:
+            raise ValueError('the decimate factor must be at least 1, got %r' % decimate)
+        if decimateMode not in DECIMATE_MODES:
+            raise ValueError('unknown decimate mode %r, expected one of %s'
+                             % (decimateMode, ', '.join(DECIMATE_MODES)))
+        self.despike = despike // 2
+        self.sigma = sigma
+        self.lowpass = lowpass // 2
+        self.decimate = decimate
+        self.decimateMode = decimateMode
+        self.key = (self.despike, sigma, self.lowpass, decimate, decimateMode)
+
+    def __repr__(self):
+        return 'ForceFilter(despike=%d, sigma=%g, lowpass=%d, decimate=%d, decimateMode=%r)' % (
+            2 * self.despike + 1 if self.despike else 0, self.sigma,
+            2 * self.lowpass + 1 if self.lowpass else 0, self.decimate, self.decimateMode)
+
+    def stream(self, angleCols):
+        """a FilterStream for one file's blocks, angleCols the number of angle columns"""
+        stages = []
+        if self.despike:
+            stages.append(_WindowStage(self.despike, angleCols,
+                                       partial(_despike, half=self.despike, sigma=self.sigma)))
+        if self.lowpass:
+            stages.append(_WindowStage(self.lowpass, angleCols, partial(_movingAverage, half=self.lowpass)))
+        if self.decimate > 1:
+            stages.append(_DecimateStage(self.decimate, self.decimateMode))
+        return FilterStream(stages, angleCols)
+
+    def apply(self, angle, force):
+        """filter a whole file's angle and force columns at once"""
+        return self.stream(angle.shape[1]).push(angle, force, final=True)
+
+
+class FilterStream(object):
+    """
+    the state of a ForceFilter over the successive blocks of one file. push() returns the rows
+    ready so far, fewer than given while a window waits for the next block; final=True (or
+    finish()) returns the rest.
+    """
+    def __init__(self, stages, angleCols):
+        self._stages = stages
+        self._angleCols = angleCols
+        self._empty = None  # a block of no rows, for finish()
+
+    def push(self, angle, force, final=False):
+        if not self._stages:
+            return angle, force
+        return self._push(column_stack((angle, force)).astype(force.dtype, copy=False), final)
+
+    def finish(self):
+        """the rows still held back at the end of the file"""
+        if self._empty is None:
+            return None, None
+        return self._push(self._empty, True)
+
+    def _push(self, rows, final):
+        self._empty = rows[:0]
+        for stage in self._stages:
+            rows = stage.push(rows, final)
+        return rows[:, :self._angleCols], rows[:, self._angleCols:]
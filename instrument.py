@@ -0,0 +1,215 @@
+# -*-coding: utf-8 -*-
+"""
+this is the conversion's timing and memory instrumentation.
+it contains the StageStats, StageRecorder and ConversionResult classes
+
+本文件为转换过程的计时和内存统计: Balance.translateData()返回ConversionResult, 记录各阶段
+(与balance.STAGES相同, 另有write)的耗时、调用次数、行数和峰值内存, 输入输出行数,
+G18迭代次数统计以及转换失败时的异常. ConversionResult的真值即转换是否成功, 与原来的True/False用法兼容.
+峰值内存为阶段中进程驻留内存的最高值减去阶段开始时的驻留内存: Linux下每个阶段前清零VmHWM,
+其它系统只能以进程至今峰值(ru_maxrss)的增长计, 偏小.
+"""
+from __future__ import division
+import sys
+import time
+from collections import OrderedDict
+
+PROC_STATUS = '/proc/self/status'
+PROC_CLEAR_REFS = '/proc/self/clear_refs'
+
+
+def rssBytes(field='VmRSS'):
+    """VmRSS (or VmHWM, the peak) of this process from /proc, None where there is no /proc"""
+    try:
+        with open(PROC_STATUS) as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        return None
+
+
+def resetPeak():
+    """start a new VmHWM, True when the system allows it"""
+    try:
+        with open(PROC_CLEAR_REFS, 'w') as f:
+            f.write('5')
+        return True
+    except IOError:
+        return False
+
+
+def maxRssBytes():
+    """the process's resident peak so far"""
+    try:
+        import resource
+    except ImportError:
+        return 0
+    scale = 1 if sys.platform == 'darwin' else 1024  # bytes on macOS, kilobytes elsewhere
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class PeakMeter(object):
+    """the resident memory a piece of work adds at its peak: start(), the work, then peakBytes()"""
+    def __init__(self):
+        self._reset = False
+        self.before = 0
+
+    def start(self):
+        self._reset = resetPeak()
+        self.before = (rssBytes() if self._reset else None) or maxRssBytes()
+
+    def peak(self):
+        """the resident peak since start(), in bytes"""
+        return (rssBytes('VmHWM') if self._reset else None) or maxRssBytes()
+
+    def peakBytes(self):
+        return max(0, self.peak() - self.before)
+
+
+class StageStats(object):
+    """
+    the totals of one stage over a conversion: seconds, calls (one per block in the streaming
+    mode), rows, peakBytes (None when not sampled) and cached, True when the stage cache served it.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.
+        self.calls = 0
+        self.rows = 0
+        self.peakBytes = None
+        self.cached = False
+
+    def asDict(self):
+        return {'seconds': self.seconds, 'calls': self.calls, 'rows': self.rows, 'peakBytes': self.peakBytes,
+                'cached': self.cached}
+
+    def __repr__(self):
+        return 'StageStats(%r, seconds=%.4f, calls=%d, rows=%d, peakBytes=%r, cached=%r)' % (
+            self.name, self.seconds, self.calls, self.rows, self.peakBytes, self.cached)
+
+
+class StageRecorder(object):
+    """
+    collects the StageStats of one conversion in the order the stages first run, and its row counts.
+    memory samples every stage's peak (about 50 us a call on Linux), peak is then the highest
+    resident size seen; callback(stats) is called after each stage.
+    """
+    def __init__(self, memory=True, callback=None):
+        self.stages = OrderedDict()
+        self.inputRows = 0
+        self.outputRows = 0
+        self.peak = 0
+        self._memory = memory
+        self._callback = callback
+
+    def _stats(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(name)
+        return stats
+
+    def measure(self, name, compute, rows=0):
+        """run compute() as (part of) the stage `name`, return its result"""
+        stats = self._stats(name)
+        meter = PeakMeter() if self._memory else None
+        if meter is not None:
+            meter.start()
+        t0 = time.time()
+        try:
+            return compute()
+        finally:
+            stats.seconds += time.time() - t0
+            stats.calls += 1
+            stats.rows += rows
+            if meter is not None:
+                peak = meter.peak()
+                self.peak = max(self.peak, peak)
+                peak = max(0, peak - meter.before)
+                stats.peakBytes = peak if stats.peakBytes is None else max(stats.peakBytes, peak)
+            if self._callback is not None:
+                self._callback(stats)
+
+    def cached(self, name, rows=0):
+        """the stage `name` was served by the stage cache"""
+        stats = self._stats(name)
+        stats.cached = True
+        stats.calls += 1
+        stats.rows += rows
+        if self._callback is not None:
+            self._callback(stats)
+
+
+class ConversionResult(object):
+    """
+    the outcome of Balance.translateData(), true when the conversion succeeded.
+
+        ok                  -- the conversion succeeded
+        error, traceback    -- the exception that stopped it and its formatted traceback, else None
+        balanceSty          -- the balance style converted
+        seconds, peakBytes  -- wall time and resident peak of the whole conversion
+        stages              -- {stage: StageStats}, in the order the stages ran
+        inputRows           -- rows of the dynamic file as read
+        outputRows          -- rows written to the body and aero files
+        workspaceBytes      -- the workspace buffers held after the conversion
+        iterations          -- G18 solver iterations: {'mean', 'max'}, None for the other balances
+        unconvergedRows     -- G18 rows that did not converge, None for the other balances
+    """
+    def __init__(self, balanceSty=None):
+        self.ok = False
+        self.error = None
+        self.traceback = None
+        self.balanceSty = balanceSty
+        self.seconds = 0.
+        self.peakBytes = None
+        self.stages = OrderedDict()
+        self.inputRows = 0
+        self.outputRows = 0
+        self.workspaceBytes = 0
+        self.iterations = None
+        self.unconvergedRows = None
+
+    def __nonzero__(self):
+        return self.ok
+
+    __bool__ = __nonzero__
+
+    def asDict(self):
+        """the result as plain types, for json or a monitoring system"""
+        return {'ok': self.ok, 'error': None if self.error is None else '%s: %s' % (type(self.error).__name__,
+                                                                                       self.error),
+                'balanceSty': self.balanceSty, 'seconds': self.seconds, 'peakBytes': self.peakBytes,
+                'stages': OrderedDict((name, stats.asDict()) for name, stats in self.stages.items()),
+                'inputRows': self.inputRows, 'outputRows': self.outputRows, 'workspaceBytes': self.workspaceBytes,
+                'iterations': self.iterations, 'unconvergedRows': self.unconvergedRows}
+
+    def summary(self):
+        """a few lines of text: the outcome, then one line per stage"""
+        lines = ['%s  %d -> %d rows  %.3f s  peak %s' % (
+            'ok' if self.ok else 'failed: %s' % (self.error or 'conversion failed'), self.inputRows,
+            self.outputRows, self.seconds, _megabytes(self.peakBytes))]
+        for name, stats in self.stages.items():
+            lines.append('    %-10s %9.4f s  %s  %d calls%s' % (name, stats.seconds, _megabytes(stats.peakBytes),
+                                                               stats.calls, '  cached' if stats.cached else ''))
+        if self.iterations is not None:
+            lines.append('    iterations mean %.2f max %d, %d rows unconverged' % (
+                self.iterations['mean'], self.iterations['max'], self.unconvergedRows))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return '<ConversionResult %s>' % self.summary().split('\n')[0]
+
+
+def _megabytes(nbytes):
+    return '%9.1f MB' % (nbytes / 2 ** 20) if nbytes is not None else '        - MB'
+
+
+def loggingCallbacks(logger):
+    """(stageCallback, resultCallback) for Balance.setStageCallback, setResultCallback writing to a logging.Logger"""
+    def stageCallback(stats):
+        logger.debug('stage %s: %.4f s, %d rows, peak %s', stats.name, stats.seconds, stats.rows,
+                     _megabytes(stats.peakBytes).strip())
+
+    def resultCallback(result):
+        (logger.info if result.ok else logger.error)('conversion %s', result.summary())
+    return stageCallback, resultCallback
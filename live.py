@@ -0,0 +1,374 @@
+# -*-coding: utf-8 -*-
+"""
+this is the live conversion of a running acquisition.
+it contains the FileFollower, StreamSource, SocketSource and LiveConverter classes and the replay functions
+
+本文件为试验进行中的实时转换: 采集系统不断向动态文件追加数据(或写入管道、本地套接字),
+LiveConverter跟随读取新到的完整行, 以预先载入的静态零读数(tare.TareTable, 或整个静态文件逐行对应)
+去零后按Balance的设置增量转换, 体轴、风轴系数随到随写(每批写后flush), 并可通过回调交给界面或监控.
+数据源:
+    FileFollower    跟随增长中的文件(类似tail -f), 一段时间无新数据(idleTimeout)即认为试验结束
+    StreamSource    管道、fifo或标准输入, 读到结束为止
+    SocketSource    本地套接字: 'host:port'为TCP, 其它为Unix套接字路径; 连接对方, 或listen=True时等待对方连接
+离线测试用回放: replay把记录好的数据文件按给定速率逐块写入文件或流, serveReplay在套接字上回放.
+实时数据没有文件尾, 不能解析的行(文字、缺列)跳过并计数.
+"""
+from __future__ import division
+import os
+import socket
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from Queue import Queue, Empty
+from numpy import (fromstring, array, empty, concatenate)
+from dataIO import lineWidths
+
+LIVE_POLL_INTERVAL = 0.05  # 没有新数据时的等待时间, 秒
+LIVE_MAX_ROWS = 65536  # 每批最多转换的行数
+READ_BYTES = 1 << 20  # 每次读取的字节数
+REPLAY_BLOCK_ROWS = 100  # 回放时每次写入的行数
+
+
+class _LineSource(object):
+    """
+    the complete lines of a byte source, headerRows lines at its start going to headerList.
+    read() returns the new lines ([] while nothing has arrived) and sets ended once the source is over.
+    a source implements _readBytes().
+    """
+    __metaclass__ = ABCMeta
+
+    def __init__(self, headerRows=0):
+        self._headerRows = headerRows
+        self._partial = b''
+        self.headerList = []
+        self.ended = False
+
+    @abstractmethod
+    def _readBytes(self, timeout):
+        """
+        the bytes that arrived within timeout seconds, b'' when none did, None at the end of the source.
+        it may return sooner than timeout, and may end in the middle of a line.
+        """
+
+    def read(self, timeout=LIVE_POLL_INTERVAL):
+        if self.ended:
+            return []
+        data = self._readBytes(timeout)
+        if data is None:
+            # the end: an unterminated last line is complete now
+            self.ended = True
+            lines = [self._partial] if self._partial.strip() else []
+            self._partial = b''
+        else:
+            data = self._partial + data
+            cut = data.rfind(b'\n') + 1
+            lines, self._partial = data[:cut].splitlines(True), data[cut:]
+        if len(self.headerList) < self._headerRows:
+            take = self._headerRows - len(self.headerList)
+            self.headerList.extend(line.replace(b'\r\n', b'\n') for line in lines[:take])
+            lines = lines[take:]
+        return lines
+
+    def headerComplete(self):
+        return len(self.headerList) >= self._headerRows or self.ended
+
+    def close(self):
+        pass
+
+
+class FileFollower(_LineSource):
+    """
+    the lines appended to a growing file, from its start. the file may not exist yet; the source
+    ends once idleTimeout seconds pass without new data (None follows until close()).
+    """
+    def __init__(self, fname, headerRows=0, idleTimeout=None):
+        super(FileFollower, self).__init__(headerRows)
+        self._fname = fname
+        self._idleTimeout = idleTimeout
+        self._file = None
+        self._lastData = time.time()
+
+    def _readBytes(self, timeout):
+        if self._file is None and os.path.exists(self._fname):
+            self._file = open(self._fname, 'rb')
+        data = self._file.read(READ_BYTES) if self._file is not None else b''
+        if data:
+            self._lastData = time.time()
+            return data
+        if self._idleTimeout is not None and time.time() - self._lastData > self._idleTimeout:
+            return None
+        time.sleep(timeout)
+        return b''
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class StreamSource(_LineSource):
+    """
+    the lines of a pipe, fifo, standard input or connected socket, read to its end by a
+    background thread so a quiet source never blocks the conversion.
+    """
+    def __init__(self, stream, headerRows=0):
+        super(StreamSource, self).__init__(headerRows)
+        self._stream = stream
+        if hasattr(stream, 'recv'):
+            readChunk = stream.recv
+        else:
+            fd = stream.fileno()
+            readChunk = lambda n: os.read(fd, n)
+        self._queue = Queue()
+        self._thread = threading.Thread(target=self._pump, args=(readChunk,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _pump(self, readChunk):
+        try:
+            while True:
+                data = readChunk(READ_BYTES)
+                if not data:
+                    break
+                self._queue.put(data)
+        except (IOError, OSError, socket.error):
+            pass  # a closed source ends like an empty read
+        self._queue.put(None)
+
+    def _readBytes(self, timeout):
+        try:
+            data = self._queue.get(timeout=timeout)
+        except Empty:
+            return b''
+        if data is None:
+            return None
+        chunks = [data]
+        while True:  # take everything already queued, one batch converts it all
+            try:
+                data = self._queue.get_nowait()
+            except Empty:
+                break
+            if data is None:
+                self._queue.put(None)
+                break
+            chunks.append(data)
+        return b''.join(chunks)
+
+    def close(self):
+        self._stream.close()
+
+
+def _socketAddress(address):
+    """(family, address) of 'host:port' (TCP) or a Unix socket path"""
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit():
+        return socket.AF_INET, (host or 'localhost', int(port))
+    return socket.AF_UNIX, address
+
+
+class SocketSource(StreamSource):
+    """
+    the lines sent over a local socket, address 'host:port' or a Unix socket path. connects to the
+    sender, or with listen=True waits for the sender to connect (timeout seconds, None waits forever).
+    """
+    def __init__(self, address, headerRows=0, listen=False, timeout=None):
+        family, addr = _socketAddress(address)
+        if listen:
+            server = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                server.bind(addr)
+                server.listen(1)
+                server.settimeout(timeout)
+                conn = server.accept()[0]
+            finally:
+                server.close()
+            conn.settimeout(None)
+        else:
+            conn = socket.create_connection(addr, timeout) if family == socket.AF_INET else socket.socket(family)
+            if family != socket.AF_INET:
+                conn.connect(addr)
+            conn.settimeout(None)
+        super(SocketSource, self).__init__(conn, headerRows)
+
+
+def _parseLines(lines, columns, dtype):
+    """the column arrays of the data lines and the number of non-blank lines that are not data"""
+    width = max(endCol for startCol, endCol in columns)
+    text = b''.join(lines)
+    table = fromstring(text, dtype=dtype, sep=' ') if lines else empty(0, dtype)
+    cols = table.shape[0] // len(lines) if lines else 0
+    skipped = 0
+    if lines and cols >= width and table.shape[0] == len(lines) * cols and (lineWidths(text) == cols).all():
+        table = table.reshape(len(lines), cols)
+    else:
+        rows = []
+        for line in lines:
+            try:
+                values = [float(v) for v in line.split()]
+            except ValueError:
+                values = []
+            if len(values) >= width:
+                rows.append(values[:width])
+            elif line.strip():
+                skipped += 1
+        table = array(rows, dtype=dtype).reshape(len(rows), width)
+    return [table[:, (startCol - 1):endCol] for startCol, endCol in columns], skipped
+
+
+class LiveConverter(object):
+    """
+    convert a live source's rows with a Balance's settings as they arrive.
+
+    the static tare is the Balance's TareTable when it has one, otherwise its static file, loaded
+    once and matched row by row. the Balance's force filter runs as a stream. every batch is
+    written to the Balance's body and aero files (writeFiles) and handed to callback(Mb, Ma, firstRow),
+    Mb and Ma being workspace buffers valid until the next batch.
+    """
+    def __init__(self, balance, source, callback=None, writeFiles=True, maxRows=LIVE_MAX_ROWS):
+        self._balance = balance
+        self._source = source
+        self._callback = callback
+        self._writeFiles = writeFiles
+        self._maxRows = maxRows
+        self._table = balance.calibrationTable()
+        self._columns = balance.columns()
+        self._staAngle, self._staForce = balance.prepareStatic()
+        self._filter = balance.filterStream()
+        self._pending = []
+        self._writer = None
+        self._stopped = False
+        self.inputRows = 0  # data rows read
+        self.rows = 0  # rows converted and emitted
+        self.skippedLines = 0
+        self.lastLatency = 0.  # seconds from a batch's arrival to its emission
+        self.maxLatency = 0.
+
+    def stop(self):
+        """end run() after the current batch, from any thread"""
+        self._stopped = True
+
+    def poll(self, timeout=LIVE_POLL_INTERVAL):
+        """
+        convert what arrived within timeout seconds, return the rows emitted, or None once the
+        source has ended and its last rows are emitted.
+        """
+        lines = self._pending + self._source.read(timeout)
+        arrival = time.time()
+        if not self._source.headerComplete():
+            self._pending = lines
+            return 0
+        self._pending = lines[self._maxRows:]
+        (angle, force), skipped = _parseLines(lines[:self._maxRows], self._columns, self._balance.precision())
+        self.skippedLines += skipped
+        self.inputRows += force.shape[0]
+        ended = self._source.ended and not self._pending
+        if self._filter is not None:
+            if force.shape[0]:
+                angle, force = self._filter.push(angle, force)
+            if ended:
+                rest = self._filter.finish()  # the rows the filter windows held back
+                if rest[1] is not None:
+                    angle, force = concatenate((angle, rest[0])), concatenate((force, rest[1]))
+        rows = self._emit(angle, force, arrival) if force.shape[0] else 0
+        return None if ended else rows
+
+    def _emit(self, angle, force, arrival):
+        balance = self._balance
+        m = force.shape[0]
+        staAngle = staForce = None
+        if self._staForce is not None:
+            if self.rows + m > self._staForce.shape[0]:
+                raise ValueError('the live run passed the %d rows of the static file, a tare table '
+                                 '(setTareTable) tares runs of any length' % self._staForce.shape[0])
+            staAngle = self._staAngle[self.rows:self.rows + m]
+            staForce = self._staForce[self.rows:self.rows + m]
+        Mb, Ma = balance.convertBlock(staAngle, staForce, angle, force, self._table, self.rows)
+        if self._writeFiles:
+            if self._writer is None:
+                self._writer = balance.openWriter(self._source.headerList)
+            self._writer.write(Mb, Ma)
+            self._writer.flush()
+        if self._callback is not None:
+            self._callback(Mb, Ma, self.rows)
+        self.rows += m
+        self.lastLatency = time.time() - arrival
+        self.maxLatency = max(self.maxLatency, self.lastLatency)
+        return m
+
+    def run(self):
+        """convert until the source ends or stop() is called, then close; return the rows emitted"""
+        try:
+            while not self._stopped:
+                if self.poll() is None:
+                    break
+        finally:
+            self.close()
+        return self.rows
+
+    def close(self):
+        """close the source and finish the body and aero files"""
+        self._source.close()
+        if self._writeFiles and self._writer is None:
+            self._writer = self._balance.openWriter(self._source.headerList)
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def replay(srcFile, dst, rowsPerSecond=1000., blockRows=REPLAY_BLOCK_ROWS, headerRows=1):
+    """
+    write a recorded data file to dst (a file name, or a writable file object such as a pipe)
+    the way an acquisition would: the header first, then blockRows rows at a time at rowsPerSecond.
+    """
+    with open(srcFile, 'rb') as f:
+        lines = f.readlines()
+    out = open(dst, 'wb') if isinstance(dst, basestring) else dst
+    try:
+        out.write(b''.join(lines[:headerRows]))
+        out.flush()
+        start = time.time()
+        for first in range(headerRows, len(lines), blockRows):
+            delay = start + (first - headerRows) / rowsPerSecond - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            out.write(b''.join(lines[first:first + blockRows]))
+            out.flush()
+    finally:
+        if isinstance(dst, basestring):
+            out.close()
+
+
+def startReplay(srcFile, dst, rowsPerSecond=1000., blockRows=REPLAY_BLOCK_ROWS, headerRows=1):
+    """replay() on a background thread, return the thread"""
+    thread = threading.Thread(target=replay, args=(srcFile, dst, rowsPerSecond, blockRows, headerRows))
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def serveReplay(srcFile, address, rowsPerSecond=1000., blockRows=REPLAY_BLOCK_ROWS, headerRows=1):
+    """
+    listen on a local socket address and replay() to the first connection, on a background thread.
+    return the thread once the socket listens, so a SocketSource can connect right away.
+    """
+    family, addr = _socketAddress(address)
+    server = socket.socket(family, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(addr)
+    server.listen(1)
+
+    def serve():
+        try:
+            conn = server.accept()[0]
+        finally:
+            server.close()
+        out = conn.makefile('wb')
+        try:
+            replay(srcFile, out, rowsPerSecond, blockRows, headerRows)
+        finally:
+            out.close()
+            conn.close()
+    thread = threading.Thread(target=serve)
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -0,0 +1,118 @@
+# -*-coding: utf-8 -*-
+"""
+this is the forced oscillation data's processing.
+it contains the OscillationResult class and the analyseOscillation, writeOscillation functions
+
+本文件为强迫振荡试验数据处理: 俯仰、滚转、偏航三种运动方式(与界面的__KineticsSty__顺序相同),
+由转换后的气动系数和运动角度一次得到:
+    1. 整周期内各通道在振荡频率上的一次谐波(同时拟合所有通道),
+       同相分量/振幅为静导数项, 异相分量/(振幅*减缩频率)为阻尼导数项;
+    2. 按相位分段的相位平均迟滞环.
+运动角度: 俯仰为攻角, 滚转为滚转角, 偏航为侧滑角的负值; 参考长度: 俯仰为参考弦长, 滚转、偏航为展长.
+"""
+from __future__ import division
+from numpy import (asarray, arange, argsort, column_stack, cos, sin, ones, floor, pi, deg2rad, flatnonzero,
+                   concatenate, diff, add, sqrt, arctan2, empty, newaxis, savetxt)
+from numpy.linalg import lstsq
+
+PITCH = 0
+ROLL = 1
+YAW = 2
+KINETICS_STYLES = {'PITCH': PITCH, 'ROLL': ROLL, 'YAW': YAW}  # 运动方式名称与kineticsSty的对应
+# the angle column (alpha, beta, phi, t) and the sign giving the motion angle of each mode
+MOTION_ANGLES = {PITCH: (0, 1.), ROLL: (2, 1.), YAW: (1, -1.)}
+TIME_COLUMN = 3
+PHASE_BINS = 36
+CHANNELS = ('CX', 'CY', 'CZ', 'Cl', 'Cm', 'Cn')
+
+
+class OscillationResult(object):
+    """
+    the derivatives and the phase-averaged loops of one oscillation run.
+
+        cycles              -- whole cycles used
+        amplitude, mean     -- of the motion angle, degrees
+        reducedFrequency    -- omega * refLength / (2 * speed)
+        inPhase             -- d(C)/d(angle) per channel, 1/rad
+        outOfPhase          -- d(C)/d(rate * refLength / (2 * speed)) per channel, the damping derivatives
+        fitError            -- rms of each channel about its first harmonic
+        phase               -- bin centres, rad, 0 where the motion angle is largest
+        phaseAngle          -- the phase-averaged motion angle in each bin, degrees
+        phaseCoeffs         -- the phase-averaged coefficients in each bin, (bins, channels)
+    """
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def _motionAngle(angle, kineticsSty):
+    col, sign = MOTION_ANGLES[kineticsSty]
+    return sign * angle[:, col]
+
+
+def analyseOscillation(angle, coeffs, kineticsSty, frequency, refLength, speed, time=None, bins=PHASE_BINS):
+    """
+    reduce an oscillation run to derivatives in one pass.
+
+    angle -- (m, 4) alpha, beta, phi (degrees) and time columns; coeffs -- (m, channels).
+    time defaults to angle's time column, seconds. frequency in Hz, refLength in m, speed in m/s.
+    """
+    angle, coeffs = asarray(angle), asarray(coeffs)
+    if kineticsSty not in MOTION_ANGLES:
+        raise ValueError('unknown kinetics style %r' % kineticsSty)
+    t = asarray(angle[:, TIME_COLUMN] if time is None else time, dtype=float)
+    theta = deg2rad(_motionAngle(angle, kineticsSty))
+    omega = 2. * pi * frequency
+
+    # whole cycles only, so the harmonic fit and the phase bins see every phase equally often
+    t = t - t[0]
+    cycles = int(floor(t[-1] * frequency + 1e-9)) if t.shape[0] else 0
+    if cycles < 1:
+        raise ValueError('the run holds less than one oscillation cycle at %g Hz' % frequency)
+    rows = flatnonzero(t < cycles / frequency)
+    t, theta, C = t[rows], theta[rows], coeffs[rows]
+
+    # first harmonic of the motion and of every channel: x = x0 + a * cos(wt) + b * sin(wt)
+    wt = omega * t
+    basis = column_stack((ones(t.shape[0]), cos(wt), sin(wt)))
+    fit = lstsq(basis, column_stack((theta, C)), rcond=None)[0]
+    residual = column_stack((theta, C)) - basis.dot(fit)
+    # complex amplitudes X = a - ib, so that x1(t) = Re(X * exp(i * wt))
+    X = fit[1] - 1j * fit[2]
+    H = X[1:] / X[0]  # coefficient per unit motion angle, the real part in phase with the motion
+    amplitude = abs(X[0])
+    reducedFrequency = omega * refLength / (2. * speed)
+
+    # phase-averaged loops, phase 0 where the motion angle is largest
+    phase = (wt + arctan2(X[0].imag, X[0].real)) % (2. * pi)
+    index = (phase * (bins / (2. * pi))).astype(int).clip(0, bins - 1)
+    order = argsort(index, kind='mergesort')
+    sortedIndex = index[order]
+    starts = flatnonzero(concatenate(([True], sortedIndex[1:] != sortedIndex[:-1])))
+    counts = diff(concatenate((starts, [order.shape[0]])))
+    sums = add.reduceat(column_stack((theta, C))[order], starts, axis=0)
+    means = empty((bins, 1 + C.shape[1]))
+    means.fill(float('nan'))  # bins no sample fell in
+    means[sortedIndex[starts]] = sums / counts[:, newaxis]
+
+    return OscillationResult(kineticsSty=kineticsSty, frequency=frequency, cycles=cycles, samples=t.shape[0],
+                             amplitude=amplitude * 180. / pi, mean=fit[0, 0] * 180. / pi,
+                             reducedFrequency=reducedFrequency,
+                             inPhase=H.real, outOfPhase=H.imag / reducedFrequency,
+                             fitError=sqrt((residual[:, 1:] ** 2).mean(axis=0)),
+                             phase=(arange(bins) + 0.5) * (2. * pi / bins),
+                             phaseAngle=means[:, 0] * 180. / pi, phaseCoeffs=means[:, 1:])
+
+
+def writeOscillation(result, fname, channels=CHANNELS, fmt='%-15.8f'):
+    """write the derivatives and the phase-averaged loops of an OscillationResult as text"""
+    with open(fname, 'w') as f:
+        f.write('kineticsSty %d  frequency %.6f Hz  cycles %d  samples %d\n'
+                % (result.kineticsSty, result.frequency, result.cycles, result.samples))
+        f.write('amplitude %.6f deg  mean %.6f deg  reduced frequency %.6f\n'
+                % (result.amplitude, result.mean, result.reducedFrequency))
+        f.write(' '.join('%-15s' % name for name in ('derivative',) + tuple(channels)) + '\n')
+        for name, values in (('inPhase', result.inPhase), ('outOfPhase', result.outOfPhase),
+                             ('fitError', result.fitError)):
+            f.write('%-15s ' % name + ' '.join(fmt % v for v in values) + '\n')
+        f.write('\n' + ' '.join('%-15s' % name for name in ('phase', 'angle') + tuple(channels)) + '\n')
+        savetxt(f, column_stack((result.phase, result.phaseAngle, result.phaseCoeffs)), fmt=fmt)
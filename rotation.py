@@ -0,0 +1,101 @@
+# -*-coding: utf-8 -*-
+"""
+this is the body frame to wind frame rotation.
+it contains the rotationMatrices and bodyToWind functions
+
+本文件为体轴系到风轴系的转换: 每一行的正弦、余弦只计算一次, 组成该行的力和力矩旋转矩阵,
+一次批量作用于力和力矩. 攻角、侧滑角成段重复时, 只对不同的(攻角, 侧滑角)计算旋转矩阵, 再分配回各行.
+"""
+from __future__ import division
+from numpy import (empty, sin, cos, multiply, negative, einsum, flatnonzero, cumsum, unique, ascontiguousarray)
+
+# the (alpha, beta) pairs are deduplicated when the rows hold the same angles for
+# at least this many samples on average, below that the trig is cheaper than the lookup
+DEDUP_MIN_RUN = 8
+# the rotations are built and applied this many rows at a time, which bounds their buffer
+ROTATION_BLOCK_ROWS = 32768
+
+
+def rotationMatrices(alphaR, betaR, out=None):
+    """
+    the rotation of every row, shape (m, 2, 3, 3): [:, 0] acts on Fx, Fy, Fz and [:, 1] on Mx, My, Mz.
+    the moment rows are the ones the balance programs have always used.
+    """
+    ca, sa, cb, sb = cos(alphaR), sin(alphaR), cos(betaR), sin(betaR)
+    R = empty((alphaR.shape[0], 2, 3, 3), dtype=alphaR.dtype) if out is None else out
+    F, M = R[:, 0], R[:, 1]
+    multiply(ca, cb, out=F[:, 0, 0])
+    multiply(sa, cb, out=F[:, 0, 1])
+    negative(sb, out=F[:, 0, 2])
+    negative(sa, out=F[:, 1, 0])
+    F[:, 1, 1] = ca
+    F[:, 1, 2] = 0.
+    multiply(ca, sb, out=F[:, 2, 0])
+    multiply(sa, sb, out=F[:, 2, 1])
+    F[:, 2, 2] = cb
+
+    multiply(ca, cb, out=M[:, 0, 0])
+    multiply(sa, ca, out=M[:, 0, 1])
+    negative(M[:, 0, 1], out=M[:, 0, 1])
+    M[:, 0, 2] = sb
+    M[:, 1, 0] = sa
+    M[:, 1, 1] = ca
+    M[:, 1, 2] = 0.
+    multiply(ca, sb, out=M[:, 2, 0])
+    negative(M[:, 2, 0], out=M[:, 2, 0])
+    multiply(sa, sb, out=M[:, 2, 1])
+    M[:, 2, 2] = cb
+    return R
+
+
+def uniqueAngles(alphaR, betaR, minRun=DEDUP_MIN_RUN):
+    """
+    return (alpha, beta, index) with alpha[index], beta[index] equal to the input rows,
+    or None when the angles do not repeat in runs of minRun samples on average.
+    """
+    m = alphaR.shape[0]
+    if m < 2 or minRun <= 0:
+        return None
+    change = (alphaR[1:] != alphaR[:-1]) | (betaR[1:] != betaR[:-1])
+    starts = flatnonzero(change) + 1
+    if (starts.size + 1) * minRun > m:
+        return None
+
+    # one value per run, then the distinct pairs among the runs
+    runIndex = empty(m, dtype=int)
+    runIndex[0] = 0
+    cumsum(change, out=runIndex[1:])
+    first = empty(starts.size + 1, dtype=int)
+    first[0] = 0
+    first[1:] = starts
+    pairs = ascontiguousarray(alphaR[first]) + 1j * betaR[first]
+    pairs, runToPair = unique(pairs, return_inverse=True)
+    return pairs.real.astype(alphaR.dtype), pairs.imag.astype(betaR.dtype), runToPair[runIndex]
+
+
+def bodyToWind(Fb, angleR, minRun=DEDUP_MIN_RUN, out=None, matrices=None):
+    """
+    rotate the body frame forces and moments Fb (m, 6) by angleR[:, 0] (alpha) and angleR[:, 1] (beta).
+    out (m, 6) and matrices (ROTATION_BLOCK_ROWS, 2, 3, 3) are optional C-contiguous buffers for the
+    result and the rotations.
+    """
+    m = Fb.shape[0]
+    alphaR, betaR = angleR[:, 0], angleR[:, 1]
+    if out is None:
+        out = empty((m, 6), dtype=Fb.dtype)
+    if matrices is None:
+        matrices = empty((min(m, ROTATION_BLOCK_ROWS), 2, 3, 3), dtype=Fb.dtype)
+    dedup = uniqueAngles(alphaR, betaR, minRun)
+    if dedup is not None:
+        alpha, beta, index = dedup
+        pairRotations = rotationMatrices(alpha, beta)
+    Fb3, out3 = Fb.reshape(m, 2, 3), out.reshape(m, 2, 3)
+    for start in range(0, m, ROTATION_BLOCK_ROWS):
+        stop = min(start + ROTATION_BLOCK_ROWS, m)
+        R = matrices[:stop - start]
+        if dedup is None:
+            rotationMatrices(alphaR[start:stop], betaR[start:stop], R)
+        else:
+            pairRotations.take(index[start:stop], axis=0, out=R)
+        einsum('rkij,rkj->rki', R, Fb3[start:stop], out=out3[start:stop])
+    return out
@@ -0,0 +1,424 @@
+# -*-coding: utf-8 -*-
+"""
+this is the local conversion service.
+it contains the JobQueue, ServiceHandler and ConversionService classes
+
+本文件为本机共用的转换服务: 多人共用一台处理机时, 不必各开一个界面争抢CPU和内存,
+而是把转换任务提交给同一个服务, 由固定数量的工作进程依次执行, 超出的任务排队.
+任务与batch.py清单中的一个运行相同(sta、dyn、body、aero、balanceSty、aircraft、tare、filter等):
+sta、dyn和aircraft文件的路径相对于服务的数据目录(--data-root), 不能指向数据目录之外;
+也可以先把文件上传(POST /uploads), 再以staUpload、dynUpload给出上传编号. body、aero只是文件名,
+结果写在服务的任务目录中, 转换后下载. 各工作进程共用解析缓存(dataCache.InputCache, 静态文件只解析一次),
+校准表在启动时编译一次, 工作进程直接继承; 每个工作进程的工作区在其任务之间重复使用.
+HTTP接口(只监听本机):
+    POST   /uploads             上传一个数据文件(请求体即文件内容), 返回上传编号, 201
+    POST   /jobs                提交任务(json), 返回任务状态, 202
+    GET    /jobs                所有任务的状态
+    GET    /jobs/<id>           一个任务的状态: queued、running、done、failed或cancelled, 以及batch的转换结果
+    GET    /jobs/<id>/body      下载体轴结果, /aero为风轴结果
+    DELETE /jobs/<id>           取消排队中的任务(正在执行的任务不能取消)
+    GET    /status              工作进程数、排队和执行中的任务数、缓存大小
+usage: python service.py [--port 8765] [-j 4] [--data-root DIR] [--cache-dir DIR] [--spool-dir DIR]
+    curl -d '{"sta": "run01/sta.txt", "dyn": "run01/dyn.txt", "balanceSty": "G18"}' localhost:8765/jobs
+    curl --data-binary @dyn02.txt localhost:8765/uploads
+"""
+from __future__ import division
+import glob
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from collections import OrderedDict
+from multiprocessing import Pool, cpu_count
+from threading import Thread, Lock
+from Queue import Queue
+from batch import CACHE_MAX_BYTES, _convert
+from calibration import CALIBRATION_DIR, loadCalibrationTable, CalibrationTableError
+from dataCache import InputCache
+
+SERVICE_HOST = '127.0.0.1'  # 只接受本机的连接
+SERVICE_PORT = 8765
+MAX_QUEUED_JOBS = 256  # 排队任务数上限, 超出时拒绝提交(503)
+MAX_FINISHED_JOBS = 1000  # 保留状态的已结束任务数, 超出时删除最早的任务及其任务目录
+MAX_SPEC_BYTES = 1 << 16  # 任务json的上限
+MAX_UPLOAD_BYTES = 256 << 20  # 上传文件的上限
+UPLOAD_MAX_AGE = 24 * 3600  # 未被任务使用的上传文件保留的时间, 秒
+COPY_BYTES = 1 << 16  # 上传、下载时每次读写的字节数
+UPLOAD_KEYS = (('staUpload', 'sta'), ('dynUpload', 'dyn'))
+INPUT_KEYS = ('sta', 'dyn')
+OUTPUT_KEYS = ('body', 'aero')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobError(Exception):
+    """a job the service cannot take or act on, status is the HTTP status to answer with"""
+    def __init__(self, message, status=400):
+        super(JobError, self).__init__(message)
+        self.status = status
+
+
+def _confine(root, path, what):
+    """the real path of path relative to root, a JobError when it leads outside root (.., absolute paths, links)"""
+    if not isinstance(path, basestring) or not path:
+        raise JobError('the %s path must be a non-empty string' % what)
+    fullPath = os.path.realpath(os.path.join(root, path))
+    if not fullPath.startswith(os.path.join(root, '')):
+        raise JobError('the %s path %s is outside %s' % (what, path, root), 403)
+    return fullPath
+
+
+def preloadCalibrationTables(calibrationDir=None):
+    """compile every calibration table once, before the worker processes start and inherit them"""
+    for fname in glob.glob(os.path.join(calibrationDir or CALIBRATION_DIR, '*.json')):
+        try:
+            loadCalibrationTable(fname)
+        except CalibrationTableError:
+            pass  # reported by the jobs which use it
+
+
+class JobQueue(object):
+    """
+    the jobs of the service and the pool converting them: `workers` processes, one job each at a
+    time, the rest waiting in submission order. each job is a batch run (see batch.py); its
+    status is the batch status plus id, state and the submitted, started and finished times.
+    a job reads its inputs under dataRoot (default the current directory) or from the uploads,
+    and writes its results to its own job directory only.
+    """
+    def __init__(self, workers=None, cacheDir=None, spoolDir=None, maxQueued=MAX_QUEUED_JOBS, dataRoot=None):
+        self.workers = workers or cpu_count()
+        self.dataRoot = os.path.realpath(dataRoot or os.getcwd())
+        self._tmpCache = cacheDir is None
+        self.cacheDir = cacheDir or tempfile.mkdtemp(prefix='balance-cache-')
+        self._tmpSpool = spoolDir is None
+        self.spoolDir = spoolDir or tempfile.mkdtemp(prefix='balance-jobs-')
+        self.spoolDir = os.path.realpath(self.spoolDir)
+        self._uploadDir = os.path.join(self.spoolDir, 'uploads')
+        if not os.path.isdir(self._uploadDir):
+            os.makedirs(self._uploadDir)
+        self._maxQueued = maxQueued
+        self._lock = Lock()
+        self._jobs = OrderedDict()  # id: status, in submission order
+        self._runs = {}  # id: run, while the job is queued
+        self._nextId = 1
+        self._queue = Queue()
+        preloadCalibrationTables()
+        self._pool = Pool(self.workers)
+        self._dispatchers = [Thread(target=self._dispatch) for _ in range(self.workers)]
+        for thread in self._dispatchers:
+            thread.daemon = True
+            thread.start()
+
+    def upload(self, stream, length):
+        """save length bytes of stream as an upload, return its id for staUpload, dynUpload"""
+        if length > MAX_UPLOAD_BYTES:
+            raise JobError('the upload exceeds %d bytes' % MAX_UPLOAD_BYTES, 413)
+        self._dropUploads()
+        uploadId = uuid.uuid4().hex
+        fname = os.path.join(self._uploadDir, uploadId)
+        try:
+            with open(fname, 'wb') as f:
+                while length > 0:
+                    data = stream.read(min(COPY_BYTES, length))
+                    if not data:
+                        raise JobError('the upload ended %d bytes early' % length)
+                    f.write(data)
+                    length -= len(data)
+        except Exception:
+            os.remove(fname)
+            raise
+        return uploadId
+
+    def _dropUploads(self):
+        """remove the uploads no job has taken within UPLOAD_MAX_AGE"""
+        now = time.time()
+        for fname in glob.glob(os.path.join(self._uploadDir, '*')):
+            try:
+                if now - os.path.getmtime(fname) > UPLOAD_MAX_AGE:
+                    os.remove(fname)
+            except OSError:
+                pass  # taken by a job meanwhile
+
+    def submit(self, spec):
+        """queue a run, return its status"""
+        with self._lock:
+            queued = sum(1 for status in self._jobs.values() if status['state'] == QUEUED)
+            if queued >= self._maxQueued:
+                raise JobError('the queue is full (%d jobs), try again later' % queued, 503)
+            jobId = self._nextId
+            self._nextId += 1
+        jobDir = os.path.join(self.spoolDir, 'job%d' % jobId)
+        os.makedirs(jobDir)
+        try:
+            run = self._prepare(spec, jobDir)
+        except Exception:
+            shutil.rmtree(jobDir, ignore_errors=True)
+            raise
+        status = {'id': jobId, 'name': run['name'], 'state': QUEUED, 'ok': False, 'error': None, 'seconds': 0.,
+                  'unconvergedRows': 0, 'result': None, 'submitted': time.time(), 'started': None,
+                  'finished': None, 'jobDir': jobDir, 'body': run['body'], 'aero': run['aero']}
+        with self._lock:
+            self._jobs[jobId] = status
+            self._runs[jobId] = run
+            self._dropFinished()
+            status = self._status(jobId)
+        self._queue.put(jobId)
+        return status
+
+    def _prepare(self, spec, jobDir):
+        """
+        the batch run of a submitted job: the inputs confined to dataRoot or taken from the uploads
+        into the job directory, the body and aero files confined to the job directory.
+        """
+        if not isinstance(spec, dict):
+            raise JobError('a job is a json object holding one run')
+        run = dict(spec)
+        uploaded = set()
+        for uploadKey, key in UPLOAD_KEYS:
+            uploadId = run.pop(uploadKey, None)
+            if uploadId is None:
+                continue
+            if not isinstance(uploadId, basestring) or len(uploadId) != 32 or \
+                    any(c not in '0123456789abcdef' for c in uploadId):
+                raise JobError('bad %s %r' % (uploadKey, uploadId))
+            run[key] = os.path.join(jobDir, key + '.txt')
+            try:
+                os.rename(os.path.join(self._uploadDir, uploadId), run[key])
+            except OSError:
+                raise JobError('no upload %s' % uploadId, 404)
+            uploaded.add(key)
+        for key in INPUT_KEYS:
+            if not run.get(key):
+                raise JobError('the job needs the %s file path or an upload %sUpload' % (key, key))
+            if key not in uploaded:
+                run[key] = _confine(self.dataRoot, run[key], key)
+        if isinstance(run.get('aircraft'), basestring):
+            run['aircraft'] = _confine(self.dataRoot, run['aircraft'], 'aircraft')
+        for key in OUTPUT_KEYS:
+            run[key] = _confine(jobDir, run.get(key, key + '.txt'), key)
+        run.setdefault('name', os.path.splitext(os.path.basename(run['dyn']))[0])
+        return run
+
+    def _dispatch(self):
+        """feed the pool one job at a time, so a job is running exactly while its worker converts it"""
+        while True:
+            jobId = self._queue.get()
+            if jobId is None:
+                return
+            with self._lock:
+                status = self._jobs.get(jobId)
+                run = self._runs.pop(jobId, None)
+                if status is None or status['state'] != QUEUED:
+                    continue  # cancelled while queued
+                status['state'] = RUNNING
+                status['started'] = time.time()
+            try:
+                result = self._pool.apply(_convert, ((jobId, run, self.cacheDir),))
+            except Exception, msg:
+                result = {'ok': False, 'error': '%s: %s' % (type(msg).__name__, msg)}
+            with self._lock:
+                for key in ('ok', 'error', 'seconds', 'unconvergedRows', 'result'):
+                    if key in result:
+                        status[key] = result[key]
+                status['state'] = DONE if status['ok'] else FAILED
+                status['finished'] = time.time()
+
+    def _dropFinished(self):
+        """forget the oldest finished jobs beyond MAX_FINISHED_JOBS, with their job directories"""
+        finished = [jobId for jobId, status in self._jobs.items() if status['state'] in FINISHED_STATES]
+        for jobId in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            shutil.rmtree(self._jobs.pop(jobId)['jobDir'], ignore_errors=True)
+
+    def _status(self, jobId):
+        """a copy of a job's status, with its place in the queue while it waits"""
+        status = self._jobs.get(jobId)
+        if status is None:
+            raise JobError('no job %s' % jobId, 404)
+        status = dict(status)
+        if status['state'] == QUEUED:
+            status['position'] = sum(1 for s in self._jobs.values() if s['state'] == QUEUED and s['id'] < jobId)
+        return status
+
+    def status(self, jobId):
+        with self._lock:
+            return self._status(jobId)
+
+    def jobs(self):
+        with self._lock:
+            return [self._status(jobId) for jobId in self._jobs]
+
+    def cancel(self, jobId):
+        """cancel a queued job, return its status"""
+        with self._lock:
+            status = self._jobs.get(jobId)
+            if status is None:
+                raise JobError('no job %s' % jobId, 404)
+            if status['state'] == RUNNING:
+                raise JobError('job %d is running and cannot be cancelled' % jobId, 409)
+            if status['state'] == QUEUED:
+                status['state'] = CANCELLED
+                status['error'] = 'cancelled'
+                status['finished'] = time.time()
+                self._runs.pop(jobId, None)
+            return self._status(jobId)
+
+    def resultFile(self, jobId, which):
+        """the body or aero file of a finished job"""
+        status = self.status(jobId)
+        if status['state'] != DONE:
+            raise JobError('job %d is %s, no results to download' % (jobId, status['state']), 409)
+        return status[which]
+
+    def summary(self):
+        with self._lock:
+            states = [status['state'] for status in self._jobs.values()]
+        cache = InputCache(self.cacheDir, CACHE_MAX_BYTES)
+        return {'workers': self.workers, 'dataRoot': self.dataRoot, 'queued': states.count(QUEUED), 'running': states.count(RUNNING),
+                'finished': sum(states.count(state) for state in FINISHED_STATES),
+                'cacheDir': self.cacheDir, 'cacheBytes': cache.size(), 'spoolDir': self.spoolDir}
+
+    def close(self):
+        """stop the workers, the running jobs are abandoned; remove the temporary directories"""
+        for _ in self._dispatchers:
+            self._queue.put(None)
+        self._pool.terminate()
+        self._pool.join()
+        if self._tmpCache:
+            shutil.rmtree(self.cacheDir, ignore_errors=True)
+        if self._tmpSpool:
+            shutil.rmtree(self.spoolDir, ignore_errors=True)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """the HTTP interface of a ConversionService, json in and out"""
+    server_version = 'BalanceService/1.0'
+
+    def _reply(self, status, body, contentType='application/json'):
+        if contentType == 'application/json':
+            body = json.dumps(body, indent=1)
+        self.send_response(status)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _length(self, limit):
+        """the request body's length, a JobError beyond limit"""
+        try:
+            length = int(self.headers.getheader('Content-Length'))
+        except (TypeError, ValueError):
+            raise JobError('the request needs a Content-Length', 411)
+        if length < 0 or length > limit:
+            raise JobError('the request exceeds %d bytes' % limit, 413)
+        return length
+
+    def _route(self):
+        """(job id or None, the rest of the path) of /jobs[/<id>[/<rest>]], None for other paths"""
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        if not parts or parts[0] != 'jobs' or len(parts) > 3:
+            return None
+        if len(parts) == 1:
+            return None, None
+        if not parts[1].isdigit():
+            raise JobError('no job %s' % parts[1], 404)
+        return int(parts[1]), parts[2] if len(parts) == 3 else None
+
+    def _handle(self, method):
+        jobs = self.server.jobs
+        try:
+            route = self._route()
+            path = self.path.split('?')[0].rstrip('/')
+            if method == 'GET' and path == '/status':
+                return self._reply(200, jobs.summary())
+            if method == 'POST' and path == '/uploads':
+                uploadId = jobs.upload(self.rfile, self._length(MAX_UPLOAD_BYTES))
+                return self._reply(201, {'upload': uploadId})
+            if route is None:
+                raise JobError('no such resource %s' % self.path, 404)
+            jobId, rest = route
+            if method == 'POST' and jobId is None:
+                try:
+                    spec = json.loads(self.rfile.read(self._length(MAX_SPEC_BYTES)))
+                except ValueError, msg:
+                    raise JobError('the job is not valid json: %s' % msg)
+                return self._reply(202, jobs.submit(spec))
+            if method == 'GET' and jobId is None:
+                return self._reply(200, jobs.jobs())
+            if method == 'GET' and rest is None:
+                return self._reply(200, jobs.status(jobId))
+            if method == 'GET' and rest in ('body', 'aero'):
+                return self._send(jobs.resultFile(jobId, rest))
+            if method == 'DELETE' and jobId is not None and rest is None:
+                return self._reply(200, jobs.cancel(jobId))
+            raise JobError('%s is not supported on %s' % (method, self.path), 405)
+        except JobError, msg:
+            self._reply(msg.status, {'error': str(msg)})
+        except Exception, msg:
+            self._reply(500, {'error': '%s: %s' % (type(msg).__name__, msg)})
+
+    def _send(self, fname):
+        """send a file in COPY_BYTES blocks"""
+        with open(fname, 'rb') as f:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, COPY_BYTES)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class ConversionService(ThreadingMixIn, HTTPServer):
+    """
+    the HTTP server of a JobQueue, on the local interface only. serve_forever() to run,
+    shutdown() from another thread then close() to stop.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=SERVICE_PORT, workers=None, cacheDir=None, spoolDir=None, host=SERVICE_HOST,
+                 dataRoot=None):
+        # the workers first, so they do not inherit the socket
+        self.jobs = JobQueue(workers, cacheDir, spoolDir, dataRoot=dataRoot)
+        HTTPServer.__init__(self, (host, port), ServiceHandler)
+
+    def close(self):
+        self.server_close()
+        self.jobs.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    from multiprocessing import freeze_support
+    freeze_support()
+    parser = argparse.ArgumentParser(description=u'本机转换服务')
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes, default all cores')
+    parser.add_argument('--data-root', default=None,
+                        help='the directory the jobs may read their files from, default the current one')
+    parser.add_argument('--cache-dir', default=None, help='parsed input cache, default a temporary directory')
+    parser.add_argument('--spool-dir', default=None, help='uploads and results of the jobs')
+    args = parser.parse_args()
+    service = ConversionService(args.port, args.workers, args.cache_dir, args.spool_dir, dataRoot=args.data_root)
+    print 'serving on http://%s:%d with %d workers' % (SERVICE_HOST, args.port, service.jobs.workers)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
@@ -1,6 +1,7 @@
  #-*- coding: cp936 -*-
 from distutils.core import setup
 
+import glob
 import py2exe
 
 excludes = []
@@ -23,6 +24,10 @@ setup(
 	windows=[{
 		"script": "dataTransMain.py"
 		
-		}]
+		}],
+	console=[{
+		"script": "dataTransCli.py"
+		}],
+	data_files=[("calibrations", glob.glob("calibrations/*.json"))]
     #Դļͼ
     ) 
@@ -0,0 +1,187 @@
+# -*-coding: utf-8 -*-
+"""
+this is the nonlinear balance equations' solver.
+it contains a FixedPointSolver class
+
+本文件为天平非线性校准方程的迭代求解程序, 方程形式为 Fbb = f(Fbb, Fe),
+每一行数据相互独立, 已收敛的行不再参与后续迭代.
+安装了numba时, jit方法以编译后的逐行内核求解二次校准方程, 每行在寄存器中迭代至收敛;
+未安装时jit方法退回到numpy的newton方法.
+"""
+from __future__ import division
+from numpy import (arange, zeros, abs, maximum, eye, newaxis, empty, finfo, sqrt, flatnonzero, ascontiguousarray)
+from numpy.linalg import solve
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+GAUSS_SEIDEL = 'gauss-seidel'
+JACOBI = 'jacobi'
+NEWTON = 'newton'
+JIT = 'jit'
+SOLVER_METHODS = (GAUSS_SEIDEL, JACOBI, NEWTON, JIT)
+
+
+def _quadraticRowKernel(Fe, gain, linear, quadratic, pairRows, pairCols, tol, maxIter, x, iterations, converged):
+    """
+    gauss-seidel on one row at a time until it converges, for the QuadraticCalibration model.
+    written in plain loops for numba; the same stopping rule as FixedPointSolver.solve.
+    """
+    m, n = Fe.shape
+    pairs = pairRows.shape[0]
+    for r in range(m):
+        for k in range(n):
+            x[r, k] = gain[k] * Fe[r, k]
+        for it in range(1, maxIter + 1):
+            delta = 0.
+            for k in range(n):
+                v = gain[k] * Fe[r, k]
+                for j in range(n):
+                    v += linear[k, j] * x[r, j]
+                for p in range(pairs):
+                    v += quadratic[k, p] * x[r, pairRows[p]] * x[r, pairCols[p]]
+                d = abs(v - x[r, k])
+                if d > delta:
+                    delta = d
+                x[r, k] = v
+            xMax = 0.
+            for k in range(n):
+                if abs(x[r, k]) > xMax:
+                    xMax = abs(x[r, k])
+            iterations[r] = it
+            if delta <= tol * (1. + xMax):
+                converged[r] = True
+                break
+
+
+_jitKernel = njit(nogil=True, cache=True)(_quadraticRowKernel) if njit is not None else None
+HAVE_JIT = _jitKernel is not None
+
+
+class FixedPointSolver(object):
+    """
+    solve Fbb = model.evaluate(Fbb, Fe) row by row.
+
+    the model must provide:
+        size                        -- number of components
+        initial(Fe)                 -- the first guess of Fbb
+        component(k, Fbb, Fe)       -- the k-th component of f, evaluated with the current Fbb
+        evaluate(Fbb, Fe)           -- all components of f, evaluated with the same Fbb
+        jacobian(Fbb) (optional)    -- d(f)/d(Fbb), shape (m, size, size)
+
+    a row is converged when every component changes less than tol * (1 + max|Fbb|)
+    between two iterations. after solve(), `iterations` holds the iterations used by
+    each row and `converged` tells which rows met the tolerance within maxIter.
+    gauss-seidel with tol=0 and maxIter=100 reproduces the former fixed 100 sweeps.
+
+    jit runs gauss-seidel row by row in a numba kernel for models with gain, linear and
+    quadratic tables (QuadraticCalibration); other models, or no numba, use newton instead.
+    with tol=1e-9 its G18 results stay within 1e-8 * (1 + max|Fbb|) of the 100 sweeps.
+    """
+    def __init__(self, model, method=GAUSS_SEIDEL, tol=1e-9, maxIter=100, callback=None):
+        if method not in SOLVER_METHODS:
+            raise ValueError('unknown solver method: %s' % method)
+        self.model = model
+        self.method = method
+        self.tol = tol
+        self.maxIter = maxIter
+        self.callback = callback
+
+        self.iterations = None
+        self.converged = None
+
+    def unconvergedRows(self):
+        if self.converged is None:
+            return None
+        return flatnonzero(~self.converged)
+
+    def solve(self, Fe, x0=None, out=None):
+        """return the solution, written into out when it is given"""
+        m = Fe.shape[0]
+        if self.method == JIT and x0 is None and self._jitSupported():
+            return self._solveJit(Fe, out)
+        if out is None:
+            x = self.model.initial(Fe) if x0 is None else x0.copy()
+        else:
+            x = out
+            x[...] = self.model.initial(Fe) if x0 is None else x0
+        self.iterations = zeros(m, dtype=int)
+        self.converged = zeros(m, dtype=bool)
+
+        active = arange(m)
+        xa, fa = x, Fe
+        for it in range(1, self.maxIter + 1):
+            if self.method in (NEWTON, JIT):
+                delta = self._newtonStep(xa, fa)
+            elif self.method == JACOBI:
+                delta = self._jacobiSweep(xa, fa)
+            else:
+                delta = self._gaussSeidelSweep(xa, fa)
+            self.iterations[active] = it
+
+            done = delta <= self.tol * (1. + abs(xa).max(axis=1))
+            if done.any():
+                x[active[done]] = xa[done]
+                self.converged[active[done]] = True
+                keep = ~done
+                active, xa, fa = active[keep], xa[keep], fa[keep]
+            if self.callback is not None:
+                self.callback(it, m - active.size, m)
+            if not active.size:
+                break
+        x[active] = xa
+        return x
+
+    def _jitSupported(self):
+        return HAVE_JIT and all(hasattr(self.model, name) for name in ('gain', 'linear', 'quadratic', 'pairRows'))
+
+    def _solveJit(self, Fe, out=None):
+        m, n = Fe.shape
+        x = empty((m, n)) if out is None else out
+        self.iterations = zeros(m, dtype=int)
+        self.converged = zeros(m, dtype=bool)
+        model = self.model
+        _jitKernel(ascontiguousarray(Fe, dtype=float), model.gain, model.linear, model.quadratic,
+                   model.pairRows, model.pairCols, self.tol, self.maxIter, x, self.iterations, self.converged)
+        if self.callback is not None:
+            self.callback(self.iterations.max() if m else 0, int(self.converged.sum()), m)
+        return x
+
+    def _gaussSeidelSweep(self, x, Fe):
+        """update x in place one component at a time, return each row's largest change"""
+        delta = zeros(x.shape[0])
+        for k in range(self.model.size):
+            new = self.model.component(k, x, Fe)
+            delta = maximum(delta, abs(new - x[:, k]))
+            x[:, k] = new
+        return delta
+
+    def _jacobiSweep(self, x, Fe):
+        """update every component of x in place from the same x, return each row's largest change"""
+        new = self.model.evaluate(x, Fe)
+        delta = abs(new - x).max(axis=1)
+        x[:] = new
+        return delta
+
+    def _newtonStep(self, x, Fe):
+        """solve (I - J) dx = f(x) - x for every row, update x in place, return each row's largest change"""
+        n = self.model.size
+        fx = self.model.evaluate(x, Fe)
+        if hasattr(self.model, 'jacobian'):
+            J = self.model.jacobian(x)
+        else:
+            J = self._numericJacobian(x, Fe, fx)
+        dx = solve(eye(n)[newaxis, :, :] - J, fx - x)
+        x += dx
+        return abs(dx).max(axis=1)
+
+    def _numericJacobian(self, x, Fe, fx):
+        m, n = x.shape
+        J = empty((m, n, n))
+        h = sqrt(finfo(float).eps) * (1. + abs(x))
+        for j in range(n):
+            xp = x.copy()
+            xp[:, j] += h[:, j]
+            J[:, :, j] = (self.model.evaluate(xp, Fe) - fx) / h[:, j, newaxis]
+        return J
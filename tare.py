@@ -0,0 +1,133 @@
+# -*-coding: utf-8 -*-
+"""
+this is the static tare table.
+it contains a TareTable class
+
+本文件为静态零读数表: 由一次静态扫描建立, 按角度索引, 动态数据的每一行按其角度查表插值得到零读数,
+一次静态扫描可用于多次动态试验, 静态文件与动态文件的行数也不必相同.
+查表方式:
+    linear      按攻角一维线性插值
+    bilinear    按(攻角, 侧滑角)网格双线性插值, 静态扫描须覆盖整个网格
+    nearest     取姿态角(攻角, 侧滑角, 滚转角)最接近的静态点, 时间列不参与比较
+同一角度的多个静态样本取平均; 超出静态扫描范围的角度取边界上的值.
+"""
+from __future__ import division
+import hashlib
+from numpy import (asarray, ascontiguousarray, around, unique, bincount, empty, zeros, interp, searchsorted,
+                   clip, isnan, newaxis, float64)
+from dataIO import loadColumns
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+LINEAR = 'linear'
+BILINEAR = 'bilinear'
+NEAREST = 'nearest'
+TARE_MODES = (LINEAR, BILINEAR, NEAREST)
+ANGLE_DECIMALS = 3  # 角度取到0.001度后相同的静态样本视为同一点
+ATTITUDE_COLUMNS = 3  # 角度列依次为攻角、侧滑角、滚转角、时间, 前三列为姿态角
+NEAREST_BLOCK_SIZE = 1 << 22  # 无scipy时最近点逐块比较, 每块的距离数
+
+
+def _axisWeights(nodes, x):
+    """the lower, upper node index and the upper node's weight of x on the sorted nodes, clamped at the ends"""
+    if nodes.shape[0] == 1:
+        i0 = zeros(x.shape[0], dtype=int)
+        return i0, i0, zeros(x.shape[0])
+    x = clip(x, nodes[0], nodes[-1])
+    i0 = clip(searchsorted(nodes, x, side='right') - 1, 0, nodes.shape[0] - 2)
+    i1 = i0 + 1
+    w = (x - nodes[i0]) / (nodes[i1] - nodes[i0])
+    return i0, i1, w
+
+
+class TareTable(object):
+    """
+    the static forces of a sweep, indexed by angle.
+
+    angle holds the angle columns of the static file (alpha, beta, phi, t), force its force and
+    moment columns; the time column never takes part in the lookup. mode is one of TARE_MODES.
+    digest identifies the table content.
+    """
+    def __init__(self, angle, force, mode=LINEAR, decimals=ANGLE_DECIMALS):
+        if mode not in TARE_MODES:
+            raise ValueError('unknown tare mode %r, expected one of %s' % (mode, ', '.join(TARE_MODES)))
+        angle = asarray(angle, dtype=float64)
+        force = asarray(force, dtype=float64)
+        if not angle.shape[0] or angle.shape[0] != force.shape[0]:
+            raise ValueError('the static sweep needs matching, non-empty angle and force rows')
+        self.mode = mode
+        keyCols = {LINEAR: 1, BILINEAR: 2, NEAREST: min(angle.shape[1], ATTITUDE_COLUMNS)}[mode]
+        if angle.shape[1] < keyCols:
+            raise ValueError('the %s tare needs %d angle columns' % (mode, keyCols))
+
+        # average the samples taken at the same attitude
+        nodes, inverse = unique(around(angle[:, :keyCols], decimals), axis=0, return_inverse=True)
+        counts = bincount(inverse, minlength=nodes.shape[0])
+        nodeForce = empty((nodes.shape[0], force.shape[1]))
+        for c in range(force.shape[1]):
+            nodeForce[:, c] = bincount(inverse, force[:, c], nodes.shape[0]) / counts
+
+        if mode == LINEAR:
+            self.alpha = ascontiguousarray(nodes[:, 0])
+            self.force = nodeForce
+        elif mode == BILINEAR:
+            self.alpha, ia = unique(nodes[:, 0], return_inverse=True)
+            self.beta, ib = unique(nodes[:, 1], return_inverse=True)
+            grid = empty((self.alpha.shape[0], self.beta.shape[0], force.shape[1]))
+            grid.fill(float('nan'))
+            grid[ia, ib] = nodeForce
+            missing = isnan(grid[:, :, 0]).sum()
+            if missing:
+                raise ValueError('the static sweep misses %d of the %d alpha-beta grid nodes'
+                                 % (missing, grid.shape[0] * grid.shape[1]))
+            self.force = grid
+        else:
+            self.nodes = nodes
+            self.force = nodeForce
+            self._tree = cKDTree(nodes) if cKDTree is not None else None
+
+        h = hashlib.sha1(mode.encode('ascii'))
+        for arr in (nodes, nodeForce):
+            h.update(ascontiguousarray(arr).tobytes())
+        self.digest = h.hexdigest()
+
+    @classmethod
+    def fromFile(cls, fname, headerRows=1, footerRows=0, columns=((1, 4), (5, 10)), mode=LINEAR,
+                 decimals=ANGLE_DECIMALS):
+        (angle, force), _, _ = loadColumns(fname, headerRows, footerRows, columns)
+        return cls(angle, force, mode, decimals)
+
+    def __len__(self):
+        return self.force.shape[0] * (self.force.shape[1] if self.mode == BILINEAR else 1)
+
+    def lookup(self, angle, out=None):
+        """the tare of every row of angle, written into out when it is given"""
+        m = angle.shape[0]
+        if out is None:
+            out = empty((m, self.force.shape[-1]))
+        if self.mode == LINEAR:
+            for c in range(out.shape[1]):
+                out[:, c] = interp(angle[:, 0], self.alpha, self.force[:, c])
+        elif self.mode == BILINEAR:
+            a0, a1, wa = _axisWeights(self.alpha, angle[:, 0])
+            b0, b1, wb = _axisWeights(self.beta, angle[:, 1])
+            wa, wb = wa[:, newaxis], wb[:, newaxis]
+            F = self.force
+            out[...] = ((1. - wa) * ((1. - wb) * F[a0, b0] + wb * F[a0, b1]) +
+                        wa * ((1. - wb) * F[a1, b0] + wb * F[a1, b1]))
+        else:
+            out[...] = self.force[self._nearest(angle)]
+        return out
+
+    def _nearest(self, angle):
+        query = angle[:, :self.nodes.shape[1]]
+        if self._tree is not None:
+            return self._tree.query(query)[1]
+        index = empty(query.shape[0], dtype=int)
+        block = max(1, NEAREST_BLOCK_SIZE // (self.nodes.shape[0] * self.nodes.shape[1]))
+        for start in range(0, query.shape[0], block):
+            diff = query[start:start + block, newaxis, :] - self.nodes[newaxis, :, :]
+            index[start:start + block] = (diff * diff).sum(axis=2).argmin(axis=1)
+        return index
@@ -0,0 +1,52 @@
+# -*-coding: utf-8 -*-
+"""
+this is the tests' shared data.
+
+测试用的合成数据和Balance: 攻角逐行递增(每行不同, 零读数表逐行对应), 力和力矩随行号单调平滑变化,
+滤波后与未滤波的基准逐行比较.
+usage: python -m unittest discover -s tests (在项目目录下运行)
+"""
+from __future__ import division
+import os
+import sys
+from numpy import (arange, zeros, column_stack, savetxt, loadtxt)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from aircraft import AircraftModel
+from balance import Balance, BALANCE_STYLES
+
+AIRCRAFT = AircraftModel(0.0521, 0.4, 0.2759, 0.1246, 0.01, -0.02, 0.03, 25.)
+HEADER = 'alpha beta phi t Fx Fy Fz Mx My Mz'
+ROWS = 400
+
+
+def makeRun(rows=ROWS, static=False, spikes=()):
+    """the angle and force columns of a run: alpha -10 + 0.1 * row, forces monotone in the row"""
+    t = arange(rows) / rows
+    angle = column_stack((-10. + 0.1 * arange(rows), zeros(rows), zeros(rows), 0.01 * arange(rows)))
+    scale = 0.05 if static else 1.
+    force = column_stack([scale * (k + 0.5 + (k + 1) * t + 0.5 * t ** 2) for k in range(6)])
+    for row in spikes:
+        force[row, 0] += 5.
+    return angle, force
+
+
+def writeRun(fname, angle, force):
+    savetxt(fname, column_stack((angle, force)), fmt='%.6f', header=HEADER, comments='')
+
+
+def writeFiles(tmpDir, rows=ROWS, spikes=()):
+    """write sta.txt and dyn.txt in tmpDir, return their names"""
+    sta, dyn = os.path.join(tmpDir, 'sta.txt'), os.path.join(tmpDir, 'dyn.txt')
+    writeRun(sta, *makeRun(rows, static=True))
+    writeRun(dyn, *makeRun(rows, spikes=spikes))
+    return sta, dyn
+
+
+def makeBalance(sta, dyn, body, aero, balanceSty='G16', **kwargs):
+    return Balance(sta, dyn, body, aero, angleStartCol=1, angleEndCol=4, forceStartCol=5, forceEndCol=10,
+                   aircraftModel=AIRCRAFT, balanceSty=BALANCE_STYLES[balanceSty], **kwargs)
+
+
+def loadResult(fname):
+    return loadtxt(fname, skiprows=1, ndmin=2)
@@ -0,0 +1,48 @@
+# -*-coding: utf-8 -*-
+"""
+this is the regression test of the data file reading.
+
+行宽不一的数据(采集中断的行)不能被快速读取按总数重新分行.
+"""
+from __future__ import division
+import os
+import shutil
+import tempfile
+import unittest
+
+import support  # noqa, puts the project on the path
+from dataIO import loadColumns, lineWidths
+from live import _parseLines
+
+RAGGED = (b'1 2 3 4 5 6\n'
+          b'7 8 9 10\n'
+          b'11 12 13 14 15 16 17 18\n')
+
+
+class RaggedLinesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp(prefix='balance-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def testLineWidths(self):
+        self.assertEqual(list(lineWidths(RAGGED)), [6, 4, 8])
+        self.assertEqual(list(lineWidths(b' 1\t2 \r\n\n3')), [2, 0, 1])
+
+    def testRaggedFileIsNotRewrapped(self):
+        fname = os.path.join(self.tmpDir, 'ragged.txt')
+        with open(fname, 'wb') as f:
+            f.write(b'a b c d e f\n' + RAGGED)
+        with self.assertRaises(ValueError):
+            loadColumns(fname, 1, 0, ((1, 2), (3, 6)))
+
+    def testRaggedLiveLinesAreSkipped(self):
+        (angle, force), skipped = _parseLines(RAGGED.splitlines(True), ((1, 2), (3, 6)), float)
+        self.assertEqual(skipped, 1)
+        self.assertEqual(angle.tolist(), [[1., 2.], [11., 12.]])
+        self.assertEqual(force.tolist(), [[3., 4., 5., 6.], [13., 14., 15., 16.]])
+
+
+if __name__ == '__main__':
+    unittest.main()
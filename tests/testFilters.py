@@ -0,0 +1,91 @@
+# -*-coding: utf-8 -*-
+"""
+this is the regression test of the filtered and tared conversions.
+
+滤波、零读数表转换与未滤波、逐行去零的基准转换比较.
+"""
+from __future__ import division
+import os
+import shutil
+import tempfile
+import unittest
+from numpy import (abs as npAbs, allclose)
+
+from support import makeRun, writeRun, writeFiles, makeBalance, loadResult
+from filters import ForceFilter
+
+SPIKES = (50, 151, 252)
+
+
+class FilteredConversionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp(prefix='balance-test-')
+        self.sta, self.dyn = writeFiles(self.tmpDir)
+        # the unfiltered, row by row tared baseline
+        self.baseline = self.convert('base')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def convert(self, name, dyn=None, forceFilter=None, tare=None, balanceSty='G16', **kwargs):
+        body, aero = [os.path.join(self.tmpDir, '%s_%s.txt' % (kind, name)) for kind in ('body', 'aero')]
+        balance = makeBalance(self.sta, dyn or self.dyn, body, aero, balanceSty, **kwargs)
+        balance.setForceFilter(forceFilter)
+        if tare:
+            balance.buildTareTable(tare)
+        result = balance.translateData()
+        self.assertTrue(result, result.error)
+        return loadResult(body), loadResult(aero)
+
+    def testNoFilterIsBaseline(self):
+        for got, expected in zip(self.convert('none', forceFilter=ForceFilter()), self.baseline):
+            self.assertTrue((got == expected).all())
+
+    def testDespikeRestoresBaseline(self):
+        spiked = os.path.join(self.tmpDir, 'spiked.txt')
+        writeRun(spiked, *makeRun(spikes=SPIKES))
+        unfiltered = self.convert('spiked', dyn=spiked)
+        filtered = self.convert('despiked', dyn=spiked, forceFilter=ForceFilter(despike=5, sigma=3))
+        self.assertGreater(npAbs(unfiltered[0] - self.baseline[0]).max(), 0.5)
+        for got, expected in zip(filtered, self.baseline):
+            self.assertEqual(got.shape, expected.shape)
+            self.assertLess(npAbs(got - expected).max(), 0.01)
+        # rows away from the spikes pass the despike unchanged
+        far = [row for row in range(expected.shape[0]) if min(abs(row - spike) for spike in SPIKES) > 2]
+        self.assertTrue((filtered[0][far] == self.baseline[0][far]).all())
+
+    def testDecimateKeepsAngles(self):
+        body, aero = self.convert('decimated', forceFilter=ForceFilter(lowpass=5, decimate=4))
+        self.assertEqual(body.shape[0], (self.baseline[0].shape[0] + 3) // 4)
+        self.assertTrue(allclose(body[:, 0], self.baseline[0][::4, 0] + 0.15))  # the mean alpha of 4 rows
+
+    def testStreamingMatchesWholeFile(self):
+        forceFilter = ForceFilter(despike=7, sigma=3, lowpass=5, decimate=3)
+        whole = self.convert('whole', forceFilter=forceFilter)
+        for chunkRows in (1, 37, 1000):
+            chunked = self.convert('chunk%d' % chunkRows, forceFilter=forceFilter, chunkRows=chunkRows)
+            for got, expected in zip(chunked, whole):
+                self.assertTrue(allclose(got, expected, rtol=1e-12, atol=1e-12))
+
+    def testTareTableMatchesRowTare(self):
+        # every dynamic alpha is a static node, the table gives back the static row
+        for balanceSty in ('G16', 'G18'):
+            baseline = self.convert('row' + balanceSty, balanceSty=balanceSty)
+            tared = self.convert('table' + balanceSty, tare='linear', balanceSty=balanceSty)
+            for got, expected in zip(tared, baseline):
+                self.assertTrue(allclose(got, expected, rtol=1e-9, atol=1e-9))
+
+    def testFilteredTareTable(self):
+        # the table holds the raw static sweep, the row tare the filtered one: they differ by the
+        # low-pass of the smooth static forces, largest at the mirrored file ends
+        forceFilter = ForceFilter(despike=5, sigma=3, lowpass=3)
+        rowTared = self.convert('filteredRow', forceFilter=forceFilter)
+        tableTared = self.convert('filteredTable', forceFilter=forceFilter, tare='linear')
+        for got, expected in zip(tableTared, rowTared):
+            self.assertEqual(got.shape, expected.shape)
+            self.assertTrue(allclose(got[1:-1], expected[1:-1], rtol=0., atol=1e-6))
+            self.assertTrue(allclose(got, expected, rtol=0., atol=1e-3))
+
+
+if __name__ == '__main__':
+    unittest.main()
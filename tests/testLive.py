@@ -0,0 +1,126 @@
+# -*-coding: utf-8 -*-
+"""
+this is the regression test of the live conversion.
+
+回放合成的动态文件, 实时转换的结果须与整个文件一次转换的结果逐字节相同.
+"""
+from __future__ import division
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from support import writeFiles, makeBalance
+from filters import ForceFilter
+from dataIO import loadColumns
+from live import FileFollower, StreamSource, LiveConverter, replay, startReplay
+
+REPLAY_ROWS_PER_SECOND = 2000.  # 0.2 s a run, several poll intervals
+IDLE_TIMEOUT = 0.5
+
+
+class LiveConversionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp(prefix='balance-test-')
+        self.sta, self.dyn = writeFiles(self.tmpDir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def files(self, name):
+        return [os.path.join(self.tmpDir, '%s_%s.txt' % (kind, name)) for kind in ('body', 'aero')]
+
+    def batch(self, forceFilter, tare):
+        body, aero = self.files('batch')
+        balance = makeBalance(self.sta, self.dyn, body, aero)
+        balance.setForceFilter(forceFilter)
+        if tare:
+            balance.buildTareTable()
+        self.assertTrue(balance.translateData())
+        return body, aero
+
+    def liveBalance(self, name, forceFilter, tare):
+        body, aero = self.files(name)
+        balance = makeBalance(self.sta, os.path.join(self.tmpDir, 'growing.txt'), body, aero)
+        balance.setForceFilter(forceFilter)
+        if tare:
+            balance.buildTareTable()
+        return balance, body, aero
+
+    def assertSameFiles(self, names, expected):
+        for got, want in zip(names, expected):
+            with open(got, 'rb') as f, open(want, 'rb') as g:
+                self.assertEqual(f.read(), g.read())
+
+    def testFileReplayMatchesBatch(self):
+        for forceFilter in (None, ForceFilter(despike=5, sigma=3, lowpass=3, decimate=3)):
+            for tare in (False, True):
+                expected = self.batch(forceFilter, tare)
+                growing = os.path.join(self.tmpDir, 'growing.txt')
+                if os.path.exists(growing):
+                    os.remove(growing)
+                balance, body, aero = self.liveBalance('live', forceFilter, tare)
+                startReplay(self.dyn, growing, REPLAY_ROWS_PER_SECOND, blockRows=37)
+                batches = []
+                converter = LiveConverter(balance, FileFollower(growing, 1, IDLE_TIMEOUT),
+                                          callback=lambda Mb, Ma, first: batches.append(first))
+                rows = converter.run()
+                self.assertEqual(converter.inputRows, 400)
+                self.assertEqual(rows, 400 if forceFilter is None else 134)
+                self.assertGreater(len(batches), 1)  # converted as the rows arrived
+                self.assertSameFiles((body, aero), expected)
+
+    def testPipeReplayMatchesBatch(self):
+        expected = self.batch(None, True)
+        balance, body, aero = self.liveBalance('pipe', None, True)
+        readEnd, writeEnd = os.pipe()
+        writer = os.fdopen(writeEnd, 'wb')
+
+        def feed():
+            try:
+                replay(self.dyn, writer, REPLAY_ROWS_PER_SECOND, blockRows=50)
+            finally:
+                writer.close()
+        thread = threading.Thread(target=feed)  # the writer closes the pipe, ending the source
+        thread.start()
+        LiveConverter(balance, StreamSource(os.fdopen(readEnd, 'rb'), 1)).run()
+        thread.join()
+        self.assertSameFiles((body, aero), expected)
+
+    def testSkipsBadLines(self):
+        expected = self.batch(None, True)
+        source = os.path.join(self.tmpDir, 'noisy.txt')
+        with open(self.dyn) as f:
+            lines = f.readlines()
+        with open(source, 'w') as f:
+            f.writelines(lines[:100] + ['# operator note\n', '1.0 2.0\n'] + lines[100:])
+        growing = os.path.join(self.tmpDir, 'growing.txt')
+        balance, body, aero = self.liveBalance('noisy', None, True)
+        startReplay(source, growing, REPLAY_ROWS_PER_SECOND, blockRows=40)
+        converter = LiveConverter(balance, FileFollower(growing, 1, IDLE_TIMEOUT))
+        converter.run()
+        self.assertEqual(converter.skippedLines, 2)
+        self.assertSameFiles((body, aero), expected)
+
+    def testBlockDoesNotStaleStageCache(self):
+        # a block overwrites the workspace buffers the cached stages of a translateData() point into
+        for balanceSty in ('G16', 'G18'):
+            body, aero = self.files('cached' + balanceSty)
+            balance = makeBalance(self.sta, self.dyn, body, aero, balanceSty)
+            self.assertTrue(balance.translateData())
+            expected = []
+            for fname in (body, aero):
+                with open(fname, 'rb') as f:
+                    expected.append(f.read())
+            staAngle, staForce = balance.prepareStatic()
+            (dynAngle, dynForce), _, _ = loadColumns(self.dyn, 1, 0, balance.columns())
+            balance.convertBlock(staAngle[:50] + 1., staForce[:50], dynAngle[:50], dynForce[:50] * 2.)
+            self.assertTrue(balance.translateData())
+            for fname, want in zip((body, aero), expected):
+                with open(fname, 'rb') as f:
+                    self.assertEqual(f.read(), want)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+# -*-coding: utf-8 -*-
+"""
+this is the regression test of translateData's ConversionResult.
+
+没有数据行(只有文件头)的文件转换为空结果, 不抛出异常.
+"""
+from __future__ import division
+import os
+import shutil
+import tempfile
+import unittest
+
+from support import HEADER, makeBalance, loadResult
+
+
+class EmptyRunTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp(prefix='balance-test-')
+        self.sta, self.dyn = [os.path.join(self.tmpDir, name) for name in ('sta.txt', 'dyn.txt')]
+        for fname in (self.sta, self.dyn):
+            with open(fname, 'w') as f:
+                f.write(HEADER + '\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def testHeaderOnly(self):
+        body, aero = [os.path.join(self.tmpDir, '%s.txt' % kind) for kind in ('body', 'aero')]
+        for balanceSty in ('G16', 'G18'):
+            for chunkRows in (0, 100):
+                result = makeBalance(self.sta, self.dyn, body, aero, balanceSty, chunkRows=chunkRows).translateData()
+                self.assertTrue(result, result.error)
+                self.assertEqual(result.iterations, None)
+                self.assertEqual(result.unconvergedRows, None)
+                self.assertEqual(loadResult(body).size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# -*-coding: utf-8 -*-
+"""
+this is the regression test of the conversion service.
+
+任务的输入路径须在数据目录内, 输出路径须在任务目录内, 越界的路径(绝对路径、..、符号链接)被拒绝;
+上传与路径给出的输入转换结果相同.
+"""
+from __future__ import division
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from StringIO import StringIO
+
+from support import writeFiles
+from service import JobQueue, JobError, DONE, FINISHED_STATES
+
+AIRCRAFT = {'area': 0.0521, 'span': 0.4, 'refChord': 0.1246, 'speed': 25.}
+RUN = {'balanceSty': 'G16', 'angleStartCol': 1, 'angleEndCol': 4, 'forceStartCol': 5, 'forceEndCol': 10,
+       'aircraft': AIRCRAFT}
+JOB_TIMEOUT = 60.
+
+
+class ServicePathTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpDir = os.path.realpath(tempfile.mkdtemp(prefix='balance-test-'))
+        cls.dataRoot = os.path.join(cls.tmpDir, 'data')
+        os.makedirs(cls.dataRoot)
+        cls.sta, cls.dyn = writeFiles(cls.dataRoot)
+        os.symlink(cls.tmpDir, os.path.join(cls.dataRoot, 'outside'))
+        with open(os.path.join(cls.tmpDir, 'secret.txt'), 'w') as f:
+            f.write('not for the jobs\n')
+        cls.jobs = JobQueue(1, os.path.join(cls.tmpDir, 'cache'), os.path.join(cls.tmpDir, 'spool'),
+                            dataRoot=cls.dataRoot)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.jobs.close()
+        shutil.rmtree(cls.tmpDir, ignore_errors=True)
+
+    def spec(self, **kwargs):
+        run = dict(RUN, sta='sta.txt', dyn='dyn.txt')
+        run.update(kwargs)
+        return run
+
+    def wait(self, jobId):
+        deadline = time.time() + JOB_TIMEOUT
+        while time.time() < deadline:
+            status = self.jobs.status(jobId)
+            if status['state'] in FINISHED_STATES:
+                return status
+            time.sleep(0.05)
+        self.fail('job %d did not finish' % jobId)
+
+    def assertRejected(self, run, httpStatus=403):
+        jobs = len(self.jobs.jobs())
+        with self.assertRaises(JobError) as caught:
+            self.jobs.submit(run)
+        self.assertEqual(caught.exception.status, httpStatus)
+        self.assertEqual(len(self.jobs.jobs()), jobs)
+
+    def testInputsConfinedToDataRoot(self):
+        for path in (os.path.join(self.tmpDir, 'secret.txt'), '../secret.txt', 'outside/secret.txt', '/etc/passwd'):
+            self.assertRejected(self.spec(sta=path))
+            self.assertRejected(self.spec(dyn=path))
+            self.assertRejected(self.spec(aircraft=path))
+
+    def testOutputsConfinedToJobDirectory(self):
+        for path in (os.path.join(self.tmpDir, 'evil.txt'), '../evil.txt', '../../evil.txt', '/tmp/evil.txt'):
+            self.assertRejected(self.spec(body=path))
+            self.assertRejected(self.spec(aero=path))
+        self.assertFalse(os.path.exists(os.path.join(self.tmpDir, 'evil.txt')))
+        self.assertRejected(self.spec(body=7), 400)
+
+    def testBadUploads(self):
+        self.assertRejected(self.spec(staUpload='../../secret.txt'), 400)
+        self.assertRejected(self.spec(staUpload='0' * 32), 404)
+
+    def testJobsConvertInsideTheirDirectory(self):
+        byPath = self.jobs.submit(self.spec(body='b.txt'))
+        with open(self.dyn, 'rb') as f:
+            data = f.read()
+        uploadId = self.jobs.upload(StringIO(data), len(data))
+        byUpload = self.jobs.submit(self.spec(dynUpload=uploadId))
+        results = []
+        for status in (self.wait(byPath['id']), self.wait(byUpload['id'])):
+            self.assertEqual(status['state'], DONE, status['error'])
+            for which in ('body', 'aero'):
+                fname = self.jobs.resultFile(status['id'], which)
+                self.assertTrue(fname.startswith(os.path.join(status['jobDir'], '')))
+            with open(self.jobs.resultFile(status['id'], 'body'), 'rb') as f:
+                results.append(f.read())
+        self.assertEqual(results[0], results[1])
+        # an upload is taken by one job only
+        self.assertRejected(self.spec(dynUpload=uploadId), 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+# -*-coding: utf-8 -*-
+"""
+this is the regression test of the static tare table.
+
+静态扫描与动态试验的时间列不同, 查表只按姿态角.
+"""
+from __future__ import division
+import unittest
+from numpy import (arange, zeros, column_stack, allclose)
+
+import support  # noqa, puts the project on the path
+from tare import TareTable, LINEAR, NEAREST
+
+
+def sweep(alpha, t):
+    """the angle columns (alpha, beta, phi, t) and forces equal to alpha"""
+    angle = column_stack((alpha, zeros(alpha.shape[0]), zeros(alpha.shape[0]), t))
+    return angle, column_stack([alpha * (k + 1) for k in range(6)])
+
+
+class TareTableTest(unittest.TestCase):
+    def testLookupIgnoresTime(self):
+        # the static sweep at t = 0..10 s, the dynamic rows much later
+        staAngle, staForce = sweep(arange(11.), arange(11.))
+        dynAngle, expected = sweep(arange(11.), 100. + arange(11.))
+        for mode in (LINEAR, NEAREST):
+            table = TareTable(staAngle, staForce, mode)
+            self.assertTrue(allclose(table.lookup(dynAngle), expected), mode)
+
+    def testNearestAveragesRepeatedAttitudes(self):
+        # the same attitudes swept twice, at different times
+        alpha = arange(11.)
+        staAngle, staForce = sweep(alpha.repeat(2), arange(22.))
+        staForce[1::2] += 2.
+        table = TareTable(staAngle, staForce, NEAREST)
+        self.assertEqual(len(table), 11)
+        self.assertTrue(allclose(table.lookup(sweep(alpha, 50. + alpha)[0]), sweep(alpha, alpha)[1] + 1.))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+# -*-coding: utf-8 -*-
+"""
+this is the conversion's reusable buffers.
+it contains the Workspace, SharedWorkspace and ShardWorkspace classes
+
+本文件为转换过程的工作区: 各阶段的结果数组只分配一次, 在多次转换、多个数据块之间重复使用,
+各阶段直接写入这些数组, 不再每次新建. 多核并行时, 各分片直接写入共享数组中自己的行:
+线程共用同一工作区, 进程共用SharedWorkspace的内存映射文件.
+"""
+from __future__ import division
+import os
+import shutil
+import tempfile
+from numpy import (empty, memmap, dtype as npDtype)
+
+
+class Workspace(object):
+    """
+    named buffers that grow to the largest block seen and are then reused.
+
+    get(name, shape) returns the first shape[0] rows of the buffer, a C-contiguous
+    view, so its content is only valid until the next get() of the same name.
+    a Workspace must not be used by two conversions at the same time.
+    """
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=float):
+        rows, tail = shape[0], tuple(shape[1:])
+        dtype = npDtype(dtype)
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape[0] < rows or buf.shape[1:] != tail or buf.dtype != dtype:
+            buf = empty((rows,) + tail, dtype=dtype)
+            self._buffers[name] = buf
+        return buf[:rows]
+
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self._buffers.values())
+
+    def release(self):
+        """drop every buffer, the next get() allocates again"""
+        self._buffers.clear()
+
+
+class SharedWorkspace(Workspace):
+    """
+    a Workspace whose buffers are memory-mapped files in a temporary directory, so worker
+    processes can open them by name (see spec()) and write their rows in place.
+    """
+    def __init__(self, tempDir=None):
+        super(SharedWorkspace, self).__init__()
+        self._dir = tempfile.mkdtemp(prefix='balance-ws-', dir=tempDir)
+        self._files = {}
+        self._generation = 0
+
+    def get(self, name, shape, dtype=float):
+        rows, tail = shape[0], tuple(shape[1:])
+        dtype = npDtype(dtype)
+        buf = self._buffers.get(name)
+        if buf is None or buf.shape[0] < rows or buf.shape[1:] != tail or buf.dtype != dtype:
+            self._generation += 1
+            fname = os.path.join(self._dir, '%s-%d.bin' % (name, self._generation))
+            # at least one row, memmap cannot map an empty file
+            buf = memmap(fname, dtype=dtype, mode='w+', shape=(max(rows, 1),) + tail)
+            self._buffers[name] = buf
+            self._files[name] = fname
+        return buf[:rows]
+
+    def spec(self, names):
+        """{name: (file, shape, dtype)} of the buffers `names`, for openSharedBuffers() in another process"""
+        return dict((name, (self._files[name], self._buffers[name].shape, self._buffers[name].dtype.str))
+                    for name in names)
+
+    def release(self):
+        super(SharedWorkspace, self).release()
+        self._files.clear()
+        shutil.rmtree(self._dir, ignore_errors=True)
+        self._dir = tempfile.mkdtemp(prefix='balance-ws-', dir=os.path.dirname(self._dir))
+
+    def __del__(self):
+        self._buffers.clear()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def openSharedBuffers(spec):
+    """map the buffers SharedWorkspace.spec() described, writable"""
+    return dict((name, memmap(fname, dtype=dtype, mode='r+', shape=tuple(shape)))
+                for name, (fname, shape, dtype) in spec.items())
+
+
+class ShardWorkspace(Workspace):
+    """
+    the workspace of one row shard: the buffers in `rows` (full size arrays shared by every
+    shard) are handed out as their [start:stop] rows, any other buffer is private to the shard.
+    """
+    def __init__(self, rows, start, stop):
+        super(ShardWorkspace, self).__init__()
+        self._rows = rows
+        self._start = start
+        self._stop = stop
+
+    def get(self, name, shape, dtype=float):
+        buf = self._rows.get(name)
+        if buf is None:
+            return super(ShardWorkspace, self).get(name, shape, dtype)
+        if shape[0] != self._stop - self._start or buf.shape[1:] != tuple(shape[1:]) or buf.dtype != npDtype(dtype):
+            raise ValueError('buffer %s does not match the shard' % name)
+        return buf[self._start:self._stop]